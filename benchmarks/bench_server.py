@@ -0,0 +1,59 @@
+"""
+The real API (main:app) with the fake YOLO/Gemini models from
+benchmarks.fakes and a SQLite database seeded with a synthetic fleet.
+Started by benchmarks.loadgen; can also be run on its own:
+
+    python -m benchmarks.fake_ollama --port 11435 &
+    OLLAMA_HOST=http://127.0.0.1:11435 python -m benchmarks.bench_server --port 8765 --fleet 5000
+"""
+import argparse
+import os
+import tempfile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fleet", type=int, default=5000)
+    parser.add_argument("--workdir", default=None, help="Where the SQLite DB, journal and sessions go (default: temp dir)")
+    parser.add_argument("--yolo-latency", type=float, default=None)
+    parser.add_argument("--gemini-latency", type=float, default=None)
+    args = parser.parse_args()
+
+    # Before importing main: src.database and friends read their settings at import time
+    workdir = args.workdir or tempfile.mkdtemp(prefix="smartwarehouse-bench-")
+    os.environ.setdefault("DB_BACKEND", "sqlite")
+    os.environ.setdefault("DB_SQLITE_PATH", os.path.join(workdir, "bench.db"))
+    os.environ.setdefault("EVENT_LOG_PATH", os.path.join(workdir, "gate_events.jsonl"))
+    os.environ.setdefault("SESSION_DB_PATH", os.path.join(workdir, "chat_sessions.db"))
+
+    import uvicorn
+
+    import main as api
+    from benchmarks.fakes import FAKE_GEMINI_LATENCY, FAKE_YOLO_LATENCY, FakeGemini, FakeYOLO, seed_fleet
+    from src import database
+    from src.batching import BatchedDetector, YOLO_BATCH_MAX_WAIT_MS, YOLO_BATCH_SIZE
+    from src.ocr import GeminiOCR
+    from src.ocr_cache import OCRCache
+
+    class FakeVisionPipeline(api.VisionPipeline):
+        """The real pipeline (batching, OCR cache, crops, metrics) around the fake models."""
+
+        def __init__(self, yolo_latency: float, gemini_latency: float):
+            self.yolo_model = FakeYOLO(yolo_latency)
+            self.detector = BatchedDetector(self.yolo_model, max_batch_size=YOLO_BATCH_SIZE,
+                                            max_wait_ms=YOLO_BATCH_MAX_WAIT_MS, conf=0.5)
+            self.ocr = GeminiOCR(model=FakeGemini(gemini_latency))
+            self.ocr_cache = OCRCache.from_env()
+
+    seed_fleet(database, args.fleet)  # With DB_BACKEND=mysql exported, the local MySQL is seeded instead
+
+    yolo_latency = FAKE_YOLO_LATENCY if args.yolo_latency is None else args.yolo_latency
+    gemini_latency = FAKE_GEMINI_LATENCY if args.gemini_latency is None else args.gemini_latency
+    api.components.register("vision", lambda: FakeVisionPipeline(yolo_latency, gemini_latency))
+    uvicorn.run(api.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
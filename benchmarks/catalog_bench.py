@@ -0,0 +1,92 @@
+"""
+Chatbot context cost vs. catalog size: the legacy full listing
+(list_clients + list_products on every message, every name in the prompt)
+vs. the cached catalog snapshot with relevance selection.
+Runs on the SQLite stand-in with synthetic catalogs.
+
+    python -m benchmarks.catalog_bench --sizes 10 100 1000 10000
+
+Prompt size is estimated with the chunker's token counter.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+WORDS = ["Cartons", "Claviers", "Souris", "Toners", "Écrans", "Câbles", "Palettes", "Imprimantes",
+         "Serveurs", "Batteries", "Scanners", "Routeurs", "Lampes", "Chaises", "Bureaux", "Casques"]
+MESSAGES = ["Bonjour, je suis {client}, je voudrais commander 20 {product}",
+            "Avez-vous des {product} en stock ?",
+            "Bonjour", "Ajoutez 5 {product} pour {client} svp"]
+
+
+def seed_catalog(database, size: int, rng: random.Random):
+    clients = [f"Client {rng.choice(WORDS)}{i}" for i in range(1, size + 1)]
+    products = [f"{rng.choice(WORDS)} modèle {i}" for i in range(1, size + 1)]
+    with database.db_cursor(commit=True) as cursor:
+        cursor.execute("DELETE FROM client")
+        cursor.execute("DELETE FROM produit")
+        cursor.executemany("INSERT INTO client (idClient, nom, adresse, telephone, idUser) VALUES (%s, %s, %s, %s, %s)",
+                           [(i, name, "Tunis", "20000000", i) for i, name in enumerate(clients, 1)])
+        cursor.executemany("INSERT INTO produit (idProduit, nom, Quantite, prix) VALUES (%s, %s, %s, %s)",
+                           [(i, name, rng.randint(0, 500), 10.0) for i, name in enumerate(products, 1)])
+    database.notify_write("client")
+    return clients, products
+
+
+def legacy_context(database):
+    clients, products = database.list_clients(), database.list_products()
+    return f"""
+        Available Clients: {', '.join(clients)}
+        Available Products: {', '.join([p['name'] for p in products])}
+        """
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--messages", type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ["DB_BACKEND"] = "sqlite"
+    os.environ["DB_SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "catalog.db")
+    from src import database
+    from src.catalog import Catalog
+    from src.chunker import count_tokens
+    database.init_db()
+    catalog = Catalog()
+    rng = random.Random(7)
+
+    print(f"{'catalog':>8} | {'legacy ms':>9} | {'legacy tokens':>13} | {'snapshot ms':>11} | {'snapshot tokens':>15}")
+    for size in args.sizes:
+        clients, products = seed_catalog(database, size, rng)
+        messages = [rng.choice(MESSAGES).format(client=rng.choice(clients), product=rng.choice(products).lower())
+                    for _ in range(args.messages)]
+
+        legacy_ms, legacy_tokens = [], []
+        for message in messages[:50]:
+            start = time.perf_counter()
+            context = legacy_context(database)
+            legacy_ms.append((time.perf_counter() - start) * 1000)
+            legacy_tokens.append(count_tokens(context))
+
+        async def snapshot_run():
+            samples, tokens = [], []
+            for message in messages:
+                start = time.perf_counter()
+                context = (await catalog.asnapshot()).prompt_context(message)
+                samples.append((time.perf_counter() - start) * 1000)
+                tokens.append(count_tokens(context))
+            return samples, tokens
+
+        snapshot_ms, snapshot_tokens = asyncio.run(snapshot_run())
+        print(f"{size:>8} | {statistics.median(legacy_ms):>9.2f} | {statistics.median(legacy_tokens):>13.0f} | "
+              f"{statistics.median(snapshot_ms):>11.2f} | {statistics.median(snapshot_tokens):>15.0f}")
+    print(f"📊 Catalog: {catalog.stats()}")
+
+
+if __name__ == "__main__":
+    main()
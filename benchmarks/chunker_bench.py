@@ -0,0 +1,73 @@
+"""
+Retrieval quality and prompt size: legacy "\\n\\n" splitter (top-5, as the
+agent used to query) vs. the markdown-aware chunker (top-RAG_TOP_K).
+
+    python -m benchmarks.chunker_bench [--data data]
+
+A query is a hit when every expected fact appears in the retrieved text.
+"""
+import argparse
+import glob
+import os
+import tempfile
+
+from src.agent import RULES_TOP_K
+from src.chunker import count_tokens
+
+# (query, facts the agent needs to see to decide)
+QUERIES = [
+    ("Consignes pour le client City Schools", ["City Schools", "Gate D", "High"]),
+    ("Consignes pour le client RetailCorp", ["RetailCorp", "forklift"]),
+    ("Consignes pour le véhicule 302-502-TUN", ["302-502-TUN", "GlobalTech"]),
+    ("Consignes pour le véhicule 999-444-TUN", ["999-444-TUN", "CleanStep"]),
+    ("GlobalTech Supplies delivery gate", ["GlobalTech", "Gate A"]),
+    ("CleanStep reliability inspection", ["CleanStep", "70%"]),
+    ("Laptops stock level", ["Laptops", "CRITICAL"]),
+    ("Paper towels stock", ["Paper Towels", "LOW STOCK"]),
+    ("How many trucks in the loading bay", ["3 trucks"]),
+]
+
+
+def legacy_index(engine, data_dir: str) -> int:
+    total = 0
+    for file_path in glob.glob(os.path.join(data_dir, "**/*.md"), recursive=True):
+        with open(file_path, "r", encoding="utf-8") as f:
+            chunks = [c.strip() for c in f.read().split("\n\n") if c.strip()]
+        filename = os.path.basename(file_path)
+        engine.collection.add(documents=chunks, ids=[f"{filename}_{i}" for i in range(len(chunks))],
+                              metadatas=[{"source": filename} for _ in chunks])
+        total += len(chunks)
+    return total
+
+
+def evaluate(engine, k: int):
+    hits, tokens = 0, 0
+    for query, facts in QUERIES:
+        context = "\n---\n".join(engine.query(query, n_results=k))
+        tokens += count_tokens(context)
+        hits += all(fact.lower() in context.lower() for fact in facts)
+    return hits / len(QUERIES), tokens / len(QUERIES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default="data")
+    args = parser.parse_args()
+
+    from src.rag_engine import WarehouseRAGEngine
+    workdir = tempfile.mkdtemp()
+
+    legacy = WarehouseRAGEngine(db_path=os.path.join(workdir, "legacy"))
+    legacy_chunks = legacy_index(legacy, args.data)
+    structured = WarehouseRAGEngine(db_path=os.path.join(workdir, "structured"))
+    structured.sync_documents(args.data)
+
+    print(f"{'splitter':<12} | {'chunks':>6} | {'k':>2} | {'hit rate':>8} | {'context tokens/query':>20}")
+    for name, engine, chunks, k in (("legacy", legacy, legacy_chunks, 5),
+                                    ("markdown", structured, structured.collection.count(), RULES_TOP_K)):
+        hit_rate, tokens = evaluate(engine, k)
+        print(f"{name:<12} | {chunks:>6} | {k:>2} | {hit_rate:>8.0%} | {tokens:>20.0f}")
+
+
+if __name__ == "__main__":
+    main()
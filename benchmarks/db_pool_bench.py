@@ -0,0 +1,70 @@
+"""
+Requests/sec of the arrival lookup: one connection per query (old behaviour)
+vs. the pooled data layer driven through run_db.
+
+    python -m benchmarks.db_pool_bench                 # local MySQL from .env
+    python -m benchmarks.db_pool_bench --sqlite        # SQLite stand-in
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sqlite", action="store_true", help="Use a temporary SQLite database instead of MySQL")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--pool-size", type=int, default=10)
+    return parser.parse_args()
+
+
+async def run_requests(handler, total: int, concurrency: int) -> float:
+    """Fires `total` simulated requests with `concurrency` in flight; returns req/s."""
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            await handler()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - start)
+
+
+async def main():
+    args = parse_args()
+    if args.sqlite:
+        os.environ["DB_BACKEND"] = "sqlite"
+        os.environ["DB_SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DB_POOL_SIZE"] = str(args.pool_size)
+
+    from src import database
+    database.init_db()
+    plate = "302 تونس 1598"
+
+    async def unpooled_request():
+        # What every handler used to do: connect, query, close, on the event loop
+        conn = database._connect()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(database.ARRIVAL_INFO_QUERY.format(where="cam.plaque = %s OR cam.plaque LIKE %s"),
+                       (plate, f"%{plate}%", *database.ACTIVE_ORDER_STATUSES))
+        cursor.fetchone()
+        conn.close()
+
+    async def pooled_request():
+        await database.run_db(database.get_complete_arrival_info, plate)
+
+    backend = "sqlite" if args.sqlite else "mysql"
+    print(f"🏁 {args.requests} requests, concurrency={args.concurrency}, pool={args.pool_size}, backend={backend}")
+    before = await run_requests(unpooled_request, args.requests, args.concurrency)
+    print(f"   connect-per-query : {before:8.1f} req/s")
+    after = await run_requests(pooled_request, args.requests, args.concurrency)
+    print(f"   pooled + run_db   : {after:8.1f} req/s  (x{after / before:.2f})")
+    print(f"   pool stats        : {database.get_pool().stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""
+Local stand-in for the ollama server (/api/chat, streaming or not), so the
+LLM scheduler and the chatbot can be exercised without a GPU.
+
+    python -m benchmarks.fake_ollama --port 11435 --latency 0.5
+    OLLAMA_HOST=http://127.0.0.1:11435 uvicorn main:app
+
+Like a single local llama3, generations run one at a time (--parallel) and
+each one takes --latency seconds, streamed word by word.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+LATENCY = float(os.getenv("FAKE_OLLAMA_LATENCY", "0.5"))
+PARALLEL = int(os.getenv("FAKE_OLLAMA_PARALLEL", "1"))
+
+app = FastAPI(title="fake ollama")
+app.state.generations = 0
+_model_slots = None
+
+
+def _answer(messages) -> str:
+    prompt = messages[-1]["content"] if messages else ""
+    if "JSON" in prompt:
+        return json.dumps({"response": "Bonjour, comment puis-je vous aider ?", "intent": "chat", "details": {}})
+    return "Gate: B | Priorité: NORMALE\nVérification manuelle du chargement avant entrée."
+
+
+def _message(model: str, content: str, done: bool) -> dict:
+    return {
+        "model": model,
+        "created_at": datetime.datetime.utcnow().isoformat() + "Z",
+        "message": {"role": "assistant", "content": content},
+        "done": done,
+    }
+
+
+@app.get("/api/tags")
+def tags():
+    return {"models": [{"name": "llama3:latest", "model": "llama3:latest"}]}
+
+
+@app.post("/api/chat")
+async def chat(request: Request):
+    global _model_slots
+    if _model_slots is None:
+        _model_slots = asyncio.Semaphore(PARALLEL)
+    body = await request.json()
+    model = body.get("model", "llama3")
+    answer = _answer(body.get("messages", []))
+    words = answer.split(" ")
+    step = LATENCY / max(1, len(words))
+
+    async def generate():
+        async with _model_slots:
+            app.state.generations += 1
+            for i, word in enumerate(words):
+                await asyncio.sleep(step)
+                yield word if i == 0 else " " + word
+
+    if body.get("stream", True):
+        async def lines():
+            async for token in generate():
+                yield json.dumps(_message(model, token, False)) + "\n"
+            yield json.dumps(_message(model, "", True)) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return _message(model, "".join([token async for token in generate()]), True)
+
+
+@app.get("/stats")
+def stats():
+    return {"generations": app.state.generations}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=LATENCY, help="Seconds per generation")
+    parser.add_argument("--parallel", type=int, default=PARALLEL, help="Generations served at once")
+    args = parser.parse_args()
+    LATENCY, PARALLEL = args.latency, args.parallel
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
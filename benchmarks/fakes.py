@@ -0,0 +1,135 @@
+"""
+Local stand-ins for the paid/GPU parts of the gate, used by the benchmark
+server: a YOLO model and a Gemini model with configurable latencies, and a
+synthetic fleet whose frames carry the truck number in the pixels, so the
+fake OCR returns the right plate without any model.
+"""
+import asyncio
+import os
+import time
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+FAKE_YOLO_LATENCY = float(os.getenv("FAKE_YOLO_LATENCY", "0.03"))  # per predict() call
+FAKE_YOLO_FRAME_LATENCY = float(os.getenv("FAKE_YOLO_FRAME_LATENCY", "0.01"))  # per frame in the batch
+FAKE_GEMINI_LATENCY = float(os.getenv("FAKE_GEMINI_LATENCY", "0.4"))
+
+FRAME_SIZE = (480, 640)  # rows, cols
+PLATE_BOX = (220, 330, 420, 380)  # x1, y1, x2, y2: the truck at the barrier
+QUEUE_BOXES = [(60, 180, 160, 205), (470, 170, 570, 195)]  # Trucks waiting behind: small, distant plates
+BOX_CONFIDENCES = [0.91, 0.74, 0.68]
+MARKER = 77  # Blue channel of the 4x4 block in the plate's corner: "this is a synthetic plate"
+CLIENT_IDS = [1, 2, 3, 4, 5, 6, 7, 8, 15, 24]
+FIRST_TRUCK_ID = 1000
+MAX_FLEET = 65536
+
+
+def plate_for(index: int) -> str:
+    """Deterministic, unique Tunisian plate for truck `index` (< MAX_FLEET)."""
+    return f"{100 + index % 160} تونس {1000 + index // 160}"
+
+
+def _draw_plate(frame: np.ndarray, box, index: int):
+    x1, y1, x2, y2 = box
+    frame[y1:y2, x1:x2] = 255
+    scale = (y2 - y1) / 42
+    cv2.putText(frame, f"{index:06d}", (x1 + int(20 * scale), y2 - int(12 * scale)), cv2.FONT_HERSHEY_SIMPLEX,
+                1.2 * scale, (0, 0, 0), max(1, int(3 * scale)))
+    frame[y1:y1 + 4, x1:x1 + 4] = (MARKER, index % 256, index // 256)  # BGR, lossless with PNG
+
+
+def render_frame(index: Optional[int], queued: Tuple[int, ...] = (), encoding: str = ".png") -> bytes:
+    """Gate camera frame with truck `index`'s plate (empty lane when None) and up to two trucks queued behind."""
+    frame = np.full((*FRAME_SIZE, 3), 90, dtype=np.uint8)
+    if index is not None:
+        _draw_plate(frame, PLATE_BOX, index)
+    for box, queued_index in zip(QUEUE_BOXES, queued):
+        _draw_plate(frame, box, queued_index)
+    ok, encoded = cv2.imencode(encoding, frame)
+    return encoded.tobytes()
+
+
+def decode_marker(rgb: np.ndarray) -> Optional[int]:
+    r, g, b = (int(v) for v in rgb[1, 1, :3])
+    return r * 256 + g if b == MARKER else None
+
+
+class _Box:
+    def __init__(self, xyxy, conf):
+        self.xyxy = [xyxy]
+        self.conf = [conf]
+
+
+class _Result:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class FakeYOLO:
+    """ultralytics-like predict(): the synthetic plates of each frame, after a batch-shaped delay."""
+
+    def __init__(self, latency: float = FAKE_YOLO_LATENCY, frame_latency: float = FAKE_YOLO_FRAME_LATENCY):
+        self.latency = latency
+        self.frame_latency = frame_latency
+
+    def predict(self, frames, conf: float = 0.5, verbose: bool = False) -> List[_Result]:
+        if isinstance(frames, np.ndarray):
+            frames = [frames]
+        time.sleep(self.latency + self.frame_latency * len(frames))
+        results = []
+        for frame in frames:
+            boxes = []
+            # Reverse confidence order, like a detector that does not sort its output
+            for box, confidence in reversed(list(zip([PLATE_BOX] + QUEUE_BOXES, BOX_CONFIDENCES))):
+                x1, y1, x2, y2 = box
+                if frame.shape[0] > y2 and frame.shape[1] > x2 and frame[y1 + 1, x1 + 1, 0] == MARKER:
+                    boxes.append(_Box([x1, y1, x2, y2], confidence))
+            results.append(_Result(boxes))
+        return results
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGemini:
+    """GenerativeModel stand-in: reads the marker of the PIL crops it is given (one or a numbered batch)."""
+
+    def __init__(self, latency: float = FAKE_GEMINI_LATENCY):
+        self.latency = latency
+        self.calls = 0
+
+    def _answer(self, contents) -> _Response:
+        self.calls += 1
+        indexes = [decode_marker(np.asarray(item)) for item in contents if not isinstance(item, str)]
+        plates = [plate_for(index) if index is not None else "UNREADABLE" for index in indexes]
+        if len(plates) == 1:
+            return _Response(f"PLATE: {plates[0]}")
+        return _Response("\n".join(f"PLATE {number}: {plate}" for number, plate in enumerate(plates, 1)))
+
+    def generate_content(self, contents):
+        time.sleep(self.latency)
+        return self._answer(contents)
+
+    async def generate_content_async(self, contents):
+        await asyncio.sleep(self.latency)
+        return self._answer(contents)
+
+
+def seed_fleet(database, size: int):
+    """init_db() data + `size` synthetic trucks spread over the seeded clients."""
+    size = min(size, MAX_FLEET)
+    database.init_db()
+    rows = []
+    for index in range(size):
+        plaque = plate_for(index)
+        rows.append((FIRST_TRUCK_ID + index, "Camion plateau", plaque, *database.normalize_plate(plaque),
+                     CLIENT_IDS[index % len(CLIENT_IDS)]))
+    with database.db_cursor(commit=True) as cursor:
+        cursor.execute("DELETE FROM camion WHERE idCamion >= %s", (FIRST_TRUCK_ID,))
+        cursor.executemany("INSERT INTO camion (idCamion, type, plaque, plaque_key, plaque_serial, idClient) "
+                           "VALUES (%s, %s, %s, %s, %s, %s)", rows)
+    print(f"✅ Synthetic fleet: {size} trucks")
@@ -0,0 +1,79 @@
+"""
+RAG ingestion throughput (chunks/sec) on a synthetic corpus: the per-file
+`collection.add` loop vs. the bulk pipeline (process-pool chunking +
+fixed-size embedding batches + bulk upserts).
+
+    python -m benchmarks.ingest_bench --files 2000 --batch-size 256 --workers 4
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+CLIENTS = ["City Schools", "RetailCorp", "GlobalTech Supplies", "CleanStep Co.", "MedSupply", "AutoParts TN"]
+PRODUCTS = ["Paper A4", "Laptops (Model X)", "Printer Ink", "Disinfectant Spray", "Monitors 24\"", "Keyboards"]
+
+
+def write_corpus(root: str, files: int, rng: random.Random):
+    for i in range(files):
+        category = rng.choice(["orders", "suppliers", "clients", "policies"])
+        os.makedirs(os.path.join(root, category), exist_ok=True)
+        sections = []
+        for j in range(rng.randint(4, 10)):
+            client, product = rng.choice(CLIENTS), rng.choice(PRODUCTS)
+            sections.append(
+                f"## Order #ORD-{i:05d}-{j}\n\n"
+                f"- **Client:** {client}\n- **Items:** {rng.randint(1, 500)} {product}\n"
+                f"- **Status:** {rng.choice(['Delivered', 'Late', 'Scheduled', 'Cancelled'])}\n\n"
+                f"{client} requested gate {rng.choice('ABCDE')} for {product}; "
+                f"unloading took {rng.randint(10, 90)} minutes with {rng.randint(0, 3)} forklifts."
+            )
+        with open(os.path.join(root, category, f"history_{i:05d}.md"), "w", encoding="utf-8") as f:
+            f.write(f"# Historique {i}\n\n" + "\n\n".join(sections))
+
+
+def legacy_ingest(engine, data_dir: str) -> int:
+    """The original load_documents loop: one collection.add per file."""
+    from src.ingest import discover
+    total = 0
+    for file_path in discover(data_dir):
+        with open(file_path, "r", encoding="utf-8") as f:
+            chunks = [c.strip() for c in f.read().split("\n\n") if c.strip()]
+        name = os.path.relpath(file_path, data_dir)
+        engine.collection.add(documents=chunks, ids=[f"{name}_{i}" for i in range(len(chunks))],
+                              metadatas=[{"source": name} for _ in chunks])
+        total += len(chunks)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    from src.ingest import BulkIngestor
+    from src.rag_engine import WarehouseRAGEngine
+
+    workdir = tempfile.mkdtemp()
+    corpus = os.path.join(workdir, "corpus")
+    write_corpus(corpus, args.files, random.Random(7))
+    print(f"📚 Synthetic corpus: {args.files} files in {corpus}")
+
+    if not args.skip_legacy:
+        engine = WarehouseRAGEngine(db_path=os.path.join(workdir, "legacy_db"))
+        start = time.perf_counter()
+        chunks = legacy_ingest(engine, corpus)
+        elapsed = time.perf_counter() - start
+        print(f"   per-file add : {chunks} chunks in {elapsed:.1f}s ({chunks / elapsed:.0f} chunks/s)")
+
+    engine = WarehouseRAGEngine(db_path=os.path.join(workdir, "bulk_db"))
+    stats = BulkIngestor(engine, batch_size=args.batch_size, workers=args.workers).run(corpus)
+    print(f"   bulk ingest  : {stats['chunks']} chunks in {stats['seconds']}s ({stats['chunks_per_sec']:.0f} chunks/s)")
+
+
+if __name__ == "__main__":
+    main()
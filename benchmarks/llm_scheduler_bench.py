@@ -0,0 +1,88 @@
+"""
+Gate decision latency during a chatbot burst, with and without the LLM
+scheduler, against the fake ollama server.
+
+    python -m benchmarks.fake_ollama --port 11435 --latency 0.3 &
+    python -m benchmarks.llm_scheduler_bench --host http://127.0.0.1:11435
+
+A burst of --chats chat requests (--duplicates of them identical) is fired,
+then --gates gate decisions arrive while the chats are still queued.
+"""
+import argparse
+import asyncio
+import time
+
+import ollama
+
+from src.llm_scheduler import LLMScheduler, PRIORITY_CHAT, PRIORITY_GATE, SchedulerBusy
+
+CHAT_PROMPT = "Réponds en JSON. Client {i} veut commander {i} palettes."
+GATE_PROMPT = "Decide the gate for truck {i}."
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def timed(call):
+    start = time.perf_counter()
+    try:
+        await call
+        return time.perf_counter() - start, None
+    except SchedulerBusy:
+        return None, "rejected"
+    except asyncio.TimeoutError:
+        return None, "timeout"
+
+
+async def run_burst(chat, args):
+    def chat_prompt(i):
+        return CHAT_PROMPT.format(i=0 if i < args.duplicates else i)
+
+    chats = [asyncio.ensure_future(timed(chat(chat_prompt(i), PRIORITY_CHAT))) for i in range(args.chats)]
+    await asyncio.sleep(0.05)  # Gates arrive once the chat burst is queued
+    gates = [asyncio.ensure_future(timed(chat(GATE_PROMPT.format(i=i), PRIORITY_GATE))) for i in range(args.gates)]
+    return await asyncio.gather(*gates), await asyncio.gather(*chats)
+
+
+def report(label: str, gates, chats):
+    gate_times = [t for t, _ in gates if t is not None]
+    chat_times = [t for t, _ in chats if t is not None]
+    errors = [e for _, e in gates + chats if e]
+    print(f"{label:<10} gate p50 {percentile(gate_times, 50):6.2f}s  p95 {percentile(gate_times, 95):6.2f}s | "
+          f"chat p50 {percentile(chat_times, 50):6.2f}s  max {max(chat_times, default=0):6.2f}s | "
+          f"rejected {errors.count('rejected')}  timeouts {errors.count('timeout')}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="http://127.0.0.1:11435")
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--duplicates", type=int, default=5, help="Chat requests sharing the same prompt")
+    parser.add_argument("--gates", type=int, default=3)
+    parser.add_argument("--max-queue", type=int, default=32)
+    args = parser.parse_args()
+
+    client = ollama.AsyncClient(host=args.host)
+
+    async def direct(prompt, _priority):
+        return await client.chat(model="llama3", messages=[{"role": "user", "content": prompt}])
+
+    gates, chats = await run_burst(direct, args)
+    report("direct", gates, chats)
+
+    scheduler = LLMScheduler(client, max_queue=args.max_queue)
+
+    async def scheduled(prompt, priority):
+        return await scheduler.chat("llama3", [{"role": "user", "content": prompt}], priority=priority)
+
+    gates, chats = await run_burst(scheduled, args)
+    report("scheduled", gates, chats)
+    print(f"📊 Scheduler: {scheduler.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
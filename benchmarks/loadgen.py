@@ -0,0 +1,426 @@
+"""
+End-to-end load test of the gate (/process-entrance) and the chatbot
+(/chatbot-order) with open-loop Poisson arrivals.
+
+By default everything runs locally: benchmarks.fake_ollama for the LLM and
+benchmarks.bench_server (the real app with fake YOLO/Gemini models and a
+seeded synthetic fleet). Latencies are measured from the scheduled arrival
+time, so client-side queueing behind --concurrency counts (no coordinated
+omission). Per-stage percentiles come from the server's /metrics
+histograms, diffed over the run; CPU and memory are sampled from /proc.
+
+    python -m benchmarks.loadgen --gate-rate 5 --chat-rate 1 --duration 60 --label baseline
+    python -m benchmarks.loadgen --url http://127.0.0.1:8000 --gate-rate 2      # already running server
+    python -m benchmarks.loadgen --compare benchmarks/results/A.json benchmarks/results/B.json
+
+Results are written as JSON (--out, default benchmarks/results/<time>-<label>.json).
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.fakes import render_frame
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+PERCENTILES = (50, 95, 99)
+CHAT_MESSAGES = [
+    "Bonjour, je voudrais commander 3 Cartons A4 pour Client Alpha",
+    "Quel est le stock des Claviers USB ?",
+    "Je suis Client Beta, il me faut 10 souris optiques",
+    "Inscrivez le client Nouveau Transport SARL",
+    "Merci, ce sera tout.",
+]
+
+_METRIC_LINE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+# --- /metrics parsing ---
+
+def parse_histograms(text: str, name: str) -> Dict[tuple, Dict]:
+    """{label values (without le): {"buckets": {le: cumulative count}, "sum": s, "count": n}}"""
+    series = defaultdict(lambda: {"buckets": {}, "sum": 0.0, "count": 0})
+    for line in text.splitlines():
+        match = _METRIC_LINE.match(line)
+        if not match or not match.group(1).startswith(name):
+            continue
+        metric, raw_labels, value = match.groups()
+        labels = dict(_LABEL.findall(raw_labels or ""))
+        le = labels.pop("le", None)
+        key = tuple(sorted(labels.items()))
+        if metric == name + "_bucket":
+            series[key]["buckets"][float(le)] = float(value)
+        elif metric == name + "_sum":
+            series[key]["sum"] = float(value)
+        elif metric == name + "_count":
+            series[key]["count"] = float(value)
+    return dict(series)
+
+
+def _bucket_quantile(buckets: Dict[float, float], count: float, q: float) -> float:
+    """Linear interpolation inside the bucket holding the q-th observation (histogram_quantile)."""
+    rank = q * count
+    lower_bound, lower_count = 0.0, 0.0
+    for bound in sorted(buckets):
+        if buckets[bound] >= rank:
+            if bound == float("inf"):
+                return lower_bound
+            span = buckets[bound] - lower_count
+            return lower_bound + (bound - lower_bound) * ((rank - lower_count) / span if span else 1.0)
+        lower_bound, lower_count = bound, buckets[bound]
+    return lower_bound
+
+
+def histogram_delta(before: Dict[tuple, Dict], after: Dict[tuple, Dict]) -> Dict[str, Dict]:
+    report = {}
+    for key, end in after.items():
+        start = before.get(key, {"buckets": {}, "sum": 0.0, "count": 0})
+        count = end["count"] - start["count"]
+        if count <= 0:
+            continue
+        buckets = {le: n - start["buckets"].get(le, 0) for le, n in end["buckets"].items()}
+        entry = {"count": int(count), "mean_ms": round((end["sum"] - start["sum"]) / count * 1000, 2)}
+        for pct in PERCENTILES:
+            entry[f"p{pct}_ms"] = round(_bucket_quantile(buckets, count, pct / 100) * 1000, 2)
+        report["/".join(value for _, value in key)] = entry
+    return report
+
+
+# --- Server process resources ---
+
+class ResourceSampler:
+    """CPU time and RSS of a local process, read from /proc every `interval` seconds."""
+
+    def __init__(self, pid: Optional[int], interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.rss_samples = []
+        self.threads_peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._cpu_start = None
+        self._started = None
+
+    def _cpu_seconds(self) -> Optional[float]:
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")  # utime + stime
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def _sample(self):
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                status = dict(line.split(":", 1) for line in f if ":" in line)
+            self.rss_samples.append(int(status["VmRSS"].split()[0]) / 1024)
+            self.threads_peak = max(self.threads_peak, int(status["Threads"]))
+        except (OSError, KeyError, ValueError):
+            pass
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> "ResourceSampler":
+        if self.pid:
+            self._cpu_start = self._cpu_seconds()
+            self._started = time.monotonic()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> Dict:
+        if not self._thread:
+            return {}
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        cpu_end = self._cpu_seconds()
+        elapsed = time.monotonic() - self._started
+        report = {"rss_peak_mb": round(max(self.rss_samples, default=0), 1),
+                  "rss_end_mb": round(self.rss_samples[-1], 1) if self.rss_samples else None,
+                  "threads_peak": self.threads_peak}
+        if self._cpu_start is not None and cpu_end is not None:
+            report["cpu_seconds"] = round(cpu_end - self._cpu_start, 2)
+            report["cpu_percent"] = round((cpu_end - self._cpu_start) / elapsed * 100, 1)
+        return report
+
+
+# --- Load ---
+
+class Workload:
+    def __init__(self, args, rng: random.Random):
+        self.args = args
+        self.rng = rng
+        self.recent: List[int] = []
+        self._frames: Dict[Optional[int], bytes] = {}
+
+    def _frame(self, index: Optional[int], queued: tuple = ()) -> bytes:
+        if queued:
+            return render_frame(index, queued)
+        if index not in self._frames:
+            self._frames[index] = render_frame(index)
+        return self._frames[index]
+
+    def gate_request(self) -> dict:
+        if self.rng.random() < self.args.empty_ratio:
+            index = None
+        elif self.recent and self.rng.random() < self.args.repeat_ratio:
+            index = self.rng.choice(self.recent)  # Truck still at the barrier: resubmitted frame
+        else:
+            index = self.rng.randrange(self.args.fleet)
+            self.recent = (self.recent + [index])[-20:]
+        queued = ()
+        if index is not None and self.rng.random() < self.args.queue_ratio:
+            queued = tuple(self.rng.randrange(self.args.fleet) for _ in range(self.rng.randint(1, 2)))
+        return {"method": "POST", "url": "/process-entrance",
+                "files": {"file": ("gate.png", self._frame(index, queued), "image/png")}}
+
+    def chat_request(self) -> dict:
+        return {"method": "POST", "url": "/chatbot-order",
+                "json": {"message": self.rng.choice(CHAT_MESSAGES),
+                         "session_id": f"bench-{self.rng.randrange(self.args.sessions)}"}}
+
+
+async def _issue(client: httpx.AsyncClient, slots: asyncio.Semaphore, endpoint: str,
+                 request: dict, scheduled: float, results: list):
+    async with slots:
+        try:
+            response = await client.request(**request)
+            status = response.status_code
+            if status == 200 and response.headers.get("content-type", "").startswith("application/json"):
+                body = response.json()
+                if isinstance(body, dict) and body.get("status") == "error":
+                    status = "app_error"  # The chatbot reports model/DB failures with a 200
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+    results.append({"endpoint": endpoint, "latency": time.perf_counter() - scheduled, "status": status})
+
+
+async def open_loop(client, slots, endpoint: str, rate: float, duration: float, make_request, results, rng):
+    if rate <= 0:
+        return
+    tasks = []
+    start = time.perf_counter()
+    scheduled = start
+    while scheduled < start + duration:
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(_issue(client, slots, endpoint, make_request(), scheduled, results)))
+        scheduled += rng.expovariate(rate)
+    await asyncio.gather(*tasks)
+
+
+def summarize(results: list, elapsed: float) -> Dict[str, Dict]:
+    by_endpoint = defaultdict(list)
+    for r in results:
+        by_endpoint[r["endpoint"]].append(r)
+    summary = {}
+    for endpoint, rows in by_endpoint.items():
+        ok = [r["latency"] for r in rows if r["status"] == 200]
+        entry = {"sent": len(rows), "ok": len(ok), "throughput_rps": round(len(ok) / elapsed, 2),
+                 "statuses": dict(Counter(str(r["status"]) for r in rows))}
+        for pct in PERCENTILES:
+            entry[f"p{pct}_ms"] = round(percentile(ok, pct) * 1000, 1)
+        entry["max_ms"] = round(max(ok, default=0) * 1000, 1)
+        summary[endpoint] = entry
+    return summary
+
+
+async def run_load(args, base_url: str, server_pid: Optional[int]) -> Dict:
+    rng = random.Random(args.seed)
+    workload = Workload(args, rng)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout, limits=limits) as client:
+        for _ in range(args.warmup):
+            await client.request(**workload.gate_request())
+        before = (await client.get("/metrics")).text
+        slots = asyncio.Semaphore(args.concurrency)
+        results = []
+        sampler = ResourceSampler(server_pid).start()
+        started = time.perf_counter()
+        await asyncio.gather(
+            open_loop(client, slots, "gate", args.gate_rate, args.duration, workload.gate_request, results, rng),
+            open_loop(client, slots, "chat", args.chat_rate, args.duration, workload.chat_request, results, rng),
+        )
+        elapsed = time.perf_counter() - started
+        resources = sampler.stop()
+        after = (await client.get("/metrics")).text
+
+    stage_before = parse_histograms(before, "smartwarehouse_stage_seconds")
+    stage_after = parse_histograms(after, "smartwarehouse_stage_seconds")
+    return {
+        "elapsed_seconds": round(elapsed, 2),
+        "endpoints": summarize(results, elapsed),
+        "stages": histogram_delta(stage_before, stage_after),
+        "resources": resources,
+    }
+
+
+# --- Local stand-ins ---
+
+def wait_ready(base_url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    with httpx.Client(base_url=base_url, timeout=2.0) as client:
+        while time.monotonic() < deadline:
+            try:
+                if client.get("/ready").status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            time.sleep(0.2)
+    raise RuntimeError(f"{base_url} not ready after {timeout}s")
+
+
+def start_stack(args) -> tuple:
+    processes = []
+    env = dict(os.environ)
+    ollama_host = args.ollama_host
+    if not ollama_host:
+        ollama_port = args.port + 1
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_ollama", "--port", str(ollama_port),
+             "--latency", str(args.llm_latency), "--parallel", str(args.llm_parallel)]))
+        ollama_host = f"http://127.0.0.1:{ollama_port}"
+    env["OLLAMA_HOST"] = ollama_host
+    command = [sys.executable, "-m", "benchmarks.bench_server", "--port", str(args.port), "--fleet", str(args.fleet)]
+    if args.yolo_latency is not None:
+        command += ["--yolo-latency", str(args.yolo_latency)]
+    if args.gemini_latency is not None:
+        command += ["--gemini-latency", str(args.gemini_latency)]
+    server = subprocess.Popen(command, env=env)
+    processes.append(server)
+    return f"http://127.0.0.1:{args.port}", server.pid, processes
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# --- Reporting ---
+
+def print_report(report: Dict):
+    print(f"\n{'endpoint':<8} {'sent':>6} {'ok':>6} {'rps':>7} {'p50':>9} {'p95':>9} {'p99':>9}   statuses")
+    for endpoint, e in report["endpoints"].items():
+        print(f"{endpoint:<8} {e['sent']:>6} {e['ok']:>6} {e['throughput_rps']:>7} {e['p50_ms']:>7}ms "
+              f"{e['p95_ms']:>7}ms {e['p99_ms']:>7}ms   {e['statuses']}")
+    print(f"\n{'stage':<28} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, s in sorted(report["stages"].items()):
+        print(f"{name:<28} {s['count']:>6} {s['p50_ms']:>7}ms {s['p95_ms']:>7}ms {s['p99_ms']:>7}ms")
+    if report["resources"]:
+        print(f"\nserver: {report['resources']}")
+
+
+def compare(path_a: str, path_b: str):
+    with open(path_a) as f:
+        a = json.load(f)
+    with open(path_b) as f:
+        b = json.load(f)
+    print(f"A = {a['meta']['label']} ({a['meta']['git']})   B = {b['meta']['label']} ({b['meta']['git']})")
+
+    def row(name, old, new, unit):
+        change = f"{(new - old) / old * 100:+6.1f}%" if old else "    n/a"
+        print(f"{name:<36} {old:>10}{unit} {new:>10}{unit} {change}")
+
+    for endpoint in sorted(set(a["endpoints"]) | set(b["endpoints"])):
+        old, new = a["endpoints"].get(endpoint, {}), b["endpoints"].get(endpoint, {})
+        row(f"{endpoint} throughput", old.get("throughput_rps", 0), new.get("throughput_rps", 0), "rps")
+        for pct in PERCENTILES:
+            row(f"{endpoint} p{pct}", old.get(f"p{pct}_ms", 0), new.get(f"p{pct}_ms", 0), "ms")
+    for name in sorted(set(a["stages"]) | set(b["stages"])):
+        row(f"{name} p95", a["stages"].get(name, {}).get("p95_ms", 0), b["stages"].get(name, {}).get("p95_ms", 0), "ms")
+    for key in ("cpu_seconds", "rss_peak_mb"):
+        if key in a["resources"] and key in b["resources"]:
+            row(f"server {key}", a["resources"][key], b["resources"][key], "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Target an already running API instead of starting the local stack")
+    parser.add_argument("--port", type=int, default=8765, help="Local stack: API port (fake ollama on port+1)")
+    parser.add_argument("--ollama-host", help="Local stack: real ollama instead of benchmarks.fake_ollama")
+    parser.add_argument("--gate-rate", type=float, default=5.0, help="Gate arrivals per second")
+    parser.add_argument("--chat-rate", type=float, default=1.0, help="Chat messages per second")
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--concurrency", type=int, default=64, help="Max in-flight requests")
+    parser.add_argument("--fleet", type=int, default=5000)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--empty-ratio", type=float, default=0.05, help="Frames without a plate")
+    parser.add_argument("--repeat-ratio", type=float, default=0.2, help="Frames of a truck seen recently")
+    parser.add_argument("--queue-ratio", type=float, default=0.1, help="Frames with 1-2 more trucks queued behind")
+    parser.add_argument("--warmup", type=int, default=5, help="Gate requests sent before measuring")
+    parser.add_argument("--yolo-latency", type=float)
+    parser.add_argument("--gemini-latency", type=float)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-parallel", type=int, default=1)
+    parser.add_argument("--request-timeout", type=float, default=120)
+    parser.add_argument("--ready-timeout", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--out")
+    parser.add_argument("--compare", nargs=2, metavar=("A", "B"), help="Compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    processes = []
+    try:
+        if args.url:
+            base_url, server_pid = args.url, None
+        else:
+            base_url, server_pid, processes = start_stack(args)
+        wait_ready(base_url, args.ready_timeout)
+        print(f"🚀 {base_url} ready: gate {args.gate_rate}/s, chat {args.chat_rate}/s for {args.duration}s")
+        report = asyncio.run(run_load(args, base_url, server_pid))
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait(timeout=15)
+
+    report["meta"] = {
+        "label": args.label,
+        "git": git_revision(),
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("compare", "out")},
+    }
+    print_report(report)
+    out = args.out or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{args.label}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n✅ Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
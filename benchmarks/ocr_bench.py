@@ -0,0 +1,102 @@
+"""
+OCR accuracy and latency per backend (gemini, local, local+gemini) on a
+labelled image folder, e.g. the test images used in
+smartALPR_Gemini_Vision.ipynb.
+
+Labels come from `labels.csv` in the folder (`filename,plate` rows) or, when
+absent, from the file names ("145_تونس_4862.jpg"). Images are plate crops, or
+full frames with --detector smartALPR_best.pt (best box cropped by YOLO).
+Reads are compared on the normalized plate key used for the DB lookup, so
+"145 TUN 4862" and "145 تونس 4862" count as the same plate.
+
+    python -m benchmarks.ocr_bench --images dataset/test --backends gemini local local+gemini
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+from src.database import normalize_plate
+from src.ocr import create_ocr_backend
+from src.train_ocr import crops_of, load_dataset
+
+
+def same_plate(read: str, label: str) -> bool:
+    return bool(read) and normalize_plate(read)[0] == normalize_plate(label)[0]
+
+
+async def run_backend(name: str, crops, batch_size: int, api_key: str) -> dict:
+    from src.vision import prepare_crop
+
+    backend = create_ocr_backend(api_key, name)
+    backend.warm_up()
+    latencies, correct, read_count, rows = [], 0, 0, []
+    for crop, label in crops:
+        if crop is None:
+            rows.append({"label": label, "read": None, "ms": None})
+            continue
+        start = time.perf_counter()
+        read = await backend.aread(prepare_crop(crop))
+        latencies.append(time.perf_counter() - start)
+        read_count += read.plate is not None
+        correct += same_plate(read.plate, label)
+        rows.append({"label": label, "read": read.plate, "confidence": round(read.confidence, 3),
+                     "engine": read.engine, "ms": round(latencies[-1] * 1000, 1)})
+
+    # Batched throughput: `batch_size` crops per call (one Gemini request / one ONNX run)
+    usable = [prepare_crop(crop) for crop, _ in crops if crop is not None]
+    start = time.perf_counter()
+    for i in range(0, len(usable), batch_size):
+        await backend.aread_batch(usable[i:i + batch_size])
+    batch_seconds = time.perf_counter() - start
+
+    ordered = sorted(latencies)
+    return {
+        "images": len(crops),
+        "accuracy": round(correct / len(crops), 4) if crops else 0.0,
+        "read_rate": round(read_count / len(crops), 4) if crops else 0.0,
+        "p50_ms": round(statistics.median(ordered) * 1000, 1) if ordered else None,
+        "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 1) if ordered else None,
+        "batched_crops_per_second": round(len(usable) / batch_seconds, 1) if batch_seconds else None,
+        "stats": backend.stats(),
+        "reads": rows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", required=True)
+    parser.add_argument("--backends", nargs="+", default=["gemini", "local", "local+gemini"])
+    parser.add_argument("--detector", help="YOLO weights: the images are full frames, not crops")
+    parser.add_argument("--batch", type=int, default=4)
+    parser.add_argument("--out", help="Write the per-image reads and summaries as JSON")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    api_key = os.getenv("GEMINI_API_KEY")
+
+    crops = crops_of(load_dataset(args.images), args.detector)
+    print(f"{len(crops)} labelled images from {args.images}\n")
+    print(f"{'backend':<14} {'accuracy':>9} {'read':>7} {'p50':>9} {'p95':>9} {'batched':>12}")
+    results = {}
+    for name in args.backends:
+        try:
+            result = asyncio.run(run_backend(name, crops, args.batch, api_key))
+        except Exception as e:
+            print(f"{name:<14} ❌ {e}")
+            continue
+        results[name] = result
+        print(f"{name:<14} {result['accuracy']:>9.1%} {result['read_rate']:>7.1%} {result['p50_ms']:>7}ms "
+              f"{result['p95_ms']:>7}ms {result['batched_crops_per_second']:>8} /s   {result['stats']}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\n✅ Per-image reads written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
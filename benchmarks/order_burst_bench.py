@@ -0,0 +1,63 @@
+"""
+Concurrent order bursts on the SQLite stand-in: orders/sec through
+OrderService.create_order (one transaction per order) vs. create_orders
+(one transaction + executemany per batch), with duplicate-ID and oversell checks.
+
+    python -m benchmarks.order_burst_bench --orders 2000 --concurrency 16 --batch 100
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def check(database, stock_before: int, label: str, results, elapsed: float):
+    created = [r for r in results if r["status"] == "created"]
+    ids = [r["idCommande"] for r in created]
+    with database.db_cursor() as cursor:
+        cursor.execute("SELECT Quantite FROM produit WHERE idProduit = 1")
+        stock_after = cursor.fetchone()[0]
+    sold = stock_before - stock_after
+    print(f"{label:<8} {len(results) / elapsed:8.0f} orders/s | created {len(created):5} | "
+          f"duplicate ids {len(ids) - len(set(ids))} | stock {stock_before} -> {stock_after} "
+          f"(sold {sold}, ordered {len(created)}) | oversold {'yes' if stock_after < 0 else 'no'}")
+
+
+def reset_stock(database, stock: int):
+    with database.db_cursor(commit=True) as cursor:
+        cursor.execute("UPDATE produit SET Quantite = %s WHERE idProduit = 1", (stock,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--stock", type=int, default=1500, help="Less than --orders: the burst must hit the limit")
+    args = parser.parse_args()
+
+    os.environ["DB_BACKEND"] = "sqlite"
+    os.environ["DB_SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "orders.db")
+    from src import database
+    from src.orders import OrderService
+    database.init_db()
+    service = OrderService()
+
+    reset_stock(database, args.stock)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(lambda _: service.create_order("Client Alpha", "Cartons A4", 1), range(args.orders)))
+    check(database, args.stock, "single", results, time.perf_counter() - start)
+
+    reset_stock(database, args.stock)
+    item = {"client": "Client Alpha", "product": "Cartons A4", "quantity": 1}
+    batches = [[item] * args.batch for _ in range(args.orders // args.batch)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        results = [r for batch in pool.map(service.create_orders, batches) for r in batch]
+    check(database, args.stock, "bulk", results, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
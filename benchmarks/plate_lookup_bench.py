@@ -0,0 +1,89 @@
+"""
+Arrival lookup latency vs. fleet size: legacy `plaque LIKE '%plate%'` scan
+vs. the indexed plaque_key lookup (with its bounded fuzzy fallback).
+Runs on the SQLite stand-in with synthetic fleets.
+
+    python -m benchmarks.plate_lookup_bench --sizes 1000 10000 100000 300000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+GOVERNORATES = range(100, 260)
+
+
+def synthetic_plate(rng: random.Random) -> str:
+    if rng.random() < 0.8:
+        return f"{rng.choice(GOVERNORATES)} تونس {rng.randint(1000, 9999)}"
+    return f"{rng.randint(1000000, 9999999)} نت"
+
+
+def misread(plate: str, rng: random.Random) -> str:
+    """Simulates a one-digit OCR error."""
+    digits = [i for i, c in enumerate(plate) if c.isdigit()]
+    i = rng.choice(digits)
+    return plate[:i] + str((int(plate[i]) + 1) % 10) + plate[i + 1:]
+
+
+def seed_fleet(database, size: int, rng: random.Random):
+    with database.db_cursor(commit=True) as cursor:
+        cursor.execute("DELETE FROM camion")
+        batch = []
+        for idCamion in range(1, size + 1):
+            plaque = synthetic_plate(rng)
+            batch.append((idCamion, "Camion plateau", plaque, *database.normalize_plate(plaque), rng.choice([1, 2, 3, 4, 7])))
+            if len(batch) == 10000:
+                cursor.executemany("INSERT INTO camion (idCamion, type, plaque, plaque_key, plaque_serial, idClient) "
+                                   "VALUES (%s, %s, %s, %s, %s, %s)", batch)
+                batch = []
+        if batch:
+            cursor.executemany("INSERT INTO camion (idCamion, type, plaque, plaque_key, plaque_serial, idClient) "
+                               "VALUES (%s, %s, %s, %s, %s, %s)", batch)
+        cursor.execute("SELECT plaque FROM camion ORDER BY RANDOM() LIMIT 200")
+        return [row[0] for row in cursor.fetchall()]
+
+
+def timed_ms(func, plates) -> float:
+    samples = []
+    for plate in plates:
+        start = time.perf_counter()
+        func(plate)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 300000])
+    parser.add_argument("--lookups", type=int, default=100)
+    args = parser.parse_args()
+
+    os.environ["DB_BACKEND"] = "sqlite"
+    os.environ["DB_SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "fleet.db")
+    from src import database
+    database.init_db()
+    rng = random.Random(42)
+
+    def legacy_lookup(plate):
+        with database.db_cursor(dictionary=True) as cursor:
+            cursor.execute(database.ARRIVAL_INFO_QUERY.format(where="cam.plaque = %s OR cam.plaque LIKE %s"),
+                           (plate, f"%{plate}%", *database.ACTIVE_ORDER_STATUSES))
+            return cursor.fetchone()
+
+    print(f"{'fleet':>8} | {'LIKE scan':>10} | {'exact key':>10} | {'fuzzy':>10}   (median ms)")
+    for size in args.sizes:
+        plates = seed_fleet(database, size, rng)[:args.lookups]
+        # OCR usually returns Latin tokens, the DB stores Arabic ones
+        ocr_plates = [p.replace("تونس", "TUN") for p in plates]
+        misreads = [misread(p, rng) for p in plates]
+        legacy = timed_ms(legacy_lookup, plates)
+        exact = timed_ms(database.get_complete_arrival_info, ocr_plates)
+        fuzzy = timed_ms(database.get_complete_arrival_info, misreads)
+        print(f"{size:>8} | {legacy:>10.3f} | {exact:>10.3f} | {fuzzy:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
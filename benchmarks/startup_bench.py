@@ -0,0 +1,80 @@
+"""
+API cold start: time to import main.py, time until /health answers (the
+server accepts requests) and until /ready returns 200 (models loaded and
+warmed up). The per-component load times reported by /ready are summed to
+show what the former sequential, import-time loading cost.
+
+    python -m benchmarks.startup_bench --runs 3
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def time_import() -> float:
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def time_boot(port: int, timeout: float) -> dict:
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {"live": None, "ready": None, "components": {}}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1.0) as client:
+            while time.perf_counter() - started < timeout:
+                try:
+                    if result["live"] is None and client.get("/health").status_code == 200:
+                        result["live"] = time.perf_counter() - started
+                    response = client.get("/ready")
+                    if response.status_code == 200:
+                        result["ready"] = time.perf_counter() - started
+                        result["components"] = response.json()["components"]
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.05)
+    finally:
+        server.terminate()
+        server.wait(timeout=15)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+    os.environ.setdefault("PYTHONUNBUFFERED", "1")
+
+    imports, lives, readies, sequential = [], [], [], []
+    for run in range(args.runs):
+        imports.append(time_import())
+        boot = time_boot(args.port, args.timeout)
+        if boot["ready"] is None:
+            print(f"❌ run {run + 1}: not ready after {args.timeout}s ({boot['components']})")
+            continue
+        lives.append(boot["live"])
+        readies.append(boot["ready"])
+        loads = {name: status.get("load_seconds", 0) for name, status in boot["components"].items()}
+        sequential.append(sum(loads.values()))
+        print(f"run {run + 1}: import {imports[-1]:.2f}s | live {boot['live']:.2f}s | "
+              f"ready {boot['ready']:.2f}s | loads {loads}")
+
+    if readies:
+        print(f"\nmedian import {statistics.median(imports):.2f}s | live {statistics.median(lives):.2f}s | "
+              f"ready {statistics.median(readies):.2f}s | sequential loading would take "
+              f"{statistics.median(sequential):.2f}s after import")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+YOLO plate detection throughput (frames/sec) vs. micro-batch size on CPU.
+
+    python -m benchmarks.yolo_batch_bench --model smartALPR_best.pt --image gate.jpg
+    python -m benchmarks.yolo_batch_bench --batch-sizes 1 2 4 8 16 --cameras 16
+
+Without --image, synthetic 1280x720 frames are used (detection cost is
+dominated by the network, not by the image content).
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+
+def load_frames(image_path, count: int):
+    if image_path:
+        frame = cv2.imread(image_path)
+        if frame is None:
+            raise SystemExit(f"❌ Cannot read {image_path}")
+        return [frame.copy() for _ in range(count)]
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="smartALPR_best.pt")
+    parser.add_argument("--image", help="Gate frame to replay (defaults to synthetic frames)")
+    parser.add_argument("--frames", type=int, default=128)
+    parser.add_argument("--cameras", type=int, default=16, help="Concurrent submitters")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+    from src.batching import BatchedDetector
+
+    model = YOLO(args.model)
+    frames = load_frames(args.image, args.frames)
+    model.predict(frames[0], conf=0.5, verbose=False)  # Warm-up
+
+    print(f"🏁 {args.frames} frames from {args.cameras} cameras, max wait {args.max_wait_ms} ms")
+    baseline = None
+    for batch_size in args.batch_sizes:
+        detector = BatchedDetector(model, max_batch_size=batch_size, max_wait_ms=args.max_wait_ms)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.cameras) as cameras:
+            list(cameras.map(detector.detect, frames))
+        fps = args.frames / (time.perf_counter() - start)
+        baseline = baseline or fps
+        print(f"   batch={batch_size:<3} {fps:7.1f} frames/s  (x{fps / baseline:.2f})  {detector.stats()}")
+
+
+if __name__ == "__main__":
+    main()
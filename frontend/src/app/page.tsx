@@ -54,12 +54,40 @@ export default function Dashboard() {
     formData.append("file", file);
 
     try {
-      const res = await fetch("http://localhost:8000/process-entrance", {
+      // Streaming endpoint: plate, facts and decision tokens arrive as they are ready
+      const res = await fetch("http://localhost:8000/process-entrance/stream", {
         method: "POST",
         body: formData,
       });
-      const data = await res.json();
-      setResult(data);
+      const reader = res.body!.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let current: any = { status: "success", analysis: "" };
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        const frames = buffer.split("\n\n");
+        buffer = frames.pop() ?? "";
+        for (const frame of frames) {
+          const event = frame.match(/^event: (.*)$/m)?.[1];
+          const data = frame.match(/^data: (.*)$/m)?.[1];
+          if (!event || !data) continue;
+          const payload = JSON.parse(data);
+
+          if (event === "error") {
+            current = payload;
+          } else if (event === "token") {
+            current = { ...current, analysis: current.analysis + payload.text };
+          } else {
+            current = { ...current, ...payload };
+          }
+          setResult(current);
+          if (event === "plate") setLoading(false);
+        }
+      }
     } catch (err) {
       console.error("Error processing image:", err);
     } finally {
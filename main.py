@@ -1,14 +1,83 @@
 import os
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import asyncio
+import json
+import re
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
 from src.vision import VisionPipeline
 from src.agent import WarehouseAgent
+from src.pipeline import EntrancePipeline
+from src.rules import ORDER_STATUSES
+from src.event_log import EventJournal, JournalFull
+from src.database import get_pool
+from src.metrics import REGISTRY, REQUEST_SECONDS, PROFILE_SLOW_MS, SamplingProfiler
+from src.llm_scheduler import PRIORITY_CHAT, SchedulerBusy
+from src.sessions import create_session_store
+from src.catalog import Catalog
+from src.orders import OrderService
+from src.startup import Components, ComponentNotReady
 from dotenv import load_dotenv
-import datetime
 
 load_dotenv()
 
-app = FastAPI(title="SmartWarehouse AI API")
+# Initialize components
+API_KEY = os.getenv("GEMINI_API_KEY")
+MODEL_PATH = "smartALPR_best.pt"
+
+if not API_KEY:
+    print("⚠️ Warning: GEMINI_API_KEY not found in .env")
+
+def load_vision() -> VisionPipeline:
+    vision = VisionPipeline(MODEL_PATH, API_KEY)
+    vision.warm_up()
+    return vision
+
+def load_agent() -> WarehouseAgent:
+    agent = WarehouseAgent(API_KEY)
+    agent.rag.warm_up()
+    return agent
+
+# Models are loaded after the server is up: /health answers at once, /ready once everything is warm
+components = Components()
+components.register("vision", load_vision)
+components.register("agent", load_agent)
+components.register("journal", lambda: EventJournal().start())
+# Without the journal (DB down at startup) the pipeline writes order statuses directly
+components.register("pipeline", EntrancePipeline, depends=("vision", "agent"), optional=("journal",))
+
+async def warm_up():
+    await components.start()
+    vision, agent, journal = (components.peek(name) for name in ("vision", "agent", "journal"))
+    if vision:
+        REGISTRY.collector("ocr_cache", vision.ocr_cache.stats)
+        REGISTRY.collector("yolo_batch", vision.detector.stats)
+    if agent:
+        REGISTRY.collector("rag_cache", agent.rag.cache_stats)
+        REGISTRY.collector("decisions", agent.rules.stats.report)
+        REGISTRY.collector("llm", agent.llm.stats)
+        REGISTRY.collector("gates", agent.gates.stats)
+        # Optional live reload of the knowledge base: editing data/**/*.md updates the agent without a restart
+        if os.getenv("RAG_WATCH", "0") == "1":
+            from src.rag_engine import KnowledgeBaseWatcher
+            KnowledgeBaseWatcher(agent.rag, os.getenv("RAG_DATA_DIR", "data")).start()
+    if journal:
+        REGISTRY.collector("journal", journal.stats)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # YOLO and the embedding model load in parallel threads while requests are already accepted
+    warm_up_task = asyncio.create_task(warm_up())
+    yield
+    warm_up_task.cancel()
+    journal = components.peek("journal")
+    if journal:
+        await asyncio.to_thread(journal.stop)
+
+app = FastAPI(title="SmartWarehouse AI API", lifespan=lifespan)
 
 # CORS setup for Frontend
 app.add_middleware(
@@ -18,89 +87,107 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize components
-API_KEY = os.getenv("GEMINI_API_KEY")
-MODEL_PATH = "smartALPR_best.pt"
+# Opt-in: PROFILE_SLOW_MS=2000 dumps collapsed stacks of every request slower than 2s
+profiler = SamplingProfiler().start() if PROFILE_SLOW_MS > 0 else None
 
-if not API_KEY:
-    print("⚠️ Warning: GEMINI_API_KEY not found in .env")
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    started = time.monotonic()
+    response = await call_next(request)
+    ended = time.monotonic()
+    route = request.scope.get("route")
+    route_path = route.path if route else "unmatched"  # Raw paths would explode the label set
+    REQUEST_SECONDS.observe(ended - started, request.method, route_path, str(response.status_code))
+    if profiler and ended - started >= profiler.slow_seconds:
+        path = await asyncio.to_thread(profiler.dump, started, ended, f"{request.method}-{route_path}")
+        if path:
+            print(f"🔥 Slow request {request.method} {route_path} ({(ended - started) * 1000:.0f}ms): {path}")
+    return response
+
+def _not_ready(e: ComponentNotReady) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+async def require(name: str):
+    """The component, waiting for the warm-up for a while; 503 if it is still not there."""
+    try:
+        return await components.get(name)
+    except ComponentNotReady as e:
+        raise _not_ready(e)
 
-vision = VisionPipeline(MODEL_PATH, API_KEY)
-agent = WarehouseAgent(API_KEY)
+def loaded(name: str):
+    """Same as require() for sync endpoints: no waiting."""
+    component = components.peek(name)
+    if component is None:
+        raise _not_ready(ComponentNotReady(f"{name} is still loading"))
+    return component
 
 @app.post("/process-entrance")
 async def process_entrance(file: UploadFile = File(...)):
     """
-    End-to-end flow: Image -> OCR -> RAG Reasoning -> Decision
+    End-to-end flow: Image -> OCR -> (DB facts + RAG) -> Reasoning -> Decision
     """
+    pipeline = await require("pipeline")
     try:
         # Read image
         image_bytes = await file.read()
-        
-        # 1. Vision Layer: OCR to get Plate
-        plate_number = vision.extract_plate_number(image_bytes)
-        
-        if not plate_number:
-            return {
-                "status": "error",
-                "message": "No license plate detected in the image.",
-                "decision": "HOLD",
-                "analysis": "Vehicle arrived but plate recognition failed. Manual check required."
-            }
-
-        print(f"✅ Plate Detected: {plate_number}")
-
-        # 2. Reasoning Layer: RAG + Agent Decision
-        current_time = datetime.datetime.now().strftime("%I:%M %p")
-        analysis = agent.reason({"plate": plate_number, "time": current_time})
-
-        # 3. Action Layer: Update SQL Database based on detection
-        # (Automation: If an order is found, we mark it as 'Processing')
-        from src.database import get_complete_arrival_info, update_order_status
-        facts = get_complete_arrival_info(plate_number)
-        
-        if facts and 'idCommande' in facts:
-            # Mark the order as Processing in MySQL
-            update_order_status(facts['idCommande'], 'en cours')
-            print(f"🔄 Auto-Update: Order for {plate_number} set to 'en cours'")
-
-        return {
-            "status": "success",
-            "plate": plate_number,
-            "analysis": analysis,
-            "timestamp": current_time,
-            "factual_data": facts
-        }
+        return await pipeline.process(image_bytes)
 
     except Exception as e:
         print(f"❌ Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-# Simple in-memory storage for chat history (For demo purposes)
-chat_histories = {} 
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, default=str, ensure_ascii=False)}\n\n"
+
+@app.post("/process-entrance/stream")
+async def process_entrance_stream(file: UploadFile = File(...)):
+    """
+    Server-Sent Events variant of /process-entrance: the plate is pushed as soon
+    as OCR finishes, then the DB facts, then the decision (LLM tokens as generated).
+    """
+    pipeline = await require("pipeline")
+    image_bytes = await file.read()
+
+    async def events():
+        try:
+            async for event, payload in pipeline.stream(image_bytes):
+                yield _sse(event, payload)
+        except Exception as e:
+            print(f"❌ Error: {str(e)}")
+            yield _sse("error", {"status": "error", "message": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Rolling window of chat turns per session (SESSION_BACKEND=sqlite to share it between workers)
+sessions = create_session_store()
+# Client/product names for the chatbot prompt, reloaded on TTL or after a DB write
+catalog = Catalog()
+orders = OrderService()
+
+ORDER_ERRORS = {
+    "unknown_client": "Client non trouvé",
+    "unknown_product": "Produit non trouvé",
+    "invalid_quantity": "Quantité invalide",
+    "insufficient_stock": "Stock insuffisant",
+    "invalid": "Commande invalide",
+}
 
 @app.post("/chatbot-order")
 async def chatbot_order(data: dict):
+    agent = await require("agent")
     try:
         user_message = data.get("message")
         session_id = data.get("session_id", "default")
         
-        # Initialize history if new
-        if session_id not in chat_histories:
-            chat_histories[session_id] = []
-        
-        # 0. Get Warehouse Context
-        from src.database import list_clients, list_products, create_new_order, create_new_client
-        available_clients = list_clients()
-        available_products = list_products()
-        
-        context_summary = f"""
-        Available Clients: {', '.join(available_clients)}
-        Available Products: {', '.join([p['name'] for p in available_products])}
-        """
+        from src.database import create_new_client, run_db
+
+        # Last turns for context (the store only keeps a capped window)
+        history_text = await asyncio.to_thread(sessions.history_text, session_id)
 
-        # Append last messages for context
-        history_text = "\n".join(chat_histories[session_id][-6:]) # Keep last 6 messages
+        # 0. Get Warehouse Context: cached catalog, only the names relevant to this conversation
+        snapshot = await catalog.asnapshot()
+        context_summary = snapshot.prompt_context(f"{history_text}\n{user_message}")
 
         # 1. Ask Ollama (Llama 3) to act as a conversational receptionist
         receptionist_prompt = f"""
@@ -126,13 +213,12 @@ async def chatbot_order(data: dict):
         }}
         """
         
-        import ollama
-        ai_response = ollama.chat(model='llama3', messages=[
+        # Chat turns share the local model with the gate and yield to it
+        ai_response = await agent.llm.chat(agent.model_name, [
             {'role': 'user', 'content': receptionist_prompt}
-        ])
+        ], priority=PRIORITY_CHAT)
         
         res_text = ai_response['message']['content']
-        import json, re
         match = re.search(r'\{.*\}', res_text, re.DOTALL)
         if not match: return {"status": "error", "message": "Problème technique avec le modèle local."}
         
@@ -140,30 +226,124 @@ async def chatbot_order(data: dict):
         intent = decision.get("intent")
         
         # Save to history
-        chat_histories[session_id].append(f"User: {user_message}")
-        chat_histories[session_id].append(f"AI: {decision['response']}")
+        await asyncio.to_thread(sessions.append, session_id, user_message, decision['response'])
 
         # --- EXECUTION ---
         if intent == "register" and decision["details"].get("new_client_name"):
-            res = create_new_client(decision["details"]["new_client_name"])
+            res = await run_db(create_new_client, decision["details"]["new_client_name"])
             if res: return {"status": "success", "message": f"{decision['response']} (Compte créé)"}
 
         if intent == "order" and decision.get("details"):
             det = decision["details"]
-            order_id = create_new_order(det.get('client'), det.get('product'), det.get('quantity'))
-            if order_id: return {"status": "success", "message": f"{decision['response']} (Commande #{order_id} active)"}
-            else: return {"status": "warning", "message": f"{decision['response']} (Erreur: Client ou Produit non trouvé)"}
+            order = await run_db(orders.create_order, det.get('client'), det.get('product'), det.get('quantity'))
+            if order["status"] == "created": return {"status": "success", "message": f"{decision['response']} (Commande #{order['idCommande']} active)"}
+            else: return {"status": "warning", "message": f"{decision['response']} (Erreur: {ORDER_ERRORS[order['status']]})"}
 
         return {"status": "chat", "message": decision["response"]}
 
+    except SchedulerBusy:
+        return JSONResponse(status_code=503, headers={"Retry-After": "5"},
+                            content={"status": "busy", "message": "L'assistant est très sollicité, réessayez dans quelques secondes."})
+    except asyncio.TimeoutError:
+        return {"status": "error", "message": "Le modèle local n'a pas répondu à temps."}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+@app.post("/orders/bulk")
+async def create_orders_bulk(data: dict):
+    """
+    Many orders in one transaction: {"orders": [{"client", "product", "quantity"}, ...]}.
+    Each item gets its own status ("invalid" when it is not an object); stock is reserved atomically per product.
+    """
+    from src.database import run_db
+    items = data.get("orders") or []
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="'orders' must be a list")
+    results = await run_db(orders.create_orders, items)
+    return {"created": sum(r["status"] == "created" for r in results), "results": results}
+
+@app.get("/decision-stats")
+def decision_stats():
+    """Rule fast-path hit rate and average latency per decision path."""
+    return loaded("agent").rules.stats.report()
+
+@app.get("/llm-stats")
+def llm_stats():
+    """LLM scheduler queue depth, wait times, coalesced and rejected calls."""
+    return loaded("agent").llm.stats()
+
+@app.get("/gates")
+def gates():
+    """Dock state: truck at each gate, bay occupancy, queues per urgency and expected dwell times."""
+    return loaded("agent").gates.snapshot()
+
+@app.post("/gates/{gate}/release")
+def release_gate(gate: str):
+    """Truck left the dock: frees the gate and calls the most urgent queued truck."""
+    board = loaded("agent").gates
+    if gate not in board.flow_of_gate:
+        raise HTTPException(status_code=404, detail=f"Unknown gate '{gate}'")
+    return {"released": board.release(gate), "gates": board.snapshot()}
+
+@app.post("/gates/pending/{plate}/admit")
+def admit_truck(plate: str, data: dict = None):
+    """Guard confirmed a held arrival (unknown plate, order not active): it gets a gate or a queue slot.
+    Optional body: {"flow": "inbound" | "outbound", "priority": "HAUTE" | "NORMALE" | "BASSE"}."""
+    data = data or {}
+    board = loaded("agent").gates
+    try:
+        assignment = board.admit(plate, data.get("flow"), data.get("priority"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"plate": plate, "assignment": assignment.as_dict(), "gates": board.snapshot()}
+
+class OrderStatusUpdate(BaseModel):
+    status: str
+
+@app.post("/orders/{order_id}/status")
+async def set_order_status(order_id: int, update: OrderStatusUpdate):
+    """Order status update, e.g. {"status": "terminée"}: a completed order frees its truck's gate."""
+    from src.database import run_db, update_order_status
+    status = update.status
+    if status not in ORDER_STATUSES:
+        # Anything else would be stored for good and never understood by the rules
+        raise HTTPException(status_code=400, detail=f"Unknown status '{status[:40]}' (one of: {', '.join(ORDER_STATUSES)})")
+    journal = components.peek("journal")
+    if journal:
+        try:
+            journal.record_status(order_id, status)
+        except JournalFull as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    else:
+        await run_db(update_order_status, order_id, status)
+    agent = components.peek("agent")
+    if agent:
+        agent.gates.order_status(order_id, status)
+    return {"order": order_id, "status": status}
+
+@app.get("/session-stats")
+def session_stats():
+    return {"sessions": sessions.stats(), "catalog": catalog.stats()}
+
+# Component counters folded into /metrics (model-backed ones are added once warm-up is done)
+REGISTRY.collector("db_pool", lambda: get_pool().stats())
+REGISTRY.collector("sessions", sessions.stats)
+REGISTRY.collector("catalog", catalog.stats)
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text format: stage/request latency histograms + component stats as gauges."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 def health():
-    # Check if vision and agent were initialized for a more accurate health check
-    model_loaded = 'vision' in globals() and 'agent' in globals()
-    return {"status": "online", "model_loaded": model_loaded}
+    # Liveness only: answers while the models are still loading
+    return {"status": "online", "model_loaded": components.ready}
+
+@app.get("/ready")
+def ready():
+    """Readiness probe: 503 until every component is loaded, with per-component load times."""
+    return JSONResponse(status_code=200 if components.ready else 503, content=components.status())
 
 if __name__ == "__main__":
     import uvicorn
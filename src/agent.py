@@ -1,48 +1,151 @@
+import asyncio
+import os
+import threading
+import time
 import ollama
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator, List, Optional
 from src.rag_engine import WarehouseRAGEngine
+from src.rules import RuleEngine
+from src.gates import GateBoard
+from src.llm_scheduler import LLMScheduler, PRIORITY_GATE
+from src.metrics import STAGE_SECONDS, stage
+
+# Section-level chunks are dense: a few of them cover the client, its order and the policies
+RULES_TOP_K = int(os.getenv("RAG_TOP_K", "3"))
+CLIENT_CATEGORIES = ["clients", "orders", "suppliers"]
 
 class WarehouseAgent:
     def __init__(self, api_key: str = None):
         # We don't need the Gemini API key anymore for the Agent
         self.model_name = 'llama3' # Or 'llama2:13b' if installed
         self.rag = WarehouseRAGEngine()
+        # Shared with the chatbot: gate decisions are served before chat turns
+        self.llm = LLMScheduler(ollama.AsyncClient())
+        # Routine arrivals are decided from policies + DB facts, without the LLM
+        self.rules = RuleEngine()
+        # Dock occupancy and queue: the gate is assigned here, the LLM only explains it
+        self.gates = GateBoard(self.rules.policies)
+        self._loop = None  # Background event loop of the blocking reason() API
+        self._loop_lock = threading.Lock()
 
-    def reason(self, vehicle_data: Dict[str, Any]) -> str:
-        """
-        Calculates a decision using local Llama 3.
-        """
-        from src.database import get_complete_arrival_info
-        
+    def retrieve_client_rules(self, client_name: str, n_results: int = RULES_TOP_K) -> List[str]:
+        """Client profile, its orders and supplier rules, with exact-name hits first."""
+        search_query = f"Consignes pour le client {client_name}"
+        return self.rag.search(search_query, categories=CLIENT_CATEGORIES, client=client_name, n_results=n_results)
+
+    def retrieve_vehicle_rules(self, plate: str, n_results: int = RULES_TOP_K) -> List[str]:
+        return self.rag.search(f"Consignes pour le véhicule {plate}", categories=["orders"], n_results=n_results)
+
+    def retrieve_policies(self, n_results: int = RULES_TOP_K) -> List[str]:
+        """Global warehouse policies: the same for every arrival, so served from the RAG cache."""
+        return self.rag.search("Règles de priorité et d'affectation des quais", categories=["policies"],
+                               n_results=n_results)
+
+    def retrieve_rules(self, client_name: str, n_results: int = RULES_TOP_K) -> List[str]:
+        rules = self.retrieve_client_rules(client_name, n_results) if client_name != "Inconnu" else []
+        return list(dict.fromkeys(rules + self.retrieve_policies(n_results)))
+
+    def build_prompt(self, vehicle_data: Dict[str, Any], facts: Optional[Dict[str, Any]],
+                     context_chunks: List[str], assignment=None) -> str:
         plate = vehicle_data.get('plate')
-        facts = get_complete_arrival_info(plate)
         facts_text = "Aucune commande active trouvée pour cette plaque."
-        client_name = "Inconnu"
         
         if facts:
-            client_name = facts['client_nom']
-            facts_text = f"Camion {facts['camion_type']} pour le client {client_name}. Produit: {facts['produit_nom']}. Statut: {facts['commande_statut']}."
+            facts_text = f"Camion {facts['camion_type']} pour le client {facts['client_nom']}. Produit: {facts['produit_nom']}. Statut: {facts['commande_statut']}."
+            if facts.get("fuzzy_match"):
+                facts_text += (f" ATTENTION: plaque lue {plate}, correspondance approximative avec {facts['plaque']} "
+                               f"(pas exacte) : identité du camion à vérifier.")
 
-        search_query = f"Consignes pour le client {client_name}"
-        context_chunks = self.rag.query(search_query, n_results=5)
         context_text = "\n---\n".join(context_chunks)
 
-        prompt = f"""
+        if assignment is None:
+            instruction = "Assign a Gate and Priority."
+            gate_text = ""
+        else:
+            # The scheduler knows which docks are busy; the model must not pick another gate
+            instruction = ("Keep the GATE ASSIGNMENT as is (do not choose another gate). Explain it to the driver "
+                           "and flag any check the RULES require (e.g. inspection).")
+            gate_text = f"\n        GATE ASSIGNMENT: {assignment.prompt_text()}"
+
+        return f"""
         [INST] You are the Warehouse Intelligence Agent.
         Decide the course of action for this arrival.
         
         FACTS: {facts_text}
         RULES: {context_text}
-        VEHICLE: {plate} at {vehicle_data.get('time')}
+        VEHICLE: {plate} at {vehicle_data.get('time')}{gate_text}
         
-        Assign a Gate and Priority. [/INST]
+        {instruction} [/INST]
         """
 
-        response = ollama.chat(model=self.model_name, messages=[
-            {'role': 'user', 'content': prompt}
-        ])
+    def reason(self, vehicle_data: Dict[str, Any], facts: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Calculates a decision using local Llama 3.
+        `facts` can be passed in when the caller already fetched them from the DB.
+        """
+        plate = vehicle_data.get('plate')
+        if facts is None:
+            from src.database import get_complete_arrival_info
+            facts = get_complete_arrival_info(plate)
+
+        assignment = self.gates.assign(plate, facts)
+        decision = self.rules.decide(facts, assignment)
+        if decision:
+            return decision.analysis
+
+        client_name = facts['client_nom'] if facts else "Inconnu"
+        with stage("agent", "retrieve"):
+            context_chunks = self.retrieve_rules(client_name)
+        # Through the scheduler like the async callers: gate priority, bounded queue, timeout
+        future = asyncio.run_coroutine_threadsafe(
+            self.areason(vehicle_data, facts, context_chunks, assignment), self._sync_loop())
+        return future.result()
+
+    def _sync_loop(self) -> asyncio.AbstractEventLoop:
+        """
+        One long-lived loop for the blocking API (CLI, camera workers): the
+        scheduler and its ollama client stay bound to a single loop. A process
+        uses either this API or the async one, not both.
+        """
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="agent-loop", daemon=True).start()
+            return self._loop
+
+    async def areason(self, vehicle_data: Dict[str, Any], facts: Optional[Dict[str, Any]],
+                      context_chunks: List[str], assignment=None) -> str:
+        """Async variant used by the entrance pipeline: facts, rules and gate assignment come from the caller."""
+        with stage("agent", "prompt_build"):
+            prompt = self.build_prompt(vehicle_data, facts, context_chunks, assignment)
+        start = time.perf_counter()
+        with stage("agent", "llm"):
+            response = await self.llm.chat(self.model_name, [
+                {'role': 'user', 'content': prompt}
+            ], priority=PRIORITY_GATE)
+        self.rules.stats.record("llm", time.perf_counter() - start)
         return response['message']['content']
 
+    async def astream_reason(self, vehicle_data: Dict[str, Any], facts: Optional[Dict[str, Any]],
+                             context_chunks: List[str], assignment=None) -> AsyncIterator[str]:
+        """Streams the llama3 answer token by token (ollama streaming API)."""
+        with stage("agent", "prompt_build"):
+            prompt = self.build_prompt(vehicle_data, facts, context_chunks, assignment)
+        start = time.perf_counter()
+        stream = self.llm.stream_chat(self.model_name, [
+            {'role': 'user', 'content': prompt}
+        ], priority=PRIORITY_GATE)
+        try:
+            async for part in stream:
+                token = part['message']['content']
+                if token:
+                    yield token
+        finally:
+            await stream.aclose()  # Frees the scheduler slot right away if the caller gives up
+        elapsed = time.perf_counter() - start
+        self.rules.stats.record("llm", elapsed)
+        STAGE_SECONDS.observe(elapsed, "agent", "llm")
+
 if __name__ == "__main__":
     # Example usage (requires GEMINI_API_KEY in .env)
     API_KEY = os.getenv("GEMINI_API_KEY")
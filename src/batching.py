@@ -0,0 +1,130 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Tuple
+
+import numpy as np
+
+YOLO_BATCH_SIZE = int(os.getenv("YOLO_BATCH_SIZE", "8"))
+YOLO_BATCH_MAX_WAIT_MS = float(os.getenv("YOLO_BATCH_MAX_WAIT_MS", "10"))
+
+Box = Tuple[int, int, int, int, float]
+
+
+def boxes_from_result(result) -> List[Box]:
+    """Converts one ultralytics result into (x1, y1, x2, y2, conf) tuples."""
+    boxes = []
+    for box in result.boxes:
+        x1, y1, x2, y2 = map(int, box.xyxy[0])
+        boxes.append((x1, y1, x2, y2, float(box.conf[0])))
+    return boxes
+
+
+class BatchedDetector:
+    """
+    Micro-batching front for the YOLO model.
+
+    Frames from concurrent requests are queued; a single worker thread groups
+    them into batches of up to `max_batch_size`, waiting at most `max_wait_ms`
+    after the first frame, runs one `predict` call per batch and resolves each
+    caller's future with its own boxes.
+    """
+
+    def __init__(self, model, max_batch_size: int = YOLO_BATCH_SIZE,
+                 max_wait_ms: float = YOLO_BATCH_MAX_WAIT_MS, conf: float = 0.5):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.conf = conf
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.frames = 0
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="yolo-batcher", daemon=True)
+                    self._worker.start()
+
+    def submit(self, frame: np.ndarray) -> Future:
+        future = Future()
+        if self.max_batch_size == 1:
+            # Batching disabled: run inline on the caller's thread, no queue hop
+            try:
+                future.set_result(self._predict([frame])[0])
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        self._ensure_worker()
+        self._queue.put((frame, future))
+        return future
+
+    def detect(self, frame: np.ndarray) -> List[Box]:
+        return self.submit(frame).result()
+
+    async def adetect(self, frame: np.ndarray, executor=None) -> List[Box]:
+        if self.max_batch_size == 1:
+            # No batcher thread: YOLO still has to run off the event loop
+            return await asyncio.get_running_loop().run_in_executor(executor, self.detect, frame)
+        return await asyncio.wrap_future(self.submit(frame))
+
+    def _predict(self, frames: List[np.ndarray]) -> List[List[Box]]:
+        results = self.model.predict(frames, conf=self.conf, verbose=False)
+        self.batches += 1
+        self.frames += len(frames)
+        return [boxes_from_result(r) for r in results]
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Callers that gave up (timeout, client gone) cancelled their future: skip their frames.
+            # The others become uncancellable, so delivering their result cannot fail.
+            batch = [(frame, future) for frame, future in self._collect_batch()
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            futures = [f for _, f in batch]
+            try:
+                outputs = self._predict([frame for frame, _ in batch])
+            except Exception as e:
+                for future in futures:
+                    self._deliver(future, error=e)
+                continue
+            for future, boxes in zip(futures, outputs):
+                self._deliver(future, boxes)
+
+    @staticmethod
+    def _deliver(future: Future, boxes=None, error: Exception = None):
+        # One bad future must not kill the batcher thread: every later frame would hang
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(boxes)
+        except Exception as e:
+            print(f"⚠️ YOLO batcher could not deliver a result: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "frames": self.frames,
+            "avg_batch_size": round(self.frames / self.batches, 2) if self.batches else 0.0,
+        }
@@ -0,0 +1,162 @@
+import difflib
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from src.database import list_clients, list_products, on_write, run_db
+
+CATALOG_TTL = float(os.getenv("CATALOG_TTL", "300"))
+CATALOG_PROMPT_CLIENTS = int(os.getenv("CATALOG_PROMPT_CLIENTS", "10"))
+CATALOG_PROMPT_PRODUCTS = int(os.getenv("CATALOG_PROMPT_PRODUCTS", "15"))
+CATALOG_FUZZY_CUTOFF = float(os.getenv("CATALOG_FUZZY_CUTOFF", "0.85"))
+
+_WORD = re.compile(r"\w+")
+_MIN_IDF = math.log(2)
+
+
+def normalize_name(text: str) -> str:
+    """Lowercase without accents: 'Écrans' and 'ecrans' are the same word."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(normalize_name(text))
+
+
+class _NameIndex:
+    """Inverted word index over a list of names, with IDF weights (shared words like 'client' weigh ~0)."""
+
+    def __init__(self, names: List[str]):
+        self.postings: Dict[str, Set[int]] = defaultdict(set)
+        for i, name in enumerate(names):
+            for word in _words(name):
+                self.postings[word].add(i)
+        total = max(1, len(names))
+        self.idf = {word: math.log(total / len(ids)) for word, ids in self.postings.items()}
+        # Fuzzy candidates share the first letter: keeps difflib off the whole vocabulary
+        self.by_initial: Dict[str, List[str]] = defaultdict(list)
+        for word in self.postings:
+            self.by_initial[word[0]].append(word)
+
+    def score(self, words: Set[str], fuzzy_cutoff: float) -> Dict[int, float]:
+        scores: Dict[int, float] = defaultdict(float)
+        for word in words:
+            matches = [word] if word in self.postings else []
+            if not matches and len(word) >= 4:
+                # Typos in chat messages ("clavier" vs "claviers", "omikron")
+                candidates = [w for w in self.by_initial.get(word[0], ()) if abs(len(w) - len(word)) <= 2]
+                matches = difflib.get_close_matches(word, candidates, n=2, cutoff=fuzzy_cutoff)
+            for match in matches:
+                if self.idf[match] < _MIN_IDF:
+                    continue  # In most names: says nothing about which one is meant
+                for i in self.postings[match]:
+                    scores[i] += self.idf[match]
+        return {i: s for i, s in scores.items() if s > 0}
+
+
+@dataclass
+class CatalogSnapshot:
+    version: int
+    loaded_at: float
+    clients: List[str]
+    products: List[dict]
+    _clients_index: _NameIndex = field(init=False, repr=False)
+    _products_index: _NameIndex = field(init=False, repr=False)
+    _in_stock: List[int] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self._clients_index = _NameIndex(self.clients)
+        self._products_index = _NameIndex([p["name"] for p in self.products])
+        self._in_stock = sorted(range(len(self.products)), key=lambda i: self.products[i]["stock"] or 0, reverse=True)
+
+    def select(self, text: str, max_clients: int = CATALOG_PROMPT_CLIENTS,
+               max_products: int = CATALOG_PROMPT_PRODUCTS,
+               fuzzy_cutoff: float = CATALOG_FUZZY_CUTOFF):
+        """Clients and products named (or nearly named) in `text`, best matches first."""
+        words = set(_words(text))
+        client_scores = self._clients_index.score(words, fuzzy_cutoff)
+        product_scores = self._products_index.score(words, fuzzy_cutoff)
+        clients = [self.clients[i] for i in sorted(client_scores, key=client_scores.get, reverse=True)[:max_clients]]
+        ranked = sorted(product_scores, key=product_scores.get, reverse=True)[:max_products]
+        if not ranked:
+            # Nothing named yet: suggest what is actually in stock
+            ranked = self._in_stock[:max_products]
+        return clients, [self.products[i] for i in ranked]
+
+    def prompt_context(self, text: str) -> str:
+        """Replaces the full client/product listing in the chatbot prompt."""
+        clients, products = self.select(text)
+        client_list = ", ".join(clients) if clients else "aucun client cité dans la conversation"
+        product_list = ", ".join(f"{p['name']} (stock {p['stock']})" for p in products)
+        return f"""
+        Available Clients (matching the conversation, {len(self.clients)} in total): {client_list}
+        Available Products (relevant, {len(self.products)} in total): {product_list}
+        """
+
+
+class Catalog:
+    """
+    Versioned, cached snapshot of the client and product tables for the
+    chatbot. Reloaded when its TTL expires or after a write through the
+    database helpers (on_write), so messages no longer scan both tables.
+    """
+
+    def __init__(self, ttl: float = CATALOG_TTL):
+        self.ttl = ttl
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._version = 0
+        self._stale = True
+        self._lock = threading.Lock()
+        self.reloads = 0
+        self.hits = 0
+        on_write(self._on_write)
+
+    def _on_write(self, table: str):
+        if table in ("client", "produit"):
+            self.invalidate()
+
+    def invalidate(self):
+        self._stale = True
+
+    def _fresh(self) -> Optional[CatalogSnapshot]:
+        current = self._snapshot
+        if current and not self._stale and time.monotonic() - current.loaded_at < self.ttl:
+            self.hits += 1
+            return current
+        return None
+
+    def snapshot(self) -> CatalogSnapshot:
+        current = self._fresh()
+        if current:
+            return current
+        with self._lock:
+            current = self._fresh()
+            if current:
+                return current  # Another thread reloaded it meanwhile
+            self._stale = False  # Cleared before reading: a write during the reload marks it stale again
+            self._version += 1
+            self._snapshot = CatalogSnapshot(self._version, time.monotonic(), list_clients(), list_products())
+            self.reloads += 1
+            return self._snapshot
+
+    async def asnapshot(self) -> CatalogSnapshot:
+        # Only a reload touches the DB; a fresh snapshot is returned without a thread hop
+        return self._fresh() or await run_db(self.snapshot)
+
+    def stats(self) -> Dict[str, object]:
+        snapshot = self._snapshot
+        return {
+            "version": self._version,
+            "clients": len(snapshot.clients) if snapshot else 0,
+            "products": len(snapshot.products) if snapshot else 0,
+            "age_seconds": round(time.monotonic() - snapshot.loaded_at, 1) if snapshot else None,
+            "reloads": self.reloads,
+            "hits": self.hits,
+        }
@@ -0,0 +1,170 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Tuple
+
+# all-MiniLM-L6-v2 truncates at 256 word pieces; stay well below it
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "160"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "24"))
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_HEADING = re.compile(r"^(#{1,6})\s+(.*)$")
+_LIST_ITEM = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+")
+
+
+@dataclass
+class Chunk:
+    text: str
+    section: str
+    kind: str  # "paragraph", "list", "table" or "mixed"
+
+
+def count_tokens(text: str) -> int:
+    """Cheap word-piece estimate (words + punctuation), no tokenizer needed."""
+    return len(_TOKEN.findall(text))
+
+
+def _blocks(text: str) -> List[Tuple[str, str, List[str]]]:
+    """Splits markdown into (section, kind, lines) blocks; headings only update the section."""
+    headings: List[str] = []
+    blocks: List[Tuple[str, str, List[str]]] = []
+    kind, lines = None, []
+
+    def close():
+        nonlocal kind, lines
+        if lines:
+            blocks.append((" > ".join(headings), kind, lines))
+        kind, lines = None, []
+
+    for raw in text.splitlines():
+        line = raw.rstrip()
+        heading = _HEADING.match(line)
+        if heading:
+            close()
+            level = len(heading.group(1))
+            headings = headings[:level - 1] + [heading.group(2).strip()]
+            continue
+        if not line.strip():
+            if kind != "list":  # Blank lines inside a list keep the list together
+                close()
+            continue
+
+        if line.lstrip().startswith("|"):
+            line_kind = "table"
+        elif _LIST_ITEM.match(line) or (kind == "list" and raw[:1].isspace()):
+            line_kind = "list"
+        else:
+            line_kind = "paragraph"
+        if line_kind != kind:
+            close()
+            kind = line_kind
+        lines.append(line)
+    close()
+    return blocks
+
+
+def _split_table(lines: List[str], budget: int) -> List[str]:
+    """Row groups that fit the budget, each repeating the header + separator rows."""
+    header, rows = lines[:2], lines[2:]
+    if len(lines) < 3 or not re.match(r"^\|?[\s:|-]+\|?$", lines[1]):
+        header, rows = lines[:1], lines[1:]
+    header_tokens = count_tokens("\n".join(header))
+    pieces, current, used = [], [], header_tokens
+    for row in rows:
+        tokens = count_tokens(row)
+        if current and used + tokens > budget:
+            pieces.append("\n".join(header + current))
+            current, used = [], header_tokens
+        current.append(row)
+        used += tokens
+    if current or not pieces:
+        pieces.append("\n".join(header + current))
+    return pieces
+
+
+def _split_list(lines: List[str], budget: int) -> List[str]:
+    """Groups whole list items (with their continuation lines) up to the budget."""
+    items: List[List[str]] = []
+    for line in lines:
+        if _LIST_ITEM.match(line) or not items:
+            items.append([line])
+        else:
+            items[-1].append(line)
+    pieces, current, used = [], [], 0
+    for item in items:
+        text = "\n".join(item)
+        tokens = count_tokens(text)
+        if current and used + tokens > budget:
+            pieces.append("\n".join(current))
+            current, used = [], 0
+        current.append(text)
+        used += tokens
+    if current:
+        pieces.append("\n".join(current))
+    return pieces
+
+
+def _split_paragraph(text: str, budget: int, overlap: int) -> List[str]:
+    """Sliding word window with `overlap` tokens carried into the next piece."""
+    words = text.split()
+    if count_tokens(text) <= budget:
+        return [text]
+    pieces, start = [], 0
+    while start < len(words):
+        end, used = start, 0
+        while end < len(words) and (used + count_tokens(words[end]) <= budget or end == start):
+            used += count_tokens(words[end])
+            end += 1
+        pieces.append(" ".join(words[start:end]))
+        if end >= len(words):
+            break
+        back, carried = end, 0
+        while back > start + 1 and carried + count_tokens(words[back - 1]) <= overlap:
+            back -= 1
+            carried += count_tokens(words[back])
+        start = back
+    return pieces
+
+
+def chunk_markdown(text: str, max_tokens: int = CHUNK_MAX_TOKENS,
+                   overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[Chunk]:
+    """
+    Markdown-aware chunking: a section (heading + its paragraphs, lists and
+    tables) becomes one chunk when it fits in `max_tokens`; larger blocks are
+    split on row/item boundaries (tables repeat their header) or by an
+    overlapping word window. Each chunk starts with its heading path so the
+    embedding knows which client/supplier/product it talks about.
+    """
+    chunks: List[Chunk] = []
+    current_section, parts, kinds, used = None, [], set(), 0
+
+    def emit():
+        nonlocal parts, kinds, used
+        if parts:
+            body = "\n\n".join(parts)
+            prefix = f"{current_section}\n" if current_section else ""
+            chunks.append(Chunk(prefix + body, current_section or "", kinds.pop() if len(kinds) == 1 else "mixed"))
+        parts, kinds, used = [], set(), 0
+
+    for section, kind, lines in _blocks(text):
+        if section != current_section:
+            emit()
+            current_section = section
+        budget = max(16, max_tokens - count_tokens(section))
+
+        if kind == "table":
+            pieces = _split_table(lines, budget)
+        elif kind == "list":
+            pieces = _split_list(lines, budget)
+        else:
+            pieces = _split_paragraph(" ".join(line.strip() for line in lines), budget, overlap_tokens)
+
+        for piece in pieces:
+            tokens = count_tokens(piece)
+            if parts and used + tokens > budget:
+                emit()
+            parts.append(piece)
+            kinds.add(kind)
+            used += tokens
+    emit()
+    return chunks
@@ -1,11 +1,33 @@
 import mysql.connector
 import os
+import asyncio
 import datetime
+import difflib
+import functools
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dotenv import load_dotenv
+from src.db_pool import ConnectionPool, connect_sqlite
+from src.metrics import timed
+from src.rules import STATUS_AT_DOCK, STATUS_READY, STATUS_WAITING
 
 load_dotenv()
 
-def get_db_connection():
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql")  # "mysql" or "sqlite" (local stand-in)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_HEALTH_CHECK_INTERVAL", "30"))
+
+_pool = None
+_pool_lock = threading.Lock()
+_db_executor = None
+_write_listeners = []
+
+def _connect():
+    if DB_BACKEND == "sqlite":
+        return connect_sqlite(os.getenv("DB_SQLITE_PATH", "smart_warehouse.db"))
     return mysql.connector.connect(
         host=os.getenv("DB_HOST", "localhost"),
         user=os.getenv("DB_USER", "root"),
@@ -14,15 +36,80 @@ def get_db_connection():
         buffered=True # Fixes 'Unread result found'
     )
 
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(_connect, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                                       health_check_interval=DB_HEALTH_CHECK_INTERVAL)
+    return _pool
+
+class PooledConnection:
+    """Pool checkout that behaves like a plain connection: close() hands it back."""
+    def __init__(self, pool: ConnectionPool):
+        self._pool = pool
+        self._conn = pool.acquire()
+
+    def cursor(self, *args, **kwargs):
+        return self._conn.cursor(*args, **kwargs)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        if self._conn is not None:
+            self._pool.release(self._conn)
+            self._conn = None
+
+def get_db_connection():
+    return PooledConnection(get_pool())
+
+@contextmanager
+def db_cursor(dictionary: bool = False, commit: bool = False):
+    """Checks a connection out of the pool and yields a cursor on it."""
+    with get_pool().connection() as conn:
+        cursor = conn.cursor(dictionary=dictionary)
+        try:
+            yield cursor
+            if commit:
+                conn.commit()
+        finally:
+            cursor.close()
+
+async def run_db(func, *args, **kwargs):
+    """Runs a blocking DB helper on the DB thread pool so the event loop stays free."""
+    global _db_executor
+    if _db_executor is None:
+        # One thread per pooled connection: threads never queue behind the pool
+        _db_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, functools.partial(func, *args, **kwargs))
+
+def on_write(listener):
+    """Registers listener(table) to be called after a helper below commits a write."""
+    _write_listeners.append(listener)
+
+def notify_write(table: str):
+    for listener in _write_listeners:
+        try:
+            listener(table)
+        except Exception as e:
+            print(f"⚠️ Write listener failed for '{table}': {e}")
+
 def init_db():
-    temp_conn = mysql.connector.connect(
-        host=os.getenv("DB_HOST", "localhost"),
-        user=os.getenv("DB_USER", "root"),
-        password=os.getenv("DB_PASSWORD", "")
-    )
-    cursor = temp_conn.cursor()
-    cursor.execute(f"CREATE DATABASE IF NOT EXISTS {os.getenv('DB_NAME', 'smart_warehouse')}")
-    temp_conn.close()
+    if DB_BACKEND != "sqlite":
+        temp_conn = mysql.connector.connect(
+            host=os.getenv("DB_HOST", "localhost"),
+            user=os.getenv("DB_USER", "root"),
+            password=os.getenv("DB_PASSWORD", "")
+        )
+        cursor = temp_conn.cursor()
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {os.getenv('DB_NAME', 'smart_warehouse')}")
+        temp_conn.close()
 
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -44,6 +131,8 @@ def init_db():
         idCamion INT PRIMARY KEY,
         type VARCHAR(50),
         plaque VARCHAR(20),
+        plaque_key VARCHAR(20),
+        plaque_serial VARCHAR(10),
         idClient INT,
         FOREIGN KEY (idClient) REFERENCES client(idClient)
     )
@@ -61,12 +150,13 @@ def init_db():
     cursor.execute("CREATE TABLE IF NOT EXISTS produit (idProduit INT PRIMARY KEY, nom VARCHAR(100), Quantite INT, prix DECIMAL(10,2))")
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS commande (
-        idCommande INT PRIMARY KEY,
+        idCommande INT AUTO_INCREMENT PRIMARY KEY,
         idClient INT,
         idProduit INT,
         idDepot INT,
         dateCommande DATE,
         statut VARCHAR(30),
+        quantite INT DEFAULT 0,
         FOREIGN KEY (idClient) REFERENCES client(idClient),
         FOREIGN KEY (idProduit) REFERENCES produit(idProduit),
         FOREIGN KEY (idDepot) REFERENCES depot(idDepot)
@@ -114,6 +204,7 @@ def init_db():
         (7, 'Camion fourgon', '111 تونس 8801', 7)
     ]
     cursor.executemany("INSERT IGNORE INTO camion (idCamion, type, plaque, idClient) VALUES (%s, %s, %s, %s)", camions)
+    migrate_plate_keys(cursor)
 
     # 6. Produits
     produits = [
@@ -132,111 +223,214 @@ def init_db():
     ]
     # Note: I used idClient=15 for order 20 to match my seeded clients
     cursor.executemany("INSERT IGNORE INTO commande (idCommande, idClient, idProduit, idDepot, dateCommande, statut) VALUES (%s, %s, %s, %s, %s, %s)", commandes)
+    migrate_orders(cursor)
 
     conn.commit()
     conn.close()
     print("✨ La base de données est maintenant riche en données réelles !")
 
-def get_complete_arrival_info(plaque: str):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    query = """
+# --- PLATE LOOKUP ---
+# OCR returns plates as "145 تونس 4862", "145 TUN 4862", "302-502-TUN" or "3341323 نت".
+# plaque_key folds all of them to one indexed form ("145TU4862", "3341323NT"),
+# plaque_serial keeps the last digit group for the bounded fuzzy fallback. A fuzzy
+# match is only a hint (rows tagged fuzzy_match): it never docks a truck by itself.
+
+PLATE_TOKENS = {"تونس": "TU", "TUNIS": "TU", "TUN": "TU", "TU": "TU", "TN": "TU",
+                "نت": "NT", "NT": "NT", "RS": "RS", "ت.ح": "RS"}
+_ARABIC_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
+_PLATE_PART = re.compile(r"\d+|[^\W\d_]+(?:\.[^\W\d_]+)?")
+FUZZY_CANDIDATES = int(os.getenv("PLATE_FUZZY_CANDIDATES", "50"))
+FUZZY_MIN_RATIO = float(os.getenv("PLATE_FUZZY_MIN_RATIO", "0.9"))
+
+def normalize_plate(plaque: str):
+    """Returns (plaque_key, plaque_serial) for a raw plate string."""
+    if not plaque:
+        return None, None
+    text = plaque.upper().translate(_ARABIC_DIGITS).replace("PLATE:", "")
+    digits, token = [], None
+    for part in _PLATE_PART.findall(text):
+        if part.isdigit():
+            digits.append(part)
+        elif token is None and part in PLATE_TOKENS:
+            token = PLATE_TOKENS[part]
+    if not digits:
+        return None, None
+    if len(digits) == 1:
+        key = digits[0] + (token or "")
+    else:
+        key = digits[0] + (token or "") + "".join(digits[1:])
+    return key[:20], digits[-1][:10]
+
+def migrate_plate_keys(cursor):
+    """Adds/backfills the normalized plate columns and their indexes on existing databases."""
+    try:
+        cursor.execute("SELECT plaque_key, plaque_serial FROM camion LIMIT 1")
+        cursor.fetchall()
+    except Exception:
+        cursor.execute("ALTER TABLE camion ADD COLUMN plaque_key VARCHAR(20)")
+        cursor.execute("ALTER TABLE camion ADD COLUMN plaque_serial VARCHAR(10)")
+    for index, column in (("idx_camion_plaque_key", "plaque_key"), ("idx_camion_plaque_serial", "plaque_serial")):
+        try:
+            cursor.execute(f"CREATE INDEX {index} ON camion ({column})")
+        except Exception:
+            pass # Already exists
+
+    cursor.execute("SELECT idCamion, plaque FROM camion WHERE plaque_key IS NULL")
+    updates = [(*normalize_plate(plaque), idCamion) for idCamion, plaque in cursor.fetchall()]
+    if updates:
+        cursor.executemany("UPDATE camion SET plaque_key = %s, plaque_serial = %s WHERE idCamion = %s", updates)
+
+def migrate_orders(cursor):
+    """Existing databases: order quantity column and AUTO_INCREMENT order IDs (no more timestamp IDs)."""
+    try:
+        cursor.execute("SELECT quantite FROM commande LIMIT 1")
+        cursor.fetchall()
+    except Exception:
+        cursor.execute("ALTER TABLE commande ADD COLUMN quantite INT DEFAULT 0")
+
+    if DB_BACKEND == "sqlite":
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'commande'")
+        if "AUTOINCREMENT" in cursor.fetchone()[0].upper():
+            return
+        # SQLite cannot alter a primary key: rebuild the table
+        cursor.execute("ALTER TABLE commande RENAME TO commande_old")
+        cursor.execute("""
+        CREATE TABLE commande (
+            idCommande INT AUTO_INCREMENT PRIMARY KEY,
+            idClient INT, idProduit INT, idDepot INT, dateCommande DATE, statut VARCHAR(30), quantite INT DEFAULT 0
+        )
+        """)
+        cursor.execute("""
+        INSERT INTO commande (idCommande, idClient, idProduit, idDepot, dateCommande, statut, quantite)
+        SELECT idCommande, idClient, idProduit, idDepot, dateCommande, statut, quantite FROM commande_old
+        """)
+        cursor.execute("DROP TABLE commande_old")
+        print("✅ Table commande migrée (AUTO_INCREMENT)")
+    else:
+        cursor.execute("""
+        SELECT EXTRA FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'commande' AND COLUMN_NAME = 'idCommande'
+        """)
+        row = cursor.fetchone()
+        if row and "auto_increment" not in (row[0] or "").lower():
+            cursor.execute("ALTER TABLE commande MODIFY idCommande INT NOT NULL AUTO_INCREMENT")
+            print("✅ Table commande migrée (AUTO_INCREMENT)")
+
+# A client has many orders: the arrival is about an open one (newest first), not any past one
+ACTIVE_ORDER_STATUSES = (STATUS_READY, STATUS_AT_DOCK, STATUS_WAITING)
+ARRIVAL_INFO_QUERY = """
     SELECT com.idCommande, cam.type as camion_type, cl.nom as client_nom, cl.telephone, 
            com.statut as commande_statut, com.dateCommande,
            p.nom as produit_nom, p.Quantite as stock_disponible,
-           d.nom as depot_nom
+           d.nom as depot_nom, cam.plaque
     FROM camion cam
     JOIN client cl ON cam.idClient = cl.idClient
     LEFT JOIN commande com ON cl.idClient = com.idClient
     LEFT JOIN produit p ON com.idProduit = p.idProduit
     LEFT JOIN depot d ON com.idDepot = d.idDepot
-    WHERE cam.plaque = %s OR cam.plaque LIKE %s
+    WHERE {where}
+    ORDER BY CASE WHEN com.statut IN (%s, %s, %s) THEN 0 ELSE 1 END,
+             com.dateCommande DESC, com.idCommande DESC
     LIMIT 1
     """
-    cursor.execute(query, (plaque, f"%{plaque}%"))
-    result = cursor.fetchone()
-    conn.close()
-    return result
 
+def _closest_truck(cursor, key: str, serial: str):
+    """
+    Bounded fuzzy fallback: only trucks sharing the serial or the governorate
+    prefix are scored. Returns (idCamion, plaque_key) of the single best
+    candidate, or None when nothing is close enough or the best score is tied.
+    """
+    prefix = re.match(r"\d+[A-Z]*", key).group()
+    cursor.execute(
+        "SELECT idCamion, plaque_key FROM camion WHERE plaque_serial = %s LIMIT %s",
+        (serial, FUZZY_CANDIDATES))
+    candidates = cursor.fetchall()
+    if len(candidates) < FUZZY_CANDIDATES and prefix != key:
+        cursor.execute(
+            "SELECT idCamion, plaque_key FROM camion WHERE plaque_key LIKE %s LIMIT %s",
+            (f"{prefix}%", FUZZY_CANDIDATES - len(candidates)))
+        candidates += cursor.fetchall()
+
+    best, best_ratio, tied = None, FUZZY_MIN_RATIO, False
+    for row in candidates:
+        idCamion, candidate_key = (row["idCamion"], row["plaque_key"]) if isinstance(row, dict) else row
+        ratio = difflib.SequenceMatcher(None, key, candidate_key or "").ratio()
+        if best and ratio == best_ratio and idCamion != best[0]:
+            tied = True  # Two trucks just as close: no way to tell which one this is
+        elif ratio > best_ratio or (best is None and ratio == best_ratio):
+            best, best_ratio, tied = (idCamion, candidate_key), ratio, False
+    return None if tied else best
+
+@timed("database")
+def get_complete_arrival_info(plaque: str):
+    key, serial = normalize_plate(plaque)
+    if not key:
+        return None
+    with db_cursor(dictionary=True) as cursor:
+        # 1. Exact match on the indexed key (the common case: one query)
+        cursor.execute(ARRIVAL_INFO_QUERY.format(where="cam.plaque_key = %s"), (key, *ACTIVE_ORDER_STATUSES))
+        result = cursor.fetchone()
+        if result:
+            result["fuzzy_match"] = False
+            return result
+
+        # 2. OCR misread: fall back to the closest plate among a bounded candidate set
+        closest = _closest_truck(cursor, key, serial)
+        if closest is None:
+            return None
+        cursor.execute(ARRIVAL_INFO_QUERY.format(where="cam.idCamion = %s"),
+                       (closest[0], *ACTIVE_ORDER_STATUSES))
+        result = cursor.fetchone()
+        if result:
+            # Not the plate that was read: the rules and the gate board must not trust it
+            result.update(fuzzy_match=True, matched_plate_key=closest[1])
+        return result
+
+@timed("database")
 def update_order_status(idCommande: int, new_status: str):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE commande SET statut = %s WHERE idCommande = %s", (new_status, idCommande))
-    conn.commit()
-    conn.close()
+    with db_cursor(commit=True) as cursor:
+        cursor.execute("UPDATE commande SET statut = %s WHERE idCommande = %s", (new_status, idCommande))
     print(f"✅ Commande #{idCommande} mise à jour : {new_status}")
 
+@timed("database")
 def update_stock(idProduit: int, quantity_change: int):
     """
     quantity_change can be positive (delivery) or negative (pickup)
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE produit SET Quantite = Quantite + %s WHERE idProduit = %s", (quantity_change, idProduit))
-    conn.commit()
-    conn.close()
+    with db_cursor(commit=True) as cursor:
+        cursor.execute("UPDATE produit SET Quantite = Quantite + %s WHERE idProduit = %s", (quantity_change, idProduit))
+    notify_write("produit")
     print(f"📦 Stock Produit #{idProduit} mis à jour (Variation: {quantity_change})")
 
-def create_new_order(client_name: str, product_name: str, quantity: int):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # 1. Find Client ID
-    cursor.execute("SELECT idClient FROM client WHERE nom LIKE %s", (f"%{client_name}%",))
-    client = cursor.fetchone()
-    if not client: return None
-    
-    # 2. Find Product ID
-    cursor.execute("SELECT idProduit FROM produit WHERE nom LIKE %s", (f"%{product_name}%",))
-    product = cursor.fetchone()
-    if not product: return None
-    
-    # 3. Create Order
-    new_id = int(datetime.datetime.now().timestamp()) # Simple unique ID for demo
-    cursor.execute("""
-        INSERT INTO commande (idCommande, idClient, idProduit, idDepot, dateCommande, statut)
-        VALUES (%s, %s, %s, %s, %s, %s)
-    """, (new_id, client[0], product[0], 5, datetime.date.today(), 'en attente'))
-    
-    conn.commit()
-    conn.close()
-    return new_id
-
+@timed("database")
 def list_clients():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT nom FROM client")
-    clients = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return clients
+    with db_cursor() as cursor:
+        cursor.execute("SELECT nom FROM client")
+        return [row[0] for row in cursor.fetchall()]
 
+@timed("database")
 def list_products():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT nom, Quantite, prix FROM produit")
-    products = [{"name": row[0], "stock": row[1], "price": float(row[2])} for row in cursor.fetchall()]
-    conn.close()
-    return products
+    with db_cursor() as cursor:
+        cursor.execute("SELECT nom, Quantite, prix FROM produit")
+        return [{"name": row[0], "stock": row[1], "price": float(row[2])} for row in cursor.fetchall()]
 
+@timed("database")
 def create_new_client(name: str):
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        # 1. Create a dummy user for this client first
-        new_id = int(datetime.datetime.now().timestamp()) % 100000 
-        cursor.execute("INSERT INTO user (idUser, email, motpass) VALUES (%s, %s, %s)", 
-                       (new_id, f"{name.lower().replace(' ', '')}@mail.com", "pass123"))
-        
-        # 2. Create the client
-        cursor.execute("INSERT INTO client (idClient, nom, adresse, telephone, idUser) VALUES (%s, %s, %s, %s, %s)", 
-                       (new_id, name, "Nouvel Entrepôt", "00000000", new_id))
-        conn.commit()
+        with db_cursor(commit=True) as cursor:
+            # 1. Create a dummy user for this client first
+            new_id = int(datetime.datetime.now().timestamp()) % 100000 
+            cursor.execute("INSERT INTO user (idUser, email, motpass) VALUES (%s, %s, %s)", 
+                           (new_id, f"{name.lower().replace(' ', '')}@mail.com", "pass123"))
+            
+            # 2. Create the client
+            cursor.execute("INSERT INTO client (idClient, nom, adresse, telephone, idUser) VALUES (%s, %s, %s, %s, %s)", 
+                           (new_id, name, "Nouvel Entrepôt", "00000000", new_id))
+        notify_write("client")
         return new_id
     except Exception as e:
         print(f"❌ DB Error: {e}")
         return None
-    finally:
-        conn.close()
 
 if __name__ == "__main__":
     init_db()
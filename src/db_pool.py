@@ -0,0 +1,212 @@
+import queue
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+
+class PoolExhausted(Exception):
+    """Raised when no connection could be checked out before the timeout."""
+
+
+class ConnectionPool:
+    """
+    Small thread-safe connection pool.
+
+    Connections are created lazily up to `size`, validated before being handed
+    out (a connection idle for longer than `health_check_interval` seconds is
+    pinged first) and transparently replaced when the check fails.
+    """
+
+    def __init__(self, connect: Callable, size: int = 5, timeout: float = 10.0,
+                 health_check_interval: float = 30.0):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def _new_connection(self):
+        conn = self._connect()
+        conn._pool_last_used = time.monotonic()
+        return conn
+
+    def _is_healthy(self, conn) -> bool:
+        if time.monotonic() - conn._pool_last_used < self.health_check_interval:
+            return True
+        try:
+            if hasattr(conn, "ping"):
+                conn.ping(reconnect=False)
+            else:
+                conn.cursor().execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    def acquire(self):
+        """Checks out a connection, opening a new one while under `size`."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = None
+                with self._lock:
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        return self._new_connection()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhausted(f"No database connection available after {self.timeout}s")
+                try:
+                    conn = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    raise PoolExhausted(f"No database connection available after {self.timeout}s")
+
+            if self._is_healthy(conn):
+                return conn
+            self._discard(conn)
+
+    def release(self, conn, broken: bool = False):
+        """Returns a connection to the pool (or drops it if it is broken)."""
+        if broken:
+            self._discard(conn)
+            return
+        try:
+            conn.rollback()  # Never leak an open transaction to the next user
+        except Exception:
+            self._discard(conn)
+            return
+        conn._pool_last_used = time.monotonic()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except Exception as e:
+            broken = _is_connection_error(e)
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def stats(self) -> dict:
+        return {"size": self.size, "open": self._created, "idle": self._idle.qsize()}
+
+
+def _is_connection_error(error: Exception) -> bool:
+    try:
+        import mysql.connector
+        if isinstance(error, (mysql.connector.errors.OperationalError,
+                              mysql.connector.errors.InterfaceError)):
+            return True
+    except ImportError:
+        pass
+    return isinstance(error, sqlite3.OperationalError) and "closed" in str(error)
+
+
+# --- SQLITE STAND-IN ---
+# Lets the data layer (and the benchmarks) run without a MySQL server.
+# Queries are written for MySQL, so the few dialect differences we rely on are
+# rewritten on the fly.
+
+_SQLITE_REWRITES = [
+    (re.compile(r"INSERT IGNORE", re.I), "INSERT OR IGNORE"),
+    (re.compile(r"\bINT AUTO_INCREMENT PRIMARY KEY\b", re.I), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    (re.compile(r"%s"), "?"),
+]
+
+
+def _to_sqlite(sql: str) -> str:
+    for pattern, replacement in _SQLITE_REWRITES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+class SQLiteCursor:
+    """Cursor wrapper mimicking the subset of the mysql.connector API we use."""
+
+    def __init__(self, cursor: sqlite3.Cursor, dictionary: bool = False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {d[0]: v for d, v in zip(self._cursor.description, row)}
+
+    def execute(self, sql: str, params=()):
+        self._cursor.execute(_to_sqlite(sql), params)
+
+    def executemany(self, sql: str, seq_params):
+        self._cursor.executemany(_to_sqlite(sql), seq_params)
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(r) for r in self._cursor.fetchall()]
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA foreign_keys = OFF")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA case_sensitive_like = ON")  # Lets LIKE 'prefix%' use indexes, as in MySQL
+
+    def cursor(self, dictionary: bool = False, **kwargs):
+        return SQLiteCursor(self._conn.cursor(), dictionary=dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+def connect_sqlite(path: Optional[str] = None) -> SQLiteConnection:
+    return SQLiteConnection(path or ":memory:")
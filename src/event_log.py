@@ -0,0 +1,341 @@
+import datetime
+import json
+import os
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.database import db_cursor, notify_write
+
+try:
+    import fcntl
+except ImportError:  # Windows: no file locks, run a single worker per journal file
+    fcntl = None
+
+EVENT_LOG_PATH = os.getenv("EVENT_LOG_PATH", "gate_events.jsonl")
+EVENT_FLUSH_INTERVAL = float(os.getenv("EVENT_FLUSH_INTERVAL", "1.0"))
+EVENT_BATCH_SIZE = int(os.getenv("EVENT_BATCH_SIZE", "200"))
+EVENT_LOG_MAX_BYTES = int(os.getenv("EVENT_LOG_MAX_BYTES", str(16 * 1024 * 1024)))
+# fsync every append survives power loss, not just a process crash, at ~1ms per event
+EVENT_LOG_FSYNC = os.getenv("EVENT_LOG_FSYNC", "0") == "1"
+# One journal file per worker process: gate_events.jsonl, gate_events.jsonl.1, ...
+EVENT_LOG_SLOTS = int(os.getenv("EVENT_LOG_SLOTS", "32"))
+# Backpressure: record_*() raise JournalFull beyond this many unflushed entries (DB down for long)
+EVENT_MAX_PENDING = int(os.getenv("EVENT_MAX_PENDING", "50000"))
+# An entry the DB rejects this many times while it accepts the others goes to `path`.dead
+EVENT_MAX_ATTEMPTS = int(os.getenv("EVENT_MAX_ATTEMPTS", "3"))
+
+GATE_EVENT_TABLE = """
+    CREATE TABLE IF NOT EXISTS gate_event (
+        idEvent INT AUTO_INCREMENT PRIMARY KEY,
+        eventKey VARCHAR(32) UNIQUE,
+        plaque VARCHAR(20),
+        eventTime DATETIME,
+        idCommande INT,
+        decisionPath VARCHAR(10),
+        gate VARCHAR(10),
+        priorite VARCHAR(10),
+        statut VARCHAR(30),
+        latences TEXT
+    )
+"""
+JOURNAL_CHECKPOINT_TABLE = """
+    CREATE TABLE IF NOT EXISTS gate_journal (
+        journal VARCHAR(191) PRIMARY KEY,
+        generation INT,
+        position BIGINT
+    )
+"""
+INSERT_EVENT = """
+    INSERT IGNORE INTO gate_event (eventKey, plaque, eventTime, idCommande, decisionPath, gate, priorite, statut, latences)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+
+class JournalFull(Exception):
+    """Backpressure: too many entries are waiting for the DB, the record was not taken."""
+
+
+class EventJournal:
+    """
+    Append-only journal of gate events and order status changes.
+
+    Each record_*() call appends one JSON line to a local file and returns; a background
+    thread writes the queued entries to the DB in batches (gate_event rows
+    with one executemany, status updates with another) and advances the
+    checkpoint (generation, byte offset) in the same transaction. On start,
+    only the lines after the checkpoint are replayed, so a status update is
+    never applied twice over a change made since through another path.
+
+    Every worker process locks its own file (`path`, `path.1`, ...); a
+    restarted worker takes over, and replays, the file of a dead one. Once
+    fully flushed and larger than `max_bytes`, the file is truncated and
+    starts a new generation (header line), which invalidates the old offset.
+
+    When a batch fails, its entries are retried one by one: while the DB is
+    reachable, an entry it keeps rejecting (e.g. an over-long status) is moved
+    to the dead-letter file `path.dead` instead of blocking every later one.
+    """
+
+    def __init__(self, path: str = EVENT_LOG_PATH, flush_interval: float = EVENT_FLUSH_INTERVAL,
+                 batch_size: int = EVENT_BATCH_SIZE, max_bytes: int = EVENT_LOG_MAX_BYTES,
+                 fsync: bool = EVENT_LOG_FSYNC, max_pending: int = EVENT_MAX_PENDING,
+                 max_attempts: int = EVENT_MAX_ATTEMPTS):
+        self.base_path = path
+        self.path = path  # Slot actually locked by this process, set by start()
+        self.generation = 0
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self._attempts: Dict[str, int] = {}  # entry key -> failed single writes
+        self._pending: List[Tuple[Dict[str, Any], int]] = []  # (entry, file offset after it)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._file = None
+        self.stats_counters = {"recorded": 0, "flushed": 0, "batches": 0, "replayed": 0, "flush_errors": 0,
+                               "dead_lettered": 0, "rejected": 0}
+
+    # --- Writer side (request path) ---
+
+    def _append(self, entry: Dict[str, Any]):
+        line = (json.dumps(entry, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.stats_counters["rejected"] += 1
+                raise JournalFull(f"{len(self._pending)} gate journal entries are waiting for the DB")
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._pending.append((entry, self._file.tell()))
+            self.stats_counters["recorded"] += 1
+            backlog = len(self._pending)
+        if backlog >= self.batch_size:
+            self._wake.set()
+
+    def record_gate_event(self, plate: str, decision: Dict[str, Any], latencies: Dict[str, float],
+                          order_id: Optional[int] = None, new_status: Optional[str] = None):
+        """Gate arrival + decision; `new_status` is applied to the order in the same flush."""
+        self._append({
+            "kind": "gate",
+            "key": uuid.uuid4().hex,
+            "time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "plate": plate,
+            "order": order_id,
+            "path": decision.get("path"),
+            "gate": decision.get("gate"),
+            "priority": decision.get("priority"),
+            "status": new_status,
+            "latencies": {stage: round(seconds * 1000, 1) for stage, seconds in latencies.items()},
+        })
+
+    def record_status(self, order_id: int, new_status: str):
+        self._append({"kind": "status", "key": uuid.uuid4().hex, "order": order_id, "status": new_status})
+
+    # --- Flusher side ---
+
+    def _write_batch(self, entries: List[Dict[str, Any]], position: int):
+        events = [(e["key"], e["plate"], e["time"], e["order"], e["path"], e["gate"], e["priority"],
+                   e["status"], json.dumps(e["latencies"])) for e in entries if e["kind"] == "gate"]
+        # Replayed in log order, so the last status written for an order wins
+        statuses = [(e["status"], e["order"]) for e in entries if e.get("order") and e.get("status")]
+        with db_cursor(commit=True) as cursor:
+            if events:
+                cursor.executemany(INSERT_EVENT, events)
+            if statuses:
+                cursor.executemany("UPDATE commande SET statut = %s WHERE idCommande = %s", statuses)
+            # Committed with the batch: a replay never re-applies what this transaction wrote
+            cursor.execute("REPLACE INTO gate_journal (journal, generation, position) VALUES (%s, %s, %s)",
+                           (self._journal_key(), self.generation, position))
+        if statuses:
+            notify_write("commande")
+
+    def _journal_key(self) -> str:
+        return os.path.abspath(self.path)[-191:]
+
+    def _load_checkpoint(self) -> Optional[Tuple[int, int]]:
+        with db_cursor() as cursor:
+            cursor.execute("SELECT generation, position FROM gate_journal WHERE journal = %s", (self._journal_key(),))
+            row = cursor.fetchone()
+        return (int(row[0]), int(row[1])) if row else None
+
+    def _write_header(self):
+        self._file.write((json.dumps({"kind": "header", "generation": self.generation}) + "\n").encode("utf-8"))
+        self._file.flush()
+
+    def flush(self) -> int:
+        """Writes everything queued so far; returns the number of entries flushed."""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self) -> int:
+        flushed = 0
+        while True:
+            with self._lock:
+                batch = self._pending[:self.batch_size]
+            if not batch:
+                return flushed
+            try:
+                self._write_batch([entry for entry, _ in batch], batch[-1][1])
+            except Exception as e:
+                self.stats_counters["flush_errors"] += 1
+                print(f"⚠️ Gate journal flush failed, retrying entry by entry: {e}")
+                done, dead = self._flush_one_by_one(batch)
+                self._done(done, dead)
+                flushed += done - dead
+                if done < len(batch):
+                    return flushed  # DB unreachable (or an entry still has attempts left): next round
+                continue
+            self._done(len(batch))
+            self.stats_counters["batches"] += 1
+            flushed += len(batch)
+
+    def _flush_one_by_one(self, batch: List[Tuple[Dict[str, Any], int]]) -> Tuple[int, int]:
+        """Writes the head of `batch` entry by entry; returns (settled, dead-lettered among them)."""
+        dead = 0
+        for done, (entry, position) in enumerate(batch):
+            try:
+                self._write_batch([entry], position)
+                self._attempts.pop(entry.get("key"), None)
+                continue
+            except Exception as e:
+                error = e
+            if not self._db_reachable():
+                return done, dead
+            attempts = self._attempts.get(entry.get("key"), 0) + 1
+            if attempts < self.max_attempts:
+                self._attempts[entry.get("key")] = attempts
+                return done, dead
+            # The DB takes other writes but never this one: set it aside, move the checkpoint past it
+            self._dead_letter(entry, error)
+            dead += 1
+            try:
+                self._write_batch([], position)
+            except Exception:
+                return done + 1, dead  # Set aside anyway; a replay would only dead-letter it again
+        return len(batch), dead
+
+    @staticmethod
+    def _db_reachable() -> bool:
+        try:
+            with db_cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            return True
+        except Exception:
+            return False
+
+    def _dead_letter(self, entry: Dict[str, Any], error: Exception):
+        self._attempts.pop(entry.get("key"), None)
+        self.stats_counters["dead_lettered"] += 1
+        with open(self.path + ".dead", "a", encoding="utf-8") as f:
+            f.write(json.dumps({"entry": entry, "error": str(error)}, ensure_ascii=False, default=str) + "\n")
+        print(f"☠️ Gate journal entry {entry.get('key')} rejected by the DB, moved to {self.path}.dead: {error}")
+
+    def _done(self, count: int, dead: int = 0):
+        if not count:
+            return
+        with self._lock:
+            del self._pending[:count]
+            self.stats_counters["flushed"] += count - dead
+            if not self._pending and self._file.tell() > self.max_bytes:
+                # Everything is in the DB: the new generation makes the saved offset stale
+                self._file.truncate(0)
+                self._file.seek(0)
+                self.generation += 1
+                self._write_header()
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+        self.flush()
+
+    # --- Lifecycle ---
+
+    def _open_slot(self):
+        """First journal file (path, path.1, ...) that no other process holds."""
+        for slot in range(EVENT_LOG_SLOTS):
+            path = self.base_path if slot == 0 else f"{self.base_path}.{slot}"
+            f = open(path, "ab+")
+            if fcntl is None:
+                return path, f
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)  # Held until the file is closed
+                return path, f
+            except BlockingIOError:
+                f.close()
+        raise RuntimeError(f"All {EVENT_LOG_SLOTS} gate journal files are in use by other processes")
+
+    def _legacy_checkpoint(self) -> int:
+        """Byte offset saved next to the file by earlier versions (before the DB checkpoint)."""
+        try:
+            with open(self.path + ".checkpoint") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _replay(self):
+        """Queues the entries written after the last checkpoint (previous run crashed or was killed)."""
+        self._file.seek(0)
+        first = self._file.readline()
+        header = json.loads(first) if first.endswith(b"\n") and first.startswith(b'{"kind": "header"') else None
+        saved = self._load_checkpoint()
+        if not first:
+            # New or emptied file: a generation the saved offset cannot refer to
+            self.generation = saved[0] + 1 if saved else 0
+            self._write_header()
+            return
+        self.generation = header["generation"] if header else 0
+        if saved and saved[0] == self.generation:
+            offset = saved[1]
+        elif header:
+            offset = len(first)  # Nothing of this generation was flushed
+        else:
+            offset = self._legacy_checkpoint()
+        self._file.seek(0, os.SEEK_END)
+        offset = min(offset, self._file.tell())
+        self._file.seek(offset)
+        position = offset
+        for raw in self._file:
+            if not raw.endswith(b"\n"):
+                break  # Torn last line: the record() call never returned
+            position += len(raw)
+            try:
+                self._pending.append((json.loads(raw), position))
+            except ValueError:
+                continue
+        # Drop a torn tail so the next append starts on a fresh line
+        self._file.truncate(position)
+        self.stats_counters["replayed"] = len(self._pending)
+        if self._pending:
+            print(f"🔄 Gate journal {self.path}: replaying {len(self._pending)} unflushed entries")
+
+    def start(self) -> "EventJournal":
+        with db_cursor(commit=True) as cursor:
+            cursor.execute(GATE_EVENT_TABLE)
+            cursor.execute(JOURNAL_CHECKPOINT_TABLE)
+        self.path, self._file = self._open_slot()
+        self._replay()
+        self._file.seek(0, os.SEEK_END)
+        self._thread = threading.Thread(target=self._run, name="gate-journal", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+        if self._file:
+            self._file.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.stats_counters, "pending": len(self._pending), "generation": self.generation}
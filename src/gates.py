@@ -0,0 +1,363 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+from src.rules import LOW_STOCK_THRESHOLD, STATUS_AT_DOCK, STATUS_DONE, STATUS_READY, STATUS_WAITING, PolicySet
+
+INBOUND_GATES = [g.strip() for g in os.getenv("INBOUND_GATES", "A,B,C").split(",") if g.strip()]
+PRIORITY_CLIENTS = {c.strip().lower() for c in os.getenv("PRIORITY_CLIENTS", "").split(",") if c.strip()}
+# Expected minutes at the dock before the first real measurements (then a moving average)
+DWELL_OUTBOUND_MIN = float(os.getenv("DWELL_OUTBOUND_MIN", "20"))
+DWELL_INBOUND_MIN = float(os.getenv("DWELL_INBOUND_MIN", "30"))
+# A truck still "at the dock" after OVERSTAY x its expected dwell left without an exit event
+DWELL_OVERSTAY = float(os.getenv("DWELL_OVERSTAY", "3"))
+QUEUE_TTL_MIN = float(os.getenv("GATE_QUEUE_TTL_MIN", "120"))
+# Unconfirmed arrivals kept for the guard (misreads and re-submits pile up: oldest dropped first)
+PENDING_MAX = int(os.getenv("GATE_PENDING_MAX", "200"))
+
+OUTBOUND, INBOUND = "outbound", "inbound"
+# Urgency levels, most urgent first; the queue is one FIFO per (flow, level)
+PRIORITIES = ["HAUTE", "NORMALE", "BASSE"]
+
+
+@dataclass
+class Visit:
+    plate: str
+    flow: str
+    urgency: int
+    order_id: Optional[int] = None
+    client: Optional[str] = None
+    arrived_at: float = field(default_factory=time.monotonic)
+    gate: Optional[str] = None
+    started_at: Optional[float] = None
+    ticket: int = 0  # Order of arrival in its (flow, urgency) queue
+    left: bool = False  # Left the queue before being called: skipped when reached
+
+
+@dataclass
+class Assignment:
+    gate: str  # Dock name, "FILE" (queued), "PARKING" (order not ready) or "CONTROLE" (entry to confirm)
+    priority: str
+    flow: str
+    queue_position: int = 0
+    expected_wait_min: float = 0.0
+    bay_occupancy: int = 0
+    bay_capacity: int = 0
+    reason: str = ""
+
+    @property
+    def queued(self) -> bool:
+        return self.gate == "FILE"
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"gate": self.gate, "priority": self.priority, "flow": self.flow,
+                "queue_position": self.queue_position, "expected_wait_min": round(self.expected_wait_min, 1),
+                "bay": f"{self.bay_occupancy}/{self.bay_capacity}", "reason": self.reason}
+
+    def prompt_text(self) -> str:
+        if self.gate == "PARKING":
+            return f"PARKING (commande pas encore prête). {self.reason}"
+        if self.gate == "CONTROLE":
+            return (f"CONTROLE à l'entrée : le camion attend hors du quai, aucun gate attribué tant que "
+                    f"l'agent n'a pas confirmé l'entrée. {self.reason}")
+        if self.queued:
+            return (f"FILE D'ATTENTE, position {self.queue_position}, attente estimée {self.expected_wait_min:.0f} min "
+                    f"(quai {self.bay_occupancy}/{self.bay_capacity} camions). Priorité {self.priority}. {self.reason}")
+        return (f"Gate {self.gate}, priorité {self.priority} (quai {self.bay_occupancy}/{self.bay_capacity} camions). "
+                f"{self.reason}").strip()
+
+
+class GateBoard:
+    """
+    In-memory dock state: who is at which gate, since when, how long they
+    are expected to stay, and who is waiting. Arrivals are ranked by urgency
+    (critical stock, priority client, order readiness) and served from one
+    FIFO per (flow, urgency level), so assigning, queueing and releasing are
+    constant time. The loading bay never holds more than the policy's
+    max_trucks_in_bay. Pickups use the outbound gates, deliveries the
+    inbound ones with the priority gate tried first for critical stock.
+
+    Only a ready order (or a truck at its dock) is docked on arrival. Unknown
+    plates (misreads included), plates only close to a known one (fuzzy DB
+    match) and orders that are completed or cancelled are
+    held in `pending`, off the dock, until the guard confirms the entry with
+    admit(). A second read of a truck whose order is already on the board
+    (plate variant) gets that visit back instead of a new one.
+    """
+
+    def __init__(self, policies: Optional[PolicySet] = None, inbound_gates: List[str] = INBOUND_GATES,
+                 low_stock_threshold: int = LOW_STOCK_THRESHOLD, priority_clients=PRIORITY_CLIENTS):
+        self.policies = policies or PolicySet.load()
+        self.low_stock_threshold = low_stock_threshold
+        self.priority_clients = set(priority_clients)
+        self.capacity = self.policies.max_trucks_in_bay
+        outbound = list(self.policies.outbound_gates)
+        # The priority gate is handed out last to routine arrivals, so it is usually free for critical stock
+        priority_gate = [self.policies.priority_gate] if self.policies.priority_gate not in outbound else []
+        inbound = [g for g in dict.fromkeys(list(inbound_gates) + priority_gate) if g not in outbound]
+        inbound.sort(key=lambda g: g == self.policies.priority_gate)
+        self.flow_of_gate = {**{g: OUTBOUND for g in outbound}, **{g: INBOUND for g in inbound}}
+        self.free: Dict[str, Deque[str]] = {OUTBOUND: deque(outbound), INBOUND: deque(inbound)}
+        self.occupant: Dict[str, Visit] = {}  # gate -> visit
+        self.queues: Dict[str, List[Deque[Visit]]] = {flow: [deque() for _ in PRIORITIES] for flow in (OUTBOUND, INBOUND)}
+        self.tickets = {flow: [0] * len(PRIORITIES) for flow in (OUTBOUND, INBOUND)}
+        self.visits: Dict[str, Visit] = {}  # plate -> visit (at a gate or queued)
+        self.by_order: Dict[int, str] = {}  # order id -> plate
+        self.pending: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # plate -> held arrival, oldest first
+        self.dwell_min = {OUTBOUND: DWELL_OUTBOUND_MIN, INBOUND: DWELL_INBOUND_MIN}
+        self.called: Deque[Dict[str, Any]] = deque(maxlen=20)  # Queued trucks sent to a freed gate
+        self._lock = threading.Lock()
+        self.counters = {"arrivals": 0, "assigned": 0, "queued": 0, "parked": 0, "held": 0,
+                         "admitted": 0, "duplicates": 0, "released": 0, "overstays": 0}
+
+    # --- Urgency ---
+
+    def urgency(self, facts: Optional[Dict[str, Any]]) -> int:
+        if not facts:
+            return 2  # Unknown truck: served after the known ones
+        level = 1
+        stock = facts.get("stock_disponible")
+        if stock is not None and stock <= self.low_stock_threshold:
+            level = 0  # Policy 3: critical stock bypasses the standard queue
+        elif facts.get("commande_statut") not in (STATUS_READY, STATUS_AT_DOCK):
+            level = 2
+        if (facts.get("client_nom") or "").lower() in self.priority_clients:
+            level = max(0, level - 1)
+        return level
+
+    # --- Arrivals ---
+
+    def assign(self, plate: str, facts: Optional[Dict[str, Any]]) -> Assignment:
+        """Gate, queue slot, parking or entry control for an arrival. A truck already on the board keeps its slot."""
+        with self._lock:
+            self._expire_overstays()
+            visit = self.visits.get(plate)
+            if visit is not None:
+                return self._assignment(visit)
+            if facts and facts.get("fuzzy_match"):
+                # Only close to a known plate: never docked (nor matched to a visit) without the guard
+                self.counters["arrivals"] += 1
+                return self._hold(plate, facts)
+            order_id = facts.get("idCommande") if facts else None
+            if order_id and order_id in self.by_order:
+                # Same order under another plate read (OCR variant): the same truck
+                self.counters["duplicates"] += 1
+                return self._assignment(self.visits[self.by_order[order_id]])
+            self.counters["arrivals"] += 1
+            status = facts.get("commande_statut") if facts else None
+            if order_id and status == STATUS_WAITING:
+                # Policy 5: the order is not ready, the truck waits outside the loading bay
+                self.counters["parked"] += 1
+                return Assignment("PARKING", "ATTENTE", OUTBOUND, bay_occupancy=len(self.occupant),
+                                  bay_capacity=self.capacity, reason="Commande en attente de préparation.")
+            if not order_id or status not in (STATUS_READY, STATUS_AT_DOCK):
+                return self._hold(plate, facts)
+            visit = Visit(plate=plate, flow=OUTBOUND, urgency=self.urgency(facts), order_id=order_id,
+                          client=facts.get("client_nom"))
+            self.pending.pop(plate, None)
+            return self._enter(visit)
+
+    def _enter(self, visit: Visit) -> Assignment:
+        self.visits[visit.plate] = visit
+        if visit.order_id:
+            self.by_order[visit.order_id] = visit.plate
+        if not self._dock(visit, prefer_priority_gate=visit.urgency == 0):
+            visit.ticket = self.tickets[visit.flow][visit.urgency]
+            self.tickets[visit.flow][visit.urgency] += 1
+            self.queues[visit.flow][visit.urgency].append(visit)
+            self.counters["queued"] += 1
+        return self._assignment(visit)
+
+    def _hold(self, plate: str, facts: Optional[Dict[str, Any]]) -> Assignment:
+        """Unknown or ambiguous arrival: kept for the guard, no dock and no bay slot."""
+        order_id = facts.get("idCommande") if facts else None
+        if not facts:
+            reason = "Plaque inconnue (ou mal lue) : vérifier les documents avant l'entrée."
+        elif facts.get("fuzzy_match"):
+            reason = (f"Plaque proche de {facts.get('plaque')} ({facts.get('client_nom')}) sans correspondance "
+                      f"exacte : vérifier l'identité du camion avant l'entrée.")
+        elif not order_id:
+            reason = "Aucune commande active pour ce camion : vérifier l'objet de la visite."
+        else:
+            reason = f"Commande #{order_id} au statut '{facts.get('commande_statut')}' : entrée à confirmer."
+        now = time.monotonic()
+        while self.pending:  # Oldest first: stale holds and overflow
+            oldest = next(iter(self.pending.values()))
+            if len(self.pending) < PENDING_MAX and now - oldest["since"] <= QUEUE_TTL_MIN * 60:
+                break
+            self.pending.popitem(last=False)
+        held = self.pending.pop(plate, None)
+        self.pending[plate] = {"since": held["since"] if held else now, "reason": reason, "order_id": order_id,
+                               "client": facts.get("client_nom") if facts else None,
+                               "flow": OUTBOUND if order_id else INBOUND}
+        if held is None:
+            self.counters["held"] += 1
+        return Assignment("CONTROLE", PRIORITIES[2], self.pending[plate]["flow"], bay_occupancy=len(self.occupant),
+                          bay_capacity=self.capacity, reason=reason)
+
+    def admit(self, plate: str, flow: Optional[str] = None, priority: Optional[str] = None) -> Assignment:
+        """Guard confirmed the entry of a held (or hand-typed) plate: it now gets a gate or a queue slot."""
+        if flow not in (None, OUTBOUND, INBOUND):
+            raise ValueError(f"Unknown flow '{flow}' ({OUTBOUND} or {INBOUND})")
+        if priority not in (None, *PRIORITIES):
+            raise ValueError(f"Unknown priority '{priority}' ({', '.join(PRIORITIES)})")
+        with self._lock:
+            self._expire_overstays()
+            visit = self.visits.get(plate)
+            if visit is not None:
+                return self._assignment(visit)
+            held = self.pending.pop(plate, None) or {}
+            order_id = held.get("order_id")
+            if order_id and order_id in self.by_order:
+                order_id = None  # The order's truck is already on the board under its own plate
+            visit = Visit(plate=plate, flow=flow or held.get("flow") or INBOUND,
+                          urgency=PRIORITIES.index(priority or PRIORITIES[2]), order_id=order_id,
+                          client=held.get("client"))
+            self.counters["admitted"] += 1
+            return self._enter(visit)
+
+    def _dock(self, visit: Visit, prefer_priority_gate: bool = False) -> bool:
+        free = self.free[visit.flow]
+        if not free or len(self.occupant) >= self.capacity:
+            return False
+        gate = self.policies.priority_gate if prefer_priority_gate and self.policies.priority_gate in free else None
+        if gate:
+            free.remove(gate)  # At most a handful of gates
+        else:
+            gate = free.popleft()
+        visit.gate, visit.started_at = gate, time.monotonic()
+        self.occupant[gate] = visit
+        self.counters["assigned"] += 1
+        return True
+
+    def _queue_position(self, visit: Visit) -> int:
+        """Trucks of higher urgency + those ahead in its own FIFO (tickets), without scanning the queue."""
+        queues = self.queues[visit.flow]
+        ahead = sum(len(queues[level]) for level in range(visit.urgency))
+        own = queues[visit.urgency]
+        # Trucks that left the queue still count until they are skipped: a slight overestimate
+        return ahead + (visit.ticket - own[0].ticket if own else 0) + 1
+
+    def _assignment(self, visit: Visit) -> Assignment:
+        priority = PRIORITIES[visit.urgency]
+        occupancy = len(self.occupant)
+        if visit.gate:
+            reason = "Stock critique : passage prioritaire." if visit.urgency == 0 else ""
+            return Assignment(visit.gate, priority, visit.flow, bay_occupancy=occupancy,
+                              bay_capacity=self.capacity, reason=reason)
+        position = self._queue_position(visit)
+        gates = sum(1 for flow in self.flow_of_gate.values() if flow == visit.flow)
+        docks = max(1, min(gates, self.capacity))
+        wait = self._minutes_until_free(visit.flow) + (position - 1) * self.dwell_min[visit.flow] / docks
+        full = "Quai complet" if occupancy >= self.capacity else "Aucun gate libre pour ce flux"
+        return Assignment("FILE", priority, visit.flow, queue_position=position, expected_wait_min=max(0.0, wait),
+                          bay_occupancy=occupancy, bay_capacity=self.capacity, reason=f"{full}.")
+
+    def _minutes_until_free(self, flow: str) -> float:
+        now = time.monotonic()
+        remaining = [max(0.0, v.started_at + self.dwell_min[v.flow] * 60 - now) / 60
+                     for v in self.occupant.values() if v.flow == flow or len(self.occupant) >= self.capacity]
+        return min(remaining, default=0.0)
+
+    # --- Departures ---
+
+    def release(self, gate: str, measured: bool = True) -> Optional[str]:
+        """Frees a gate (truck left); the most urgent queued truck that can use a dock gets one."""
+        with self._lock:
+            return self._release(gate, measured)
+
+    def _release(self, gate: str, measured: bool) -> Optional[str]:
+        visit = self.occupant.pop(gate, None)
+        if visit is None:
+            return None
+        self._forget(visit)
+        if measured:
+            dwell = (time.monotonic() - visit.started_at) / 60
+            self.dwell_min[visit.flow] = 0.8 * self.dwell_min[visit.flow] + 0.2 * dwell
+        self.free[self.flow_of_gate[gate]].append(gate)
+        self.counters["released"] += 1
+        self._call_next()
+        return visit.plate
+
+    def _call_next(self):
+        """Fills free gates from the queues: most urgent first, both flows."""
+        now = time.monotonic()
+        for level in range(len(PRIORITIES)):
+            for flow in (OUTBOUND, INBOUND):
+                queue = self.queues[flow][level]
+                while queue and self.free[flow] and len(self.occupant) < self.capacity:
+                    visit = queue.popleft()
+                    if visit.left:
+                        continue
+                    if now - visit.arrived_at > QUEUE_TTL_MIN * 60:
+                        self._forget(visit)  # Gave up long ago
+                        continue
+                    self._dock(visit, prefer_priority_gate=level == 0)
+                    self.called.append({"plate": visit.plate, "gate": visit.gate, "priority": PRIORITIES[level]})
+                    print(f"📣 {visit.plate} appelé au Gate {visit.gate}")
+
+    def release_plate(self, plate: str) -> Optional[str]:
+        with self._lock:
+            return self._release_plate(plate)
+
+    def _release_plate(self, plate: str) -> Optional[str]:
+        self.pending.pop(plate, None)
+        visit = self.visits.get(plate)
+        if visit and visit.gate:
+            return self._release(visit.gate, measured=True)
+        if visit:  # Left the queue: dropped lazily when its turn comes
+            visit.left = True
+            self._forget(visit)
+        return None
+
+    def _forget(self, visit: Visit):
+        self.visits.pop(visit.plate, None)
+        if visit.order_id and self.by_order.get(visit.order_id) == visit.plate:
+            self.by_order.pop(visit.order_id, None)
+
+    def order_status(self, order_id: int, status: str):
+        """Order updates from the API: a completed order frees its truck's gate."""
+        if status != STATUS_DONE:
+            return
+        with self._lock:
+            plate = self.by_order.get(order_id)
+            if plate:
+                self._release_plate(plate)
+
+    def _expire_overstays(self):
+        now = time.monotonic()
+        for gate, visit in list(self.occupant.items()):  # At most max_trucks_in_bay entries
+            if now - visit.started_at > self.dwell_min[visit.flow] * 60 * DWELL_OVERSTAY:
+                self.counters["overstays"] += 1
+                self._release(gate, measured=False)
+
+    # --- Reporting ---
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._expire_overstays()
+            now = time.monotonic()
+            gates = {}
+            for gate, flow in self.flow_of_gate.items():
+                visit = self.occupant.get(gate)
+                gates[gate] = {"flow": flow, "plate": visit.plate if visit else None,
+                               "since_min": round((now - visit.started_at) / 60, 1) if visit else None,
+                               "priority": PRIORITIES[visit.urgency] if visit else None}
+            return {
+                "bay": {"occupied": len(self.occupant), "capacity": self.capacity},
+                "gates": gates,
+                "pending": [{"plate": plate, "waiting_min": round((now - held["since"]) / 60, 1),
+                             "reason": held["reason"]} for plate, held in self.pending.items()],
+                "queues": {flow: {PRIORITIES[level]: [v.plate for v in queue if not v.left]
+                                  for level, queue in enumerate(queues)}
+                           for flow, queues in self.queues.items()},
+                "expected_dwell_min": {flow: round(minutes, 1) for flow, minutes in self.dwell_min.items()},
+                "recently_called": list(self.called),
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "occupied": len(self.occupant), "pending": len(self.pending),
+                "queued_now": sum(len(q) for queues in self.queues.values() for q in queues)}  # Incl. not yet skipped
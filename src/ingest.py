@@ -0,0 +1,112 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List
+
+from src.rag_engine import chunk_file
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+
+
+def discover(data_dir: str) -> Iterator[str]:
+    """Streams markdown paths under data_dir without listing the whole tree first."""
+    stack = [data_dir]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(".md"):
+                    yield entry.path
+
+
+class BulkIngestor:
+    """
+    Bulk ingestion for large corpora: files are streamed from disk, chunked in
+    a process pool, embedded in fixed-size batches and upserted to Chroma one
+    batch at a time. Chunks whose content hash is already indexed are skipped.
+    """
+
+    def __init__(self, engine, batch_size: int = INGEST_BATCH_SIZE, workers: int = INGEST_WORKERS,
+                 progress_every: float = 5.0):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.workers = max(1, workers)
+        self.progress_every = progress_every
+
+    def _chunked_files(self, data_dir: str, pool: ProcessPoolExecutor):
+        """Ordered, bounded-window map so memory stays flat on huge trees."""
+        window = []
+        for path in discover(data_dir):
+            window.append(pool.submit(chunk_file, path, data_dir))
+            if len(window) >= self.workers * 8:
+                yield window.pop(0).result()
+        for future in window:
+            yield future.result()
+
+    def _flush(self, ids: List[str], documents: List[str], metadatas: List[dict]):
+        self.engine.collection.upsert(
+            ids=ids,
+            embeddings=self.engine.embedding_fn(documents),
+            documents=documents,
+            metadatas=metadatas
+        )
+
+    def run(self, data_dir: str) -> Dict[str, float]:
+        existing = set(self.engine.collection.get(include=[])["ids"])
+        stats = {"files": 0, "chunks": 0, "skipped": 0, "batches": 0}
+        ids, documents, metadatas = [], [], []
+        start = last_report = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            for _, file_ids, chunks, file_metadatas in self._chunked_files(data_dir, pool):
+                stats["files"] += 1
+                for chunk_id, chunk, metadata in zip(file_ids, chunks, file_metadatas):
+                    if chunk_id in existing:
+                        stats["skipped"] += 1
+                        continue
+                    existing.add(chunk_id)
+                    ids.append(chunk_id)
+                    documents.append(chunk)
+                    metadatas.append(metadata)
+
+                    if len(ids) >= self.batch_size:
+                        self._flush(ids, documents, metadatas)
+                        stats["chunks"] += len(ids)
+                        stats["batches"] += 1
+                        ids, documents, metadatas = [], [], []
+
+                now = time.perf_counter()
+                if now - last_report >= self.progress_every:
+                    last_report = now
+                    rate = stats["chunks"] / (now - start)
+                    print(f"⏳ {stats['files']} files, {stats['chunks']} chunks embedded ({rate:.0f} chunks/s)")
+
+        if ids:
+            self._flush(ids, documents, metadatas)
+            stats["chunks"] += len(ids)
+            stats["batches"] += 1
+
+        elapsed = time.perf_counter() - start
+        stats["seconds"] = round(elapsed, 2)
+        stats["chunks_per_sec"] = round(stats["chunks"] / elapsed, 1) if elapsed else 0.0
+        if stats["chunks"]:
+            self.engine.invalidate()
+        return stats
+
+
+if __name__ == "__main__":
+    from src.rag_engine import WarehouseRAGEngine
+
+    parser = argparse.ArgumentParser(description="Bulk-ingest a markdown corpus into the RAG knowledge base")
+    parser.add_argument("data_dir", nargs="?", default="data")
+    parser.add_argument("--db-path", default="./warehouse_db")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    args = parser.parse_args()
+
+    engine = WarehouseRAGEngine(db_path=args.db_path)
+    stats = BulkIngestor(engine, batch_size=args.batch_size, workers=args.workers).run(args.data_dir)
+    print(f"🚀 Ingestion done: {stats}")
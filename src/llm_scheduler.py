@@ -0,0 +1,144 @@
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import ollama
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "1"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "120"))
+
+# Lower value = served first
+PRIORITY_GATE = 0
+PRIORITY_CHAT = 1
+PRIORITY_NAMES = {PRIORITY_GATE: "gate", PRIORITY_CHAT: "chat"}
+
+
+class SchedulerBusy(Exception):
+    """Backpressure: the queue for this priority class is full, retry later."""
+
+
+class LLMScheduler:
+    """
+    Shared dispatch to the local model. At most `max_concurrency` generations
+    run at once; waiting calls are served by priority class (gate decisions
+    before chat) then arrival order. Identical in-flight prompts share one
+    generation, each class has a bounded queue, and every call has a timeout
+    covering both the wait and the generation.
+    """
+
+    def __init__(self, client: Optional[ollama.AsyncClient] = None, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 max_queue: int = LLM_MAX_QUEUE, timeout: float = LLM_CALL_TIMEOUT):
+        self.client = client or ollama.AsyncClient()
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._active = 0
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._queued = {p: 0 for p in PRIORITY_NAMES}
+        self.metrics = {
+            "calls": {name: 0 for name in PRIORITY_NAMES.values()},
+            "coalesced": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "wait_seconds_total": {name: 0.0 for name in PRIORITY_NAMES.values()},
+            "wait_seconds_max": {name: 0.0 for name in PRIORITY_NAMES.values()},
+        }
+
+    # --- Slots ---
+
+    async def _acquire(self, priority: int):
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+            return
+        if self._queued[priority] >= self.max_queue:
+            self.metrics["rejected"] += 1
+            raise SchedulerBusy(f"LLM queue full for '{PRIORITY_NAMES[priority]}' requests")
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), waiter))
+        self._queued[priority] += 1
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release()  # Slot was handed over just as we gave up
+            raise
+        finally:
+            self._queued[priority] -= 1
+
+    def _release(self):
+        self._active -= 1
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                self._active += 1
+                waiter.set_result(None)
+                return
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_CHAT):
+        name = PRIORITY_NAMES[priority]
+        start = time.perf_counter()
+        await self._acquire(priority)
+        waited = time.perf_counter() - start
+        self.metrics["calls"][name] += 1
+        self.metrics["wait_seconds_total"][name] += waited
+        self.metrics["wait_seconds_max"][name] = max(self.metrics["wait_seconds_max"][name], waited)
+        try:
+            yield
+        finally:
+            self._release()
+
+    # --- Calls ---
+
+    async def _generate(self, model: str, messages: List[dict], priority: int, options: Dict[str, Any]):
+        async with self.slot(priority):
+            return await self.client.chat(model=model, messages=messages, **options)
+
+    async def chat(self, model: str, messages: List[dict], priority: int = PRIORITY_CHAT,
+                   timeout: Optional[float] = None, **options):
+        """ollama.chat through the scheduler (identical concurrent prompts are coalesced)."""
+        key = json.dumps([model, messages, options], sort_keys=True, default=str)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.metrics["coalesced"] += 1
+        else:
+            task = asyncio.ensure_future(asyncio.wait_for(
+                self._generate(model, messages, priority, options), timeout or self.timeout))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        # Shielded: one caller giving up must not cancel the others' generation
+        return await asyncio.shield(task)
+
+    def _finished(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        # Counted once per generation, however many callers were coalesced on it
+        if not task.cancelled() and isinstance(task.exception(), asyncio.TimeoutError):
+            self.metrics["timeouts"] += 1
+
+    async def stream_chat(self, model: str, messages: List[dict], priority: int = PRIORITY_CHAT,
+                          **options) -> AsyncIterator[dict]:
+        """Streaming generation; holds its slot until the last token."""
+        async with self.slot(priority):
+            stream = await self.client.chat(model=model, messages=messages, stream=True, **options)
+            try:
+                async for part in stream:
+                    yield part
+            finally:
+                await stream.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": {name: self._queued[p] for p, name in PRIORITY_NAMES.items()},
+            **self.metrics,
+        }
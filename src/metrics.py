@@ -0,0 +1,234 @@
+import bisect
+import functools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter as StackCounter, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+METRICS_PREFIX = "smartwarehouse"
+# Seconds; from a cached OCR hit (~1ms) up to a cold llama3 generation
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))  # 0 = profiler off
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics), one series per label set."""
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _labels(self.labelnames, labels, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+def _flatten(prefix: str, value, out: Dict[str, float]):
+    if isinstance(value, bool):
+        out[prefix] = float(value)
+    elif isinstance(value, (int, float)):
+        out[prefix] = float(value)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(f"{prefix}_{key}", item, out)
+
+
+class Registry:
+    """
+    Metrics exposed on /metrics. Besides histograms and counters, components
+    that already keep their own counters (caches, pools, schedulers...) are
+    registered as collectors: their stats() dict is read at scrape time and
+    exported as gauges, nested keys joined with '_'.
+    """
+
+    def __init__(self, prefix: str = METRICS_PREFIX):
+        self.prefix = prefix
+        self._metrics = []
+        self._collectors: Dict[str, Callable[[], dict]] = {}
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = (), **kwargs) -> Histogram:
+        metric = Histogram(f"{self.prefix}_{name}", help_text, labelnames, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+        metric = Counter(f"{self.prefix}_{name}", help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, name: str, stats: Callable[[], dict]):
+        self._collectors[name] = stats
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, stats in self._collectors.items():
+            values = {}
+            try:
+                _flatten(f"{self.prefix}_{name}", stats(), values)
+            except Exception as e:
+                print(f"⚠️ Metrics collector '{name}' failed: {e}")
+                continue
+            for key, value in values.items():
+                key = re.sub(r"[^a-zA-Z0-9_]", "_", key)
+                lines.append(f"# TYPE {key} gauge")
+                lines.append(f"{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram("stage_seconds", "Latency of hot-path stages", ("component", "stage"))
+REQUEST_SECONDS = REGISTRY.histogram("http_request_seconds", "HTTP request latency", ("method", "route", "status"))
+STAGE_ERRORS = REGISTRY.counter("stage_errors_total", "Stages that raised", ("component", "stage"))
+
+
+@contextmanager
+def stage(component: str, name: str):
+    """Times a block into smartwarehouse_stage_seconds{component, stage}."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(component, name)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, component, name)
+
+
+def timed(component: str, name: Optional[str] = None):
+    """Decorator form of stage(); the stage defaults to the function name."""
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(component, stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class SamplingProfiler:
+    """
+    Opt-in wall-clock sampler for p99 hunting: every `interval` seconds the
+    stacks of all threads are recorded in a ring buffer; when a request is
+    slower than the threshold, the samples taken during it are written as
+    collapsed stacks ("thread;module:function;... count"), the input format
+    of flamegraph.pl and speedscope. The event loop is shared, so a dump
+    shows everything the process did during the slow request.
+    """
+
+    def __init__(self, slow_ms: float = PROFILE_SLOW_MS, interval_ms: float = PROFILE_INTERVAL_MS,
+                 out_dir: str = PROFILE_DIR, window_seconds: float = 120):
+        self.slow_seconds = slow_ms / 1000
+        self.interval = interval_ms / 1000
+        self.out_dir = out_dir
+        self._samples = deque(maxlen=int(window_seconds / self.interval))  # (timestamp, [stacks])
+        self._stop = threading.Event()
+        self._thread = None
+        self.dumps = 0
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            module = os.path.splitext(os.path.basename(code.co_filename))[0]
+            parts.append(f"{module}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(parts))
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks = [f"{names.get(ident, ident)};{self._collapse(frame)}"
+                      for ident, frame in sys._current_frames().items() if ident != me]
+            self._samples.append((time.monotonic(), stacks))
+
+    def start(self) -> "SamplingProfiler":
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        print(f"🔥 Sampling profiler on: requests over {self.slow_seconds * 1000:.0f}ms dumped to {self.out_dir}/")
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def dump(self, started: float, ended: float, label: str) -> Optional[str]:
+        """Writes the samples between two time.monotonic() stamps; returns the file path."""
+        folded = StackCounter()
+        for timestamp, stacks in list(self._samples):
+            if started <= timestamp <= ended:
+                folded.update(stacks)
+        if not folded:
+            return None
+        safe_label = re.sub(r"[^a-zA-Z0-9_-]+", "_", label).strip("_")
+        path = os.path.join(self.out_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_label}-{int((ended - started) * 1000)}ms.folded")
+        with open(path, "w") as f:
+            for stack, count in folded.most_common():
+                f.write(f"{stack} {count}\n")
+        self.dumps += 1
+        return path
@@ -0,0 +1,380 @@
+import asyncio
+import importlib.util
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from src.metrics import stage
+
+# gemini | local | local+gemini (local engine, Gemini for the reads it is not sure about)
+OCR_BACKEND = os.getenv("OCR_BACKEND", "gemini")
+GEMINI_OCR_MODEL = os.getenv("GEMINI_OCR_MODEL", "gemini-flash-latest")
+LOCAL_OCR_MODEL = os.getenv("LOCAL_OCR_MODEL", "plate_crnn.onnx")
+LOCAL_OCR_HEIGHT = int(os.getenv("LOCAL_OCR_HEIGHT", "32"))
+LOCAL_OCR_WIDTH = int(os.getenv("LOCAL_OCR_WIDTH", "128"))
+LOCAL_OCR_THREADS = int(os.getenv("LOCAL_OCR_THREADS", "2"))
+# Below this, a local read is sent to the fallback engine and never cached
+OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "0.9"))
+
+OCR_PROMPT = """You are an expert license plate reader specializing in Tunisian plates.
+        Analyze this license plate image and extract ALL text and numbers.
+
+        Tunisian plates usually have two common formats:
+        1. [Governorate Code] تونس [4-digit Serial]  (Example: "159 تونس 8240")
+        2. [7-digit Serial] نت  (Example: "3341323 نت")
+
+        IMPORTANT:
+        - Read Arabic text carefully (تونس or نت)
+        - Read ALL digits clearly
+        - Maintain the correct order
+        - sometimes there is some different format
+
+        Return ONLY the plate:
+        PLATE: [exact text here]
+        """
+
+OCR_BATCH_PROMPT = """You are an expert license plate reader specializing in Tunisian plates.
+        You will receive {count} license plate images, each one preceded by its number.
+
+        Tunisian plates usually have two common formats:
+        1. [Governorate Code] تونس [4-digit Serial]  (Example: "159 تونس 8240")
+        2. [7-digit Serial] نت  (Example: "3341323 نت")
+
+        IMPORTANT:
+        - Read Arabic text carefully (تونس or نت)
+        - Read ALL digits clearly
+        - Maintain the correct order
+        - Never mix digits from two different images
+
+        Return ONLY one line per image, in order:
+        PLATE 1: [exact text here]
+        PLATE 2: [exact text here]
+        Write UNREADABLE instead of the text when an image cannot be read.
+        """
+
+_BATCH_LINE = re.compile(r"PLATE\s*(\d+)\s*:\s*(.*)", re.IGNORECASE)
+
+# CTC classes of the local recognizer: 0 is the blank, the Arabic words are single symbols
+PLATE_CLASSES = ["", "0", "1", "2", "3", "4", "5", "6", "7", "8", "9", "تونس", "نت"]
+# The two formats of the Gemini prompt; anything else is not trusted from the local engine
+PLATE_FORMATS = [re.compile(r"^\d{1,3} تونس \d{1,4}$"), re.compile(r"^\d{1,7} نت$")]
+
+
+@dataclass
+class PlateRead:
+    plate: Optional[str]
+    confidence: float
+    engine: str
+
+
+class OCRBackend(ABC):
+    """Reads plate crops (BGR). Subclasses implement aread_batch and read; the rest derives from them."""
+
+    name = "base"
+
+    def __init__(self):
+        self.calls = 0
+        self.crops = 0
+
+    @abstractmethod
+    async def aread_batch(self, crops: List[np.ndarray]) -> List[PlateRead]:
+        ...
+
+    async def aread(self, crop: np.ndarray) -> PlateRead:
+        return (await self.aread_batch([crop]))[0]
+
+    @abstractmethod
+    def read(self, crop: np.ndarray) -> PlateRead:
+        """Blocking read, for worker threads (the camera stream); not for the event loop."""
+        ...
+
+    def warm_up(self):
+        pass
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "crops": self.crops}
+
+
+class GeminiOCR(OCRBackend):
+    """The Gemini vision model, one request per batch of crops (numbered images in, numbered lines out)."""
+
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str] = None, model_name: str = GEMINI_OCR_MODEL, model=None):
+        super().__init__()
+        if model is None:
+            import google.generativeai as genai
+
+            genai.configure(api_key=api_key)
+            model = genai.GenerativeModel(model_name)
+        self.model = model
+        self.errors = 0
+
+    @staticmethod
+    def _to_image(crop: np.ndarray):
+        from PIL import Image
+
+        # Convert BGR to RGB for Gemini (Crucial as per your notebook)
+        return Image.fromarray(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB))
+
+    def _inputs(self, crops: List[np.ndarray]) -> list:
+        if len(crops) == 1:
+            return [OCR_PROMPT, self._to_image(crops[0])]
+        inputs = [OCR_BATCH_PROMPT.format(count=len(crops))]
+        for number, crop in enumerate(crops, 1):
+            inputs += [f"Plate {number}:", self._to_image(crop)]
+        return inputs
+
+    @staticmethod
+    def _parse_plate(text: str) -> str:
+        # Extract the plate part using yours or a similar regex
+        if 'PLATE:' in text:
+            return text.split('PLATE:')[1].strip()
+        return text.strip()
+
+    @staticmethod
+    def _parse_batch(text: str, count: int) -> List[Optional[str]]:
+        plates: List[Optional[str]] = [None] * count
+        for line in text.splitlines():
+            match = _BATCH_LINE.search(line)
+            if not match:
+                continue
+            number, plate = int(match.group(1)), match.group(2).strip()
+            if 1 <= number <= count and plate and plate.upper() != "UNREADABLE":
+                plates[number - 1] = plate
+        return plates
+
+    def _reads(self, text: str, count: int) -> List[PlateRead]:
+        plates = [self._parse_plate(text) or None] if count == 1 else self._parse_batch(text, count)
+        return [PlateRead(plate, 1.0 if plate else 0.0, self.name) for plate in plates]
+
+    async def aread_batch(self, crops: List[np.ndarray]) -> List[PlateRead]:
+        self.calls += 1
+        self.crops += len(crops)
+        try:
+            with stage("ocr", self.name):
+                response = await self.model.generate_content_async(self._inputs(crops))
+            return self._reads(response.text, len(crops))
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ Vision Error: {e}")
+            return [PlateRead(None, 0.0, self.name) for _ in crops]
+
+    def read(self, crop: np.ndarray) -> PlateRead:
+        self.calls += 1
+        self.crops += 1
+        try:
+            with stage("ocr", self.name):
+                response = self.model.generate_content(self._inputs([crop]))
+            return self._reads(response.text, 1)[0]
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ Vision Error: {e}")
+            return PlateRead(None, 0.0, self.name)
+
+    def stats(self) -> Dict[str, int]:
+        return {**super().stats(), "errors": self.errors}
+
+
+def ctc_greedy_decode(probs: np.ndarray, classes: List[str] = PLATE_CLASSES) -> List[PlateRead]:
+    """
+    Best path decoding of a (batch, time, classes) probability tensor: argmax
+    per step, repeats collapsed, blanks dropped. The confidence is the lowest
+    probability among the emitted symbols, so one doubtful digit is enough to
+    distrust the whole plate.
+    """
+    best = probs.argmax(axis=2)
+    best_probs = probs.max(axis=2)
+    # Vectorized collapse: keep a step when it differs from the previous one and is not blank
+    keep = np.ones_like(best, dtype=bool)
+    keep[:, 1:] = best[:, 1:] != best[:, :-1]
+    keep &= best != 0
+    reads = []
+    for labels, scores, mask in zip(best, best_probs, keep):
+        symbols = [classes[label] for label in labels[mask]]
+        confidence = float(scores[mask].min()) if mask.any() else 0.0
+        reads.append(PlateRead(format_plate(symbols), confidence, "local"))
+    return reads
+
+
+def format_plate(symbols: List[str]) -> Optional[str]:
+    """Digit/word symbols -> "145 تونس 4862" / "3341323 نت"."""
+    parts, digits = [], ""
+    for symbol in symbols:
+        if symbol.isdigit():
+            digits += symbol
+        else:
+            if digits:
+                parts.append(digits)
+                digits = ""
+            parts.append(symbol)
+    if digits:
+        parts.append(digits)
+    return " ".join(parts) or None
+
+
+def is_plate_format(plate: Optional[str]) -> bool:
+    return bool(plate) and any(pattern.match(plate) for pattern in PLATE_FORMATS)
+
+
+def preprocess_crops(crops: List[np.ndarray], height: int = LOCAL_OCR_HEIGHT,
+                     width: int = LOCAL_OCR_WIDTH) -> np.ndarray:
+    """Model input of the local recognizer, shared with src/train_ocr.py: (N, 1, H, W) grayscale in [0, 1]."""
+    batch = np.empty((len(crops), 1, height, width), dtype=np.float32)
+    for i, crop in enumerate(crops):
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+        batch[i, 0] = cv2.resize(gray, (width, height), interpolation=cv2.INTER_AREA)
+    return batch / 255.0
+
+
+class LocalOCR(OCRBackend):
+    """
+    CPU plate recognizer: a CRNN exported to ONNX (input (N, 1, H, W) float32
+    grayscale in [0, 1], output (N, T, classes) over PLATE_CLASSES with blank
+    first), decoded with CTC best path. onnxruntime and the model are loaded
+    on first use. Reads outside the two Tunisian formats get confidence 0.
+
+    The model is trained on labelled plate crops and exported by
+    `python -m src.train_ocr`; onnxruntime is an optional extra
+    (requirements-ocr.txt).
+    """
+
+    name = "local"
+
+    def __init__(self, model_path: str = LOCAL_OCR_MODEL, height: int = LOCAL_OCR_HEIGHT,
+                 width: int = LOCAL_OCR_WIDTH, threads: int = LOCAL_OCR_THREADS):
+        super().__init__()
+        self.model_path = model_path
+        self.height = height
+        self.width = width
+        self.threads = threads
+        self._session = None
+        self._lock = threading.Lock()
+
+    def unavailable(self) -> Optional[str]:
+        """Why this engine cannot run here, or None when it can."""
+        if importlib.util.find_spec("onnxruntime") is None:
+            return "onnxruntime is not installed (pip install -r requirements-ocr.txt)"
+        if not os.path.exists(self.model_path):
+            return (f"model {self.model_path} not found "
+                    f"(train and export it: python -m src.train_ocr --images <labelled crops> --out {self.model_path})")
+        return None
+
+    def _get_session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import onnxruntime as ort
+
+                    options = ort.SessionOptions()
+                    options.intra_op_num_threads = self.threads
+                    self._session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+                    print(f"✅ Local OCR model loaded: {self.model_path}")
+        return self._session
+
+    def warm_up(self):
+        self.read_batch([np.full((self.height, self.width, 3), 255, dtype=np.uint8)])
+
+    def _preprocess(self, crops: List[np.ndarray]) -> np.ndarray:
+        return preprocess_crops(crops, self.height, self.width)
+
+    @staticmethod
+    def _to_probs(output: np.ndarray, batch_size: int) -> np.ndarray:
+        if output.shape[0] != batch_size and output.shape[1] == batch_size:
+            output = output.transpose(1, 0, 2)  # (T, N, C) export
+        if output.min() < 0 or not np.allclose(output.sum(axis=2), 1.0, atol=1e-3):
+            # Logits (or log-probabilities): softmax over the classes
+            output = np.exp(output - output.max(axis=2, keepdims=True))
+            output /= output.sum(axis=2, keepdims=True)
+        return output
+
+    def read_batch(self, crops: List[np.ndarray]) -> List[PlateRead]:
+        """All the crops in one inference call."""
+        self.calls += 1
+        self.crops += len(crops)
+        session = self._get_session()
+        with stage("ocr", self.name):
+            output = session.run(None, {session.get_inputs()[0].name: self._preprocess(crops)})[0]
+            reads = ctc_greedy_decode(self._to_probs(output, len(crops)))
+        for read in reads:
+            if not is_plate_format(read.plate):
+                read.confidence = 0.0
+        return reads
+
+    async def aread_batch(self, crops: List[np.ndarray]) -> List[PlateRead]:
+        return await asyncio.to_thread(self.read_batch, crops)
+
+    def read(self, crop: np.ndarray) -> PlateRead:
+        return self.read_batch([crop])[0]
+
+
+class FallbackOCR(OCRBackend):
+    """
+    Local engine first; the reads below `min_confidence` are sent to the
+    fallback (Gemini) in one batch. When the fallback cannot answer (uplink
+    down), the local read is kept, flagged by its low confidence.
+    """
+
+    def __init__(self, primary: OCRBackend, fallback: OCRBackend, min_confidence: float = OCR_MIN_CONFIDENCE):
+        super().__init__()
+        self.primary = primary
+        self.fallback = fallback
+        self.min_confidence = min_confidence
+        self.name = f"{primary.name}+{fallback.name}"
+        self.fallbacks = 0
+        self.fallback_misses = 0
+
+    def warm_up(self):
+        self.primary.warm_up()
+
+    async def aread_batch(self, crops: List[np.ndarray]) -> List[PlateRead]:
+        self.calls += 1
+        self.crops += len(crops)
+        reads = await self.primary.aread_batch(crops)
+        doubtful = [i for i, read in enumerate(reads) if read.confidence < self.min_confidence]
+        if not doubtful:
+            return reads
+        self.fallbacks += len(doubtful)
+        for i, read in zip(doubtful, await self.fallback.aread_batch([crops[i] for i in doubtful])):
+            if read.plate:
+                reads[i] = read
+            else:
+                self.fallback_misses += 1
+        return reads
+
+    def read(self, crop: np.ndarray) -> PlateRead:
+        read = self.primary.read(crop)
+        if read.confidence >= self.min_confidence:
+            return read
+        self.fallbacks += 1
+        second = self.fallback.read(crop)
+        if second.plate:
+            return second
+        self.fallback_misses += 1
+        return read
+
+    def stats(self) -> Dict:
+        return {**super().stats(), "fallbacks": self.fallbacks, "fallback_misses": self.fallback_misses,
+                self.primary.name: self.primary.stats(), self.fallback.name: self.fallback.stats()}
+
+
+def create_ocr_backend(api_key: Optional[str] = None, backend: str = OCR_BACKEND) -> OCRBackend:
+    if backend == "gemini":
+        return GeminiOCR(api_key)
+    if backend in ("local", "local+gemini"):
+        local = LocalOCR()
+        problem = local.unavailable()
+        if problem and backend == "local":
+            raise RuntimeError(f"OCR_BACKEND=local cannot start: {problem}")
+        if problem:
+            # The fallback can read every plate on its own: vision stays up, only slower and paid
+            print(f"⚠️ Local OCR disabled, Gemini reads every plate: {problem}")
+            return GeminiOCR(api_key)
+        return local if backend == "local" else FallbackOCR(local, GeminiOCR(api_key))
+    raise ValueError(f"Unknown OCR_BACKEND '{backend}' (gemini, local or local+gemini)")
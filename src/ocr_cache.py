@@ -0,0 +1,234 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import cv2
+import numpy as np
+
+# Fingerprint = 64-bit key to find candidates + normalized thumbnail to confirm them.
+# A global hash cannot do both: a re-framed crop of the same plate and a plate
+# differing by one digit end up the same number of bits away. The thumbnails are
+# compared after alignment, per character-wide window, so a single changed
+# character stands out however small it is next to the whole plate.
+THUMB_WIDTH = 128
+THUMB_HEIGHT = 32
+HASH_BITS = 64
+CHAR_WINDOW = 10  # Thumbnail columns per character, roughly (plates hold 8-12 characters)
+MAX_SHIFT_X, MAX_SHIFT_Y = 2, 1  # Residual misalignment searched when comparing thumbnails
+PRUNE_EVERY = 64  # SQLite store: expired/overflow rows deleted every N writes
+
+
+@dataclass(eq=False)
+class PlateFingerprint:
+    key: int
+    thumb: np.ndarray  # int8, THUMB_HEIGHT x THUMB_WIDTH, contrast-normalized
+
+
+def _text_region(gray: np.ndarray) -> np.ndarray:
+    """
+    Bounding box of the characters: blobs of character height that do not touch
+    the crop border. Box jitter then only changes the margins, which are cut off.
+    """
+    _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    count, _, boxes, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    height, width = gray.shape
+    x, y, w, h = (boxes[1:, i] for i in range(4))
+    chars = ((h >= 0.25 * height) & (h <= 0.9 * height) & (x > 0) & (y > 0)
+             & (x + w < width) & (y + h < height))
+    if not chars.any():
+        return gray
+    return gray[y[chars].min():(y + h)[chars].max(), x[chars].min():(x + w)[chars].max()]
+
+
+def plate_fingerprint(plate_crop: np.ndarray) -> PlateFingerprint:
+    """
+    Fingerprint of a (deskewed) plate crop: the character region is cut out,
+    scaled to a fixed thumbnail, blurred and contrast-normalized, so lighting,
+    sensor noise and a few pixels of box jitter barely change it. The key is the
+    sign pattern of the thumbnail's 64 lowest horizontal frequencies (pHash).
+    """
+    gray = cv2.cvtColor(plate_crop, cv2.COLOR_BGR2GRAY) if plate_crop.ndim == 3 else plate_crop
+    region = _text_region(gray)
+    thumb = cv2.resize(region, (THUMB_WIDTH, THUMB_HEIGHT), interpolation=cv2.INTER_AREA).astype(np.float32)
+    thumb = cv2.GaussianBlur(thumb, (0, 0), 1.5)
+    thumb = np.clip((thumb - thumb.mean()) / (thumb.std() + 1e-6), -1, 1)
+    low = cv2.dct(thumb)[:2, :HASH_BITS // 2 + 1].flatten()[1:HASH_BITS + 1]  # DC term left out
+    key = int.from_bytes(np.packbits(low > np.median(low)).tobytes(), "big")
+    return PlateFingerprint(key, np.rint(thumb * 127).astype(np.int8))
+
+
+def thumbnail_distance(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    Mean absolute difference (0..2) of the worst character-wide window, at the
+    best alignment within MAX_SHIFT: small for the same plate, large as soon as
+    one character differs.
+    """
+    a = a.astype(np.float32) / 127
+    b = b.astype(np.float32) / 127
+    height, width = a.shape
+    best = float("inf")
+    for dy in range(-MAX_SHIFT_Y, MAX_SHIFT_Y + 1):
+        for dx in range(-MAX_SHIFT_X, MAX_SHIFT_X + 1):
+            shifted_a = a[max(0, dy):height + min(0, dy), max(0, dx):width + min(0, dx)]
+            shifted_b = b[max(0, -dy):height + min(0, -dy), max(0, -dx):width + min(0, -dx)]
+            columns = np.cumsum(np.abs(shifted_a - shifted_b).mean(axis=0))
+            windows = (columns[CHAR_WINDOW - 1:] - np.concatenate(([0.0], columns[:-CHAR_WINDOW]))) / CHAR_WINDOW
+            best = min(best, float(windows.max()))
+    return best
+
+
+class OCRCache:
+    """
+    LRU + TTL cache of OCR results keyed by plate fingerprint.
+
+    Candidates are the entries whose key is within `max_distance` bits.
+    Fingerprint keys are split into `max_distance + 1` bands; by the pigeonhole
+    principle any key within that distance matches at least one band exactly,
+    so only those entries are compared. A candidate is a hit only if its
+    thumbnail is within `max_diff` (see thumbnail_distance). With `path`,
+    entries are also written to SQLite and reloaded on start-up.
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 3600, max_distance: int = 12,
+                 max_diff: float = 0.27, path: Optional[str] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.max_diff = max_diff
+        self._entries = OrderedDict()  # key -> (plate, expires_at, thumb)
+        self._bands = {}  # (band, value) -> set of keys
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0  # Key matched but the thumbnails differ: another plate
+
+        band_count = max_distance + 1
+        width = -(-HASH_BITS // band_count)
+        self._band_slices = [(shift, min(width, HASH_BITS - shift)) for shift in range(0, HASH_BITS, width)]
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(ocr_cache)")}
+            if columns and "thumb" not in columns:
+                self._db.execute("DROP TABLE ocr_cache")  # Previous fingerprint format: not comparable
+            self._db.execute("CREATE TABLE IF NOT EXISTS ocr_cache "
+                             "(fingerprint TEXT PRIMARY KEY, plate TEXT, expires_at REAL, thumb BLOB)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_ocr_cache_expires ON ocr_cache (expires_at)")
+            self._puts = 0
+            self._load()
+
+    @classmethod
+    def from_env(cls) -> "OCRCache":
+        return cls(
+            maxsize=int(os.getenv("OCR_CACHE_SIZE", "2048")),
+            ttl=float(os.getenv("OCR_CACHE_TTL", "3600")),
+            # Candidate search only: a loose key threshold costs a few thumbnail comparisons
+            max_distance=int(os.getenv("OCR_CACHE_MAX_DISTANCE", "12")),
+            # Same-plate re-framings stay under ~0.21, one changed character is above ~0.33
+            max_diff=float(os.getenv("OCR_CACHE_MAX_DIFF", "0.27")),
+            path=os.getenv("OCR_CACHE_PATH") or None,
+        )
+
+    def _band_keys(self, key: int):
+        for i, (shift, width) in enumerate(self._band_slices):
+            yield i, (key >> shift) & ((1 << width) - 1)
+
+    def _index(self, key: int):
+        for band in self._band_keys(key):
+            self._bands.setdefault(band, set()).add(key)
+
+    def _unindex(self, key: int):
+        for band in self._band_keys(key):
+            bucket = self._bands.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._bands[band]
+
+    def _remove(self, key: int):
+        del self._entries[key]
+        self._unindex(key)
+
+    def _closest(self, fingerprint: PlateFingerprint) -> Optional[int]:
+        candidates = set()
+        for band in self._band_keys(fingerprint.key):
+            candidates |= self._bands.get(band, set())
+        near = sorted(((candidate ^ fingerprint.key).bit_count(), candidate) for candidate in candidates)
+        best, best_diff = None, self.max_diff
+        for distance, candidate in near:
+            if distance > self.max_distance:
+                break
+            diff = thumbnail_distance(fingerprint.thumb, self._entries[candidate][2])
+            if diff <= best_diff:
+                best, best_diff = candidate, diff
+        if best is None and near and near[0][0] <= self.max_distance:
+            self.rejected += 1
+        return best
+
+    def get(self, fingerprint: PlateFingerprint) -> Optional[str]:
+        with self._lock:
+            match = self._closest(fingerprint)
+            if match is not None:
+                plate, expires_at, _ = self._entries[match]
+                if expires_at > time.time():
+                    self._entries.move_to_end(match)
+                    self.hits += 1
+                    return plate
+                self._remove(match)
+            self.misses += 1
+            return None
+
+    def put(self, fingerprint: PlateFingerprint, plate: str):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            # Two plates sharing a key: the newest read replaces the other (a later miss, never a wrong hit)
+            self._store(fingerprint.key, plate, expires_at, fingerprint.thumb)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO ocr_cache VALUES (?, ?, ?, ?)",
+                                 (format(fingerprint.key, "x"), plate, expires_at, fingerprint.thumb.tobytes()))
+                self._puts += 1
+                if self._puts % PRUNE_EVERY == 0:
+                    self._prune()
+                self._db.commit()
+
+    def _store(self, key: int, plate: str, expires_at: float, thumb: np.ndarray):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (plate, expires_at, thumb)
+        self._index(key)
+        while len(self._entries) > self.maxsize:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            if self._db is not None:
+                self._db.execute("DELETE FROM ocr_cache WHERE fingerprint = ?", (format(oldest, "x"),))
+
+    def _prune(self):
+        """Expired rows and rows beyond maxsize (other workers write to the same file) leave the table."""
+        self._db.execute("DELETE FROM ocr_cache WHERE expires_at <= ?", (time.time(),))
+        self._db.execute("DELETE FROM ocr_cache WHERE fingerprint NOT IN "
+                         "(SELECT fingerprint FROM ocr_cache ORDER BY expires_at DESC LIMIT ?)", (self.maxsize,))
+
+    def _load(self):
+        self._prune()
+        rows = self._db.execute(
+            "SELECT fingerprint, plate, expires_at, thumb FROM ocr_cache ORDER BY expires_at DESC LIMIT ?",
+            (self.maxsize,)).fetchall()
+        for key, plate, expires_at, thumb in reversed(rows):
+            thumb = np.frombuffer(thumb, dtype=np.int8).reshape(THUMB_HEIGHT, THUMB_WIDTH)
+            self._store(int(key, 16), plate, expires_at, thumb)
+        self._db.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,193 @@
+import bisect
+import datetime
+import difflib
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.catalog import normalize_name
+from src.database import db_cursor, notify_write, on_write
+
+ORDER_INDEX_TTL = float(os.getenv("ORDER_INDEX_TTL", "300"))
+ORDER_FUZZY_CUTOFF = float(os.getenv("ORDER_FUZZY_CUTOFF", "0.85"))
+ORDER_DEFAULT_DEPOT = int(os.getenv("ORDER_DEFAULT_DEPOT", "5"))
+ORDER_STATUS_NEW = "en attente"
+
+INSERT_ORDER = """
+    INSERT INTO commande (idClient, idProduit, idDepot, dateCommande, statut, quantite)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+# Conditional decrement: the row lock makes check-and-reserve atomic, concurrent orders cannot oversell
+RESERVE_STOCK = "UPDATE produit SET Quantite = Quantite - %s WHERE idProduit = %s AND Quantite >= %s"
+
+
+class NameIndex:
+    """
+    In-memory name -> id lookup replacing `nom LIKE '%name%'` scans:
+    exact match, then prefix of the name or of any of its words (bisect on a
+    sorted key list), then a fuzzy match for typos. Ambiguous prefixes resolve
+    to nothing rather than to an arbitrary row.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[int, str]], fuzzy_cutoff: float = ORDER_FUZZY_CUTOFF):
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.exact: Dict[str, int] = {}
+        keys = []
+        for row_id, name in rows:
+            normalized = " ".join(normalize_name(name or "").split())
+            if not normalized:
+                continue
+            self.exact.setdefault(normalized, row_id)
+            words = normalized.split(" ")
+            for i in range(len(words)):
+                keys.append((" ".join(words[i:]), row_id))
+        keys.sort()
+        self._keys = [key for key, _ in keys]
+        self._ids = [row_id for _, row_id in keys]
+        self._by_initial: Dict[str, List[str]] = defaultdict(list)
+        for name in self.exact:
+            self._by_initial[name[0]].append(name)
+
+    def __len__(self):
+        return len(self.exact)
+
+    def resolve(self, name: str) -> Optional[int]:
+        key = " ".join(normalize_name(name or "").split())
+        if not key:
+            return None
+        if key in self.exact:
+            return self.exact[key]
+
+        start = bisect.bisect_left(self._keys, key)
+        end = bisect.bisect_right(self._keys, key + "\uffff")
+        matches = set(self._ids[start:end])
+        if len(matches) == 1:
+            return matches.pop()
+        if matches:
+            return None  # "Client" matches every client
+
+        close = difflib.get_close_matches(key, self._by_initial.get(key[0], ()), n=1, cutoff=self.fuzzy_cutoff)
+        return self.exact[close[0]] if close else None
+
+
+class OrderService:
+    """
+    Order creation: names resolved through NameIndex, stock reserved and the
+    order inserted in one transaction, IDs allocated by AUTO_INCREMENT.
+    """
+
+    def __init__(self, ttl: float = ORDER_INDEX_TTL, depot: int = ORDER_DEFAULT_DEPOT):
+        self.ttl = ttl
+        self.depot = depot
+        self._indexes: Dict[str, Tuple[NameIndex, float]] = {}
+        self._lock = threading.Lock()
+        on_write(self._on_write)
+
+    def _on_write(self, table: str):
+        if table == "client":
+            self._indexes.pop("client", None)
+
+    def _load(self, table: str) -> NameIndex:
+        id_column = "idClient" if table == "client" else "idProduit"
+        with db_cursor() as cursor:
+            cursor.execute(f"SELECT {id_column}, nom FROM {table}")
+            index = NameIndex(cursor.fetchall())
+        self._indexes[table] = (index, time.monotonic())
+        return index
+
+    def _resolve(self, table: str, name: str) -> Optional[int]:
+        entry = self._indexes.get(table)
+        if entry is None or time.monotonic() - entry[1] > self.ttl:
+            with self._lock:
+                entry = self._indexes.get(table)
+                if entry is None or time.monotonic() - entry[1] > self.ttl:
+                    entry = (self._load(table), time.monotonic())
+        row_id = entry[0].resolve(name)
+        if row_id is None and time.monotonic() - entry[1] > 1.0:
+            # Maybe created since the last load (e.g. by another worker): one reload, at most once a second
+            with self._lock:
+                row_id = self._load(table).resolve(name)
+        return row_id
+
+    def resolve_client(self, name: str) -> Optional[int]:
+        return self._resolve("client", name)
+
+    def resolve_product(self, name: str) -> Optional[int]:
+        return self._resolve("produit", name)
+
+    def _prepare(self, client_name: str, product_name: str, quantity: Any) -> Dict[str, Any]:
+        try:
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            quantity = 0
+        if quantity <= 0:
+            return {"status": "invalid_quantity"}
+        client_id = self.resolve_client(client_name)
+        if client_id is None:
+            return {"status": "unknown_client"}
+        product_id = self.resolve_product(product_name)
+        if product_id is None:
+            return {"status": "unknown_product"}
+        return {"status": "ok", "idClient": client_id, "idProduit": product_id, "quantite": quantity}
+
+    def _row(self, order: Dict[str, Any]) -> tuple:
+        return (order["idClient"], order["idProduit"], self.depot, datetime.date.today(),
+                ORDER_STATUS_NEW, order["quantite"])
+
+    def create_order(self, client_name: str, product_name: str, quantity: Any) -> Dict[str, Any]:
+        order = self._prepare(client_name, product_name, quantity)
+        if order["status"] != "ok":
+            return order
+        with db_cursor(commit=True) as cursor:
+            cursor.execute(RESERVE_STOCK, (order["quantite"], order["idProduit"], order["quantite"]))
+            if cursor.rowcount != 1:
+                return {"status": "insufficient_stock"}  # The UPDATE matched no row: nothing to undo
+            cursor.execute(INSERT_ORDER, self._row(order))
+            order_id = cursor.lastrowid
+        notify_write("produit")
+        notify_write("commande")
+        return {"status": "created", "idCommande": order_id}
+
+    def create_orders(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Bulk creation in one transaction: one conditional stock update per
+        product (in id order, so concurrent batches cannot deadlock), then one
+        INSERT per order, each id read from its own lastrowid (AUTO_INCREMENT
+        values of a multi-row insert are not guaranteed consecutive). When a
+        product's total exceeds its stock, every order for that product is
+        rejected.
+        """
+        results = [self._prepare(item.get("client"), item.get("product"), item.get("quantity"))
+                   if isinstance(item, dict) else {"status": "invalid"} for item in items]
+        wanted = Counter()
+        for order in results:
+            if order["status"] == "ok":
+                wanted[order["idProduit"]] += order["quantite"]
+        if not wanted:
+            return results
+
+        with db_cursor(commit=True) as cursor:
+            short = set()
+            for product_id in sorted(wanted):
+                cursor.execute(RESERVE_STOCK, (wanted[product_id], product_id, wanted[product_id]))
+                if cursor.rowcount != 1:
+                    short.add(product_id)
+
+            accepted = []
+            for order in results:
+                if order["status"] != "ok":
+                    continue
+                if order["idProduit"] in short:
+                    order.clear()
+                    order["status"] = "insufficient_stock"
+                else:
+                    accepted.append(order)
+            for order in accepted:
+                cursor.execute(INSERT_ORDER, self._row(order))
+                order.update(status="created", idCommande=cursor.lastrowid)
+
+        notify_write("produit")
+        notify_write("commande")
+        return results
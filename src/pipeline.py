@@ -0,0 +1,237 @@
+import asyncio
+import datetime
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from src.database import get_complete_arrival_info, update_order_status, run_db
+from src.event_log import JournalFull
+from src.llm_scheduler import SchedulerBusy
+from src.metrics import STAGE_SECONDS
+from src.rules import STATUS_AT_DOCK
+
+# Per-stage budgets (seconds). A slow stage degrades the answer instead of stalling the gate.
+DETECT_TIMEOUT = float(os.getenv("DETECT_TIMEOUT", "5"))
+OCR_TIMEOUT = float(os.getenv("OCR_TIMEOUT", "10"))
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", "3"))
+RAG_TIMEOUT = float(os.getenv("RAG_TIMEOUT", "5"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "45"))
+VISION_WORKERS = int(os.getenv("VISION_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+
+class StageTimeout(Exception):
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"Stage '{stage}' exceeded {timeout}s")
+        self.stage = stage
+
+
+class EntrancePipeline:
+    """
+    Async entrance flow: Image -> decode (worker pool) -> YOLO (micro-batched) -> OCR (async) ->
+    DB facts + RAG rules (concurrently) -> LLM decision (async) -> status update.
+    """
+
+    def __init__(self, vision, agent, journal=None, workers: int = VISION_WORKERS):
+        self.vision = vision
+        self.agent = agent
+        # Gate events + status updates are written behind the response (src/event_log.py)
+        self.journal = journal
+        self.cpu_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vision")
+
+    async def _stage(self, name: str, awaitable, timeout: float):
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            print(f"⏱️ Stage '{name}' timed out after {timeout}s")
+            raise StageTimeout(name, timeout)
+
+    async def read_plates(self, image_bytes: bytes, timings: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+        """
+        Every readable plate of the frame, highest detection confidence first,
+        as {"plate", "confidence", "box"}. All crops are read in one OCR call.
+        """
+        timings = {} if timings is None else timings
+        start = time.perf_counter()
+        candidates = await self._stage(
+            "detect", self.vision.alocate_plates(image_bytes, self.cpu_pool), DETECT_TIMEOUT)
+        timings["detect"] = time.perf_counter() - start
+        if not candidates:
+            return []
+        start = time.perf_counter()
+        plates = await self._stage("ocr", self.vision.aread_plates([crop for crop, _ in candidates]), OCR_TIMEOUT)
+        timings["ocr"] = time.perf_counter() - start
+        return [{"plate": plate, "confidence": round(box[4], 3), "box": list(box[:4])}
+                for plate, (_, box) in zip(plates, candidates) if plate]
+
+    async def _rules(self, retrieve, *args) -> List[str]:
+        try:
+            return await self._stage("rag", asyncio.to_thread(retrieve, *args), RAG_TIMEOUT)
+        except StageTimeout:
+            return []
+
+    def start_context(self, plate: str) -> Dict[str, asyncio.Task]:
+        """Starts the DB lookup and the plate/policy RAG searches together as soon as the plate is known."""
+        return {
+            "facts": asyncio.create_task(self._stage("db", run_db(get_complete_arrival_info, plate), DB_TIMEOUT)),
+            "plate_rules": asyncio.create_task(self._rules(self.agent.retrieve_vehicle_rules, plate)),
+            "policies": asyncio.create_task(self._rules(self.agent.retrieve_policies)),
+        }
+
+    async def facts_of(self, tasks: Dict[str, asyncio.Task]) -> Optional[Dict[str, Any]]:
+        try:
+            return await tasks["facts"]
+        except StageTimeout:
+            return None
+
+    async def context_of(self, tasks: Dict[str, asyncio.Task], facts: Optional[Dict[str, Any]]) -> List[str]:
+        # Client rules need the client name; the other searches kept running meanwhile
+        client_rules = []
+        if facts:
+            client_rules = await self._rules(self.agent.retrieve_client_rules, facts['client_nom'])
+        plate_rules = await tasks["plate_rules"]
+        policies = await tasks["policies"]
+        return list(dict.fromkeys(client_rules + plate_rules + policies))
+
+    @staticmethod
+    def cancel_context(tasks: Dict[str, asyncio.Task]):
+        for task in tasks.values():
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()  # Retrieved: a failed lookup nobody awaited is not reported as lost
+
+    async def _stream_llm(self, vehicle_data: Dict[str, Any], facts, context_chunks: List[str], assignment=None):
+        """LLM tokens, with LLM_TIMEOUT applied to the whole generation."""
+        deadline = asyncio.get_running_loop().time() + LLM_TIMEOUT
+        tokens = self.agent.astream_reason(vehicle_data, facts, context_chunks, assignment)
+        try:
+            while True:
+                remaining = deadline - asyncio.get_running_loop().time()
+                try:
+                    yield await self._stage("llm", tokens.__anext__(), max(remaining, 0))
+                except StopAsyncIteration:
+                    return
+        finally:
+            await tokens.aclose()
+
+    async def stream(self, image_bytes: bytes) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Incremental entrance flow as (event, payload) pairs: "plate" right after
+        OCR, then "facts", then either one rule "decision" or the LLM "token"s
+        followed by the final "decision", and "done".
+
+        The decision is for the most confident plate (the truck at the
+        barrier); every vehicle read in the frame is listed in "vehicles".
+        """
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+        try:
+            vehicles = await self.read_plates(image_bytes, timings)
+        except StageTimeout as e:
+            vehicles = []
+            print(f"❌ Plate recognition aborted: {e}")
+        plate_number = vehicles[0]["plate"] if vehicles else None
+
+        if not plate_number:
+            if self.journal:
+                timings["total"] = time.perf_counter() - started
+                self.journal_event(None, {"path": "hold"}, timings)
+            yield "error", {
+                "status": "error",
+                "message": "No license plate detected in the image.",
+                "decision": "HOLD",
+                "analysis": "Vehicle arrived but plate recognition failed. Manual check required."
+            }
+            return
+
+        print(f"✅ Plate Detected: {plate_number}" + (f" (+{len(vehicles) - 1} in view)" if len(vehicles) > 1 else ""))
+        current_time = datetime.datetime.now().strftime("%I:%M %p")
+        yield "plate", {"plate": plate_number, "timestamp": current_time, "vehicles": vehicles}
+
+        tasks = self.start_context(plate_number)
+        try:
+            start = time.perf_counter()
+            facts = await self.facts_of(tasks)
+            timings["db"] = time.perf_counter() - start
+            yield "facts", {"factual_data": facts}
+
+            start = time.perf_counter()
+
+            # Gate from the dock state (constant time), then the rule fast path when the
+            # arrival is routine, otherwise RAG context + LLM explaining that assignment
+            assignment = self.agent.gates.assign(plate_number, facts)
+            decision = self.agent.rules.decide(facts, assignment)
+            if decision:
+                self.cancel_context(tasks)
+                analysis, details = decision.analysis, decision.as_dict()
+            else:
+                context_chunks = await self.context_of(tasks, facts)
+                vehicle_data = {"plate": plate_number, "time": current_time}
+                parts = []
+                try:
+                    async for token in self._stream_llm(vehicle_data, facts, context_chunks, assignment):
+                        parts.append(token)
+                        yield "token", {"text": token}
+                    analysis = "".join(parts)
+                except StageTimeout:
+                    analysis = "".join(parts) + "\nDécision IA indisponible (délai dépassé). Vérification manuelle requise à la barrière."
+                except SchedulerBusy:
+                    analysis = "Décision IA indisponible (modèle saturé). Vérification manuelle requise à la barrière."
+                details = {"gate": assignment.gate, "priority": assignment.priority, "path": "llm"}
+            details["assignment"] = assignment.as_dict()
+            timings["decision"] = time.perf_counter() - start
+            yield "decision", {"analysis": analysis, "decision": details}
+
+            # Action Layer: only a truck the rules sent to a dock moves its order forward.
+            # Parked/queued trucks and LLM answers (not a confirmed admission) leave the order as it is.
+            order_id = facts.get('idCommande') if facts else None
+            new_status = STATUS_AT_DOCK if order_id and self.admitted(details) else None
+            timings["total"] = time.perf_counter() - started
+            for name, seconds in timings.items():
+                STAGE_SECONDS.observe(seconds, "entrance", name)
+            # Journaled and applied by the write-behind flusher: no DB commit on the response path
+            journaled = self.journal_event(plate_number, details, timings, order_id, new_status)
+            if new_status and not journaled:
+                await run_db(update_order_status, order_id, new_status)
+            if new_status:
+                print(f"🔄 Auto-Update: Order for {plate_number} set to '{new_status}'")
+
+            yield "done", {"status": "success"}
+        finally:
+            # Also when the DB lookup fails or the SSE client goes away mid-stream
+            self.cancel_context(tasks)
+
+    def journal_event(self, plate: Optional[str], details: Dict[str, Any], timings: Dict[str, float],
+                      order_id: Optional[int] = None, new_status: Optional[str] = None) -> bool:
+        """False when there is no journal or it is full (the caller writes the status itself)."""
+        if not self.journal:
+            return False
+        try:
+            self.journal.record_gate_event(plate, details, timings, order_id, new_status)
+            return True
+        except JournalFull as e:
+            print(f"⚠️ Gate event for {plate} not journaled: {e}")
+            return False
+
+    @staticmethod
+    def admitted(details: Dict[str, Any]) -> bool:
+        return details.get("path") == "rules" and details.get("gate") not in (None, "PARKING", "FILE", "CONTROLE")
+
+    async def process(self, image_bytes: bytes) -> Dict[str, Any]:
+        """Non-streaming response: the same events folded into one JSON document."""
+        result = {}
+        async for event, payload in self.stream(image_bytes):
+            if event == "error":
+                return payload
+            if event != "token":
+                result.update(payload)
+        return {
+            "status": result["status"],
+            "plate": result["plate"],
+            "analysis": result["analysis"],
+            "decision": result["decision"],
+            "timestamp": result["timestamp"],
+            "factual_data": result["factual_data"],
+            "vehicles": result["vehicles"]
+        }
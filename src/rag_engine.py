@@ -1,11 +1,87 @@
 import os
-import chromadb
-from chromadb.utils import embedding_functions
-from typing import List, Dict
+from typing import List, Dict, Optional
 import glob
+import hashlib
+import json
+import sys
+import threading
+from src.cache import LRUCache
+from src.chunker import chunk_markdown
+from src.metrics import stage
+
+RAG_EMBEDDING_CACHE_SIZE = int(os.getenv("RAG_EMBEDDING_CACHE_SIZE", "4096"))
+RAG_RESULT_CACHE_SIZE = int(os.getenv("RAG_RESULT_CACHE_SIZE", "1024"))
+# Bounds staleness when the collection is rebuilt by another process
+RAG_RESULT_CACHE_TTL = float(os.getenv("RAG_RESULT_CACHE_TTL", "600"))
+RAG_EMBED_BATCH_SIZE = int(os.getenv("RAG_EMBED_BATCH_SIZE", "64"))
+
+def chunk_file(file_path: str, data_dir: str):
+    """Splits one markdown file into chunks with content-hashed IDs and their metadata."""
+    with open(file_path, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    # Markdown-aware chunking: one chunk per section, tables/lists split on row/item boundaries
+    sections = {}
+    for chunk in chunk_markdown(content):
+        sections.setdefault(chunk.text, chunk.section)
+    chunks = list(sections)
+
+    # Prepare metadata and IDs: editing one paragraph only changes that chunk's ID
+    path = os.path.relpath(file_path, data_dir).replace(os.sep, "/")
+    category = os.path.basename(os.path.dirname(file_path))
+    filename = os.path.basename(file_path)
+
+    ids = [f"{path}:{hashlib.sha1(chunk.encode('utf-8')).hexdigest()[:16]}" for chunk in chunks]
+    metadatas = [{"category": category, "source": filename, "path": path, "section": sections[chunk]}
+                 for chunk in chunks]
+    return path, ids, chunks, metadatas
+
+class KnowledgeBaseWatcher:
+    """Polls data_dir and re-syncs the collection when a markdown file changes."""
+
+    def __init__(self, engine: "WarehouseRAGEngine", data_dir: str, interval: float = 2.0):
+        self.engine = engine
+        self.data_dir = data_dir
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _snapshot(self) -> Dict[str, float]:
+        files = glob.glob(os.path.join(self.data_dir, "**/*.md"), recursive=True)
+        snapshot = {}
+        for file_path in files:
+            try:
+                snapshot[file_path] = os.stat(file_path).st_mtime
+            except FileNotFoundError:
+                pass
+        return snapshot
+
+    def _run(self):
+        previous = self._snapshot()
+        while not self._stop.wait(self.interval):
+            current = self._snapshot()
+            if current != previous:
+                try:
+                    print(f"🔁 Knowledge base changed: {self.engine.sync_documents(self.data_dir)}")
+                    previous = current
+                except Exception as e:
+                    print(f"❌ RAG sync failed: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="rag-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
 
 class WarehouseRAGEngine:
     def __init__(self, db_path: str = "./warehouse_db"):
+        # Imported here: chromadb + sentence-transformers (torch) take seconds to import,
+        # and chunk_file users (ingest workers) never need them
+        import chromadb
+        from chromadb.utils import embedding_functions
+
         # Initialize ChromaDB
         self.client = chromadb.PersistentClient(path=db_path)
         
@@ -19,55 +95,168 @@ class WarehouseRAGEngine:
             embedding_function=self.embedding_fn
         )
 
+        # Arrivals for known clients repeat the same handful of queries
+        self.embedding_cache = LRUCache(maxsize=RAG_EMBEDDING_CACHE_SIZE)
+        self.result_cache = LRUCache(maxsize=RAG_RESULT_CACHE_SIZE, ttl=RAG_RESULT_CACHE_TTL)
+        self.collection_version = 0
+
+    def warm_up(self):
+        """Runs one embedding so the SentenceTransformer weights are loaded before the first arrival."""
+        self.embedding_fn(["warm-up"])
+
+    def invalidate(self):
+        """Drops cached results after the collection changed (embeddings stay valid)."""
+        self.result_cache.clear()
+        self.collection_version += 1
+
+    def cache_stats(self) -> Dict[str, dict]:
+        return {
+            "embeddings": self.embedding_cache.stats(),
+            "results": self.result_cache.stats(),
+            "collection_version": self.collection_version,
+        }
+
+    def _embed(self, text: str) -> List[float]:
+        embedding = self.embedding_cache.get(text)
+        if embedding is None:
+            embedding = [float(x) for x in self.embedding_fn([text])[0]]
+            self.embedding_cache.put(text, embedding)
+        return embedding
+
     def load_documents(self, data_dir: str):
-        """Loads markdown files from data_dir"""
+        """Loads markdown files from data_dir (incrementally, see sync_documents)"""
+        return self.sync_documents(data_dir)
+
+    def _existing_ids_by_path(self) -> Dict[str, set]:
+        existing = {}
+        records = self.collection.get(include=["metadatas"])
+        for chunk_id, metadata in zip(records["ids"], records["metadatas"]):
+            # Chunks indexed before content hashing have no "path": they get replaced
+            existing.setdefault((metadata or {}).get("path"), set()).add(chunk_id)
+        return existing
+
+    def _upsert(self, ids: List[str], documents: List[str], metadatas: List[dict]):
+        """Embeds and writes chunks in fixed-size batches."""
+        for start in range(0, len(ids), RAG_EMBED_BATCH_SIZE):
+            end = start + RAG_EMBED_BATCH_SIZE
+            self.collection.upsert(
+                ids=ids[start:end],
+                embeddings=self.embedding_fn(documents[start:end]),
+                documents=documents[start:end],
+                metadatas=metadatas[start:end]
+            )
+
+    def sync_documents(self, data_dir: str) -> Dict[str, int]:
+        """
+        Brings the collection in line with the markdown files under data_dir.
+        Chunk IDs are content hashes, so only new or edited chunks are embedded
+        and chunks that disappeared (or whose file was deleted) are removed.
+        """
+        existing = self._existing_ids_by_path()
         files = glob.glob(os.path.join(data_dir, "**/*.md"), recursive=True)
-        
+        summary = {"files": len(files), "added": 0, "removed": 0, "unchanged": 0}
+
+        new_ids, new_documents, new_metadatas = [], [], []
         for file_path in files:
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-                
-            # Simple chunking by paragraph/section
-            chunks = [c.strip() for c in content.split("\n\n") if c.strip()]
-            
-            # Prepare metadata and IDs
-            category = os.path.basename(os.path.dirname(file_path))
-            filename = os.path.basename(file_path)
-            
-            ids = [f"{filename}_{i}" for i in range(len(chunks))]
-            metadatas = [{"category": category, "source": filename} for _ in chunks]
-            
-            # Add to collection
-            self.collection.add(
-                documents=chunks,
-                metadatas=metadatas,
-                ids=ids
-            )
-            print(f"✅ Loaded {len(chunks)} chunks from {filename} ({category})")
+            path, ids, chunks, metadatas = chunk_file(file_path, data_dir)
+            known = existing.pop(path, set())
+            added = 0
+            for chunk_id, chunk, metadata in zip(ids, chunks, metadatas):
+                if chunk_id in known:
+                    summary["unchanged"] += 1
+                    continue
+                new_ids.append(chunk_id)
+                new_documents.append(chunk)
+                new_metadatas.append(metadata)
+                added += 1
 
-    def query(self, query_text: str, n_results: int = 3) -> List[str]:
-        """Retrieves the most relevant chunks for a given query."""
-        results = self.collection.query(
-            query_texts=[query_text],
-            n_results=n_results
-        )
+            stale = known - set(ids)
+            if stale:
+                self.collection.delete(ids=list(stale))
+                summary["removed"] += len(stale)
+            if added or stale:
+                print(f"✅ {path}: {added} new/changed chunks, {len(stale)} removed")
+
+        # Whatever is left belongs to deleted files (or to the old positional IDs)
+        for path, stale in existing.items():
+            self.collection.delete(ids=list(stale))
+            summary["removed"] += len(stale)
+            print(f"🧹 Removed {len(stale)} chunks from {path or 'legacy index'}")
+
+        self._upsert(new_ids, new_documents, new_metadatas)
+        summary["added"] = len(new_ids)
+
+        if summary["added"] or summary["removed"]:
+            self.invalidate()
+        return summary
+
+    def query(self, query_text: str, n_results: int = 3, where: Optional[dict] = None) -> List[str]:
+        """Retrieves the most relevant chunks for a given query (optionally pre-filtered on metadata)."""
+        cache_key = (query_text, n_results, json.dumps(where, sort_keys=True) if where else None)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
+
+        with stage("rag", "embed"):
+            embedding = self._embed(query_text)
+        with stage("rag", "search"):
+            results = self.collection.query(
+                query_embeddings=[embedding],
+                n_results=n_results,
+                where=where
+            )
         # Flatten the list of lists returned by Chroma
-        return results["documents"][0] if results["documents"] else []
+        documents = results["documents"][0] if results["documents"] else []
+        self.result_cache.put(cache_key, tuple(documents))
+        return documents
+
+    def keyword_search(self, keyword: str, where: Optional[dict] = None, limit: int = 3) -> List[str]:
+        """Exact-name hits through Chroma's document filter: no embedding, no ANN search."""
+        cache_key = ("$contains", keyword, limit, json.dumps(where, sort_keys=True) if where else None)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
+
+        with stage("rag", "keyword"):
+            results = self.collection.get(where=where, where_document={"$contains": keyword},
+                                          limit=limit, include=["documents"])
+        documents = results["documents"] or []
+        self.result_cache.put(cache_key, tuple(documents))
+        return documents
+
+    def search(self, query_text: str, categories: Optional[List[str]] = None, client: Optional[str] = None,
+               n_results: int = 3, hybrid: bool = True) -> List[str]:
+        """
+        Scoped retrieval: `categories` (clients, orders, policies, suppliers, inventory)
+        are pushed into the Chroma `where` clause so the ANN search only scans those
+        chunks. With `client` and `hybrid`, chunks naming the client exactly come
+        first and vector results fill the remaining slots.
+        """
+        where = None
+        if categories:
+            where = {"category": categories[0]} if len(categories) == 1 else {"category": {"$in": list(categories)}}
+
+        documents = []
+        if client and hybrid:
+            documents = self.keyword_search(client, where=where, limit=n_results)
+        if len(documents) < n_results:
+            for document in self.query(query_text, n_results=n_results, where=where):
+                if document not in documents:
+                    documents.append(document)
+        return documents[:n_results]
 
 if __name__ == "__main__":
-    # Quick test / Seed RAG
+    # Seed / refresh the RAG knowledge base (only changed chunks are re-embedded)
     engine = WarehouseRAGEngine()
     
     data_path = os.path.join(os.getcwd(), "data")
-    
-    # Reload documents
-    if engine.collection.count() > 0:
-        print("🧹 Refreshing knowledge base...")
-        engine.client.delete_collection("warehouse_knowledge")
-        engine.collection = engine.client.create_collection(
-            name="warehouse_knowledge",
-            embedding_function=engine.embedding_fn
-        )
-    
-    engine.load_documents(data_path)
+    print(f"🔄 Syncing knowledge base: {engine.sync_documents(data_path)}")
     print("🚀 Warehouse RAG Knowledge Base ready!")
+
+    if "--watch" in sys.argv:
+        print("👀 Watching for changes (Ctrl+C to stop)...")
+        watcher = KnowledgeBaseWatcher(engine, data_path).start()
+        try:
+            watcher._thread.join()
+        except KeyboardInterrupt:
+            watcher.stop()
@@ -0,0 +1,154 @@
+import itertools
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+POLICY_PATH = os.getenv("POLICY_PATH", os.path.join("data", "policies", "warehouse_logic.md"))
+LOW_STOCK_THRESHOLD = int(os.getenv("LOW_STOCK_THRESHOLD", "20"))
+
+# commande.statut values in the DB
+STATUS_READY = "en cours"
+STATUS_WAITING = "en attente"
+STATUS_AT_DOCK = "au quai"  # Written by the gate once the truck is sent to a dock: not "ready" again
+STATUS_DONE = "terminée"
+ORDER_STATUSES = (STATUS_WAITING, STATUS_READY, STATUS_AT_DOCK, STATUS_DONE)
+
+
+@dataclass
+class PolicySet:
+    """The parts of warehouse_logic.md that can be applied without an LLM."""
+    outbound_gates: List[str] = field(default_factory=lambda: ["D", "E"])
+    priority_gate: str = "A"
+    max_trucks_in_bay: int = 3
+    min_supplier_reliability: int = 80
+
+    @classmethod
+    def from_markdown(cls, text: str) -> "PolicySet":
+        policies = cls()
+        for line in text.splitlines():
+            gates = re.findall(r"Gate\s+\**([A-Z])\b", line)
+            if "Outbound" in line and gates:
+                policies.outbound_gates = list(dict.fromkeys(gates))
+            elif "Gate Priority" in line and gates:
+                policies.priority_gate = gates[0]
+            trucks = re.search(r"No more than (\d+) trucks", line)
+            if trucks:
+                policies.max_trucks_in_bay = int(trucks.group(1))
+            reliability = re.search(r"reliability below (\d+)%", line)
+            if reliability:
+                policies.min_supplier_reliability = int(reliability.group(1))
+        return policies
+
+    @classmethod
+    def load(cls, path: str = POLICY_PATH) -> "PolicySet":
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls.from_markdown(f.read())
+        except OSError:
+            print(f"⚠️ Policy file {path} not found, using default gate rules")
+            return cls()
+
+
+@dataclass
+class Decision:
+    gate: str
+    priority: str
+    analysis: str
+    path: str = "rules"
+
+    def as_dict(self) -> Dict[str, str]:
+        return {"gate": self.gate, "priority": self.priority, "path": self.path}
+
+
+class DecisionStats:
+    """Fast-path hit rate and per-path latency."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"rules": 0, "llm": 0}
+        self.total_seconds = {"rules": 0.0, "llm": 0.0}
+
+    def record(self, path: str, seconds: float):
+        with self._lock:
+            self.counts[path] += 1
+            self.total_seconds[path] += seconds
+
+    def report(self) -> Dict[str, Any]:
+        total = sum(self.counts.values())
+        return {
+            "decisions": total,
+            "fast_path_hit_rate": round(self.counts["rules"] / total, 3) if total else 0.0,
+            "avg_ms": {path: round(1000 * self.total_seconds[path] / count, 3) if count else None
+                       for path, count in self.counts.items()},
+            "counts": dict(self.counts),
+        }
+
+
+class RuleEngine:
+    """
+    Deterministic fast path for routine arrivals. Known client + order ready
+    for pickup, or an order not ready yet, are decided from the policies and
+    the DB facts alone; anything else returns None and goes to the LLM.
+    """
+
+    def __init__(self, policies: Optional[PolicySet] = None, low_stock_threshold: int = LOW_STOCK_THRESHOLD):
+        self.policies = policies or PolicySet.load()
+        self.low_stock_threshold = low_stock_threshold
+        self.stats = DecisionStats()
+        self._outbound_gates = itertools.cycle(self.policies.outbound_gates)  # When no GateBoard assignment is given
+
+    def decide(self, facts: Optional[Dict[str, Any]], assignment=None) -> Optional[Decision]:
+        """`assignment` is the src.gates.Assignment for this arrival: its gate (or queue slot) is used as is."""
+        start = time.perf_counter()
+        decision = self._decide(facts, assignment)
+        if decision:
+            self.stats.record("rules", time.perf_counter() - start)
+        return decision
+
+    def _decide(self, facts: Optional[Dict[str, Any]], assignment=None) -> Optional[Decision]:
+        if not facts or not facts.get("idCommande"):
+            return None  # Unknown truck or no order: needs judgement
+        if facts.get("fuzzy_match"):
+            return None  # Plate only close to a known truck's: could be a stranger
+
+        client = facts["client_nom"]
+        order = facts["idCommande"]
+        status = facts.get("commande_statut")
+        product = facts.get("produit_nom") or "produit non référencé"
+
+        if status == STATUS_WAITING:
+            # Policy 5: pickups only enter the loading bay once the order is ready
+            return Decision(
+                gate="PARKING", priority="ATTENTE",
+                analysis=(f"Gate: PARKING | Priorité: ATTENTE\n"
+                          f"Bonjour, {client}. La commande #{order} ({product}) n'est pas encore prête "
+                          f"(statut '{status}'). Merci de patienter au parking, vous serez appelé dès sa préparation."))
+
+        if status not in (STATUS_READY, STATUS_AT_DOCK):
+            return None  # Completed/cancelled order showing up again: ambiguous
+
+        stock = facts.get("stock_disponible")
+        critical = stock is not None and stock <= self.low_stock_threshold
+        if assignment and assignment.queued:
+            return Decision(
+                gate="FILE", priority=assignment.priority,
+                analysis=(f"Gate: FILE | Priorité: {assignment.priority}\n"
+                          f"Bonjour, {client}. Commande #{order} ({product}) prête, mais le quai est occupé "
+                          f"({assignment.bay_occupancy}/{assignment.bay_capacity} camions). Vous êtes n°"
+                          f"{assignment.queue_position} dans la file, attente estimée ~{assignment.expected_wait_min:.0f} min. "
+                          f"Merci de patienter au parking, vous serez appelé."))
+        if assignment:
+            gate, priority = assignment.gate, assignment.priority
+        else:
+            gate = next(self._outbound_gates)
+            priority = "HAUTE" if critical else "NORMALE"
+        stock_note = f" Stock critique ({stock} unités) : passage prioritaire." if critical else ""
+        return Decision(
+            gate=gate, priority=priority,
+            analysis=(f"Gate: {gate} | Priorité: {priority}\n"
+                      f"Bonjour, {client}. Commande #{order} ({product}) prête pour enlèvement. "
+                      f"Dirigez-vous vers le Gate {gate} (flux clients séparé des livraisons fournisseurs)."
+                      f"{stock_note}"))
@@ -0,0 +1,163 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Tuple
+
+from src.cache import LRUCache
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")  # "memory" or "sqlite"
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "chat_sessions.db")
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "3"))  # user/assistant pairs kept per session
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))
+SESSION_MAX_MESSAGE_CHARS = int(os.getenv("SESSION_MAX_MESSAGE_CHARS", "1000"))
+
+Turn = Tuple[str, str]  # (user message, assistant reply)
+
+
+class SessionStore(ABC):
+    """
+    Rolling window of the last `max_turns` chatbot turns per session_id.
+    Idle sessions expire after `ttl` seconds.
+    """
+
+    def __init__(self, max_turns: int = SESSION_MAX_TURNS, ttl: float = SESSION_TTL,
+                 max_message_chars: int = SESSION_MAX_MESSAGE_CHARS):
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self.max_message_chars = max_message_chars
+
+    def _turn(self, user_message: str, reply: str) -> Turn:
+        return (str(user_message or "")[:self.max_message_chars], str(reply or "")[:self.max_message_chars])
+
+    @abstractmethod
+    def history(self, session_id: str) -> List[Turn]:
+        ...
+
+    @abstractmethod
+    def append(self, session_id: str, user_message: str, reply: str):
+        ...
+
+    @abstractmethod
+    def clear(self, session_id: str):
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, object]:
+        ...
+
+    def history_text(self, session_id: str) -> str:
+        """History formatted for the receptionist prompt."""
+        lines = []
+        for user_message, reply in self.history(session_id):
+            lines.append(f"User: {user_message}")
+            lines.append(f"AI: {reply}")
+        return "\n".join(lines)
+
+
+class MemorySessionStore(SessionStore):
+    """Single-process store: at most `max_sessions` sessions, least recently used evicted first."""
+
+    def __init__(self, max_sessions: int = SESSION_MAX_SESSIONS, **kwargs):
+        super().__init__(**kwargs)
+        self._sessions = LRUCache(maxsize=max_sessions, ttl=self.ttl)
+        self._lock = threading.Lock()
+
+    def history(self, session_id: str) -> List[Turn]:
+        return list(self._sessions.get(session_id, ()))
+
+    def append(self, session_id: str, user_message: str, reply: str):
+        with self._lock:
+            turns = self._sessions.get(session_id, ()) + (self._turn(user_message, reply),)
+            self._sessions.put(session_id, turns[-self.max_turns:])
+
+    def clear(self, session_id: str):
+        self._sessions.pop(session_id)
+
+    def stats(self) -> Dict[str, object]:
+        return {"backend": "memory", "max_turns": self.max_turns, **self._sessions.stats()}
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Persistent store shared by every uvicorn worker on the host: one row per
+    session holding its window as JSON. WAL lets workers read while another
+    one writes; expired rows are pruned every `prune_every` writes.
+    """
+
+    def __init__(self, path: str = SESSION_DB_PATH, prune_every: int = 500, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._writes = 0
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chat_session (
+                    session_id TEXT PRIMARY KEY,
+                    turns TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_session_updated ON chat_session (updated_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def history(self, session_id: str) -> List[Turn]:
+        row = self._conn().execute(
+            "SELECT turns FROM chat_session WHERE session_id = ? AND updated_at > ?",
+            (session_id, time.time() - self.ttl)).fetchone()
+        return [tuple(turn) for turn in json.loads(row[0])] if row else []
+
+    def append(self, session_id: str, user_message: str, reply: str):
+        conn = self._conn()
+        now = time.time()
+        # IMMEDIATE takes the write lock up front: two workers appending to the same session serialize
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT turns, updated_at FROM chat_session WHERE session_id = ?",
+                               (session_id,)).fetchone()
+            turns = json.loads(row[0]) if row and row[1] > now - self.ttl else []
+            turns = (turns + [list(self._turn(user_message, reply))])[-self.max_turns:]
+            conn.execute(
+                "INSERT INTO chat_session (session_id, turns, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET turns = excluded.turns, updated_at = excluded.updated_at",
+                (session_id, json.dumps(turns, ensure_ascii=False), now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune()
+
+    def prune(self) -> int:
+        cursor = self._conn().execute("DELETE FROM chat_session WHERE updated_at <= ?", (time.time() - self.ttl,))
+        return cursor.rowcount
+
+    def clear(self, session_id: str):
+        self._conn().execute("DELETE FROM chat_session WHERE session_id = ?", (session_id,))
+
+    def stats(self) -> Dict[str, object]:
+        count = self._conn().execute("SELECT COUNT(*) FROM chat_session").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "max_turns": self.max_turns, "size": count}
+
+
+def create_session_store(backend: str = SESSION_BACKEND) -> SessionStore:
+    if backend == "sqlite":
+        print(f"✅ Chat sessions persisted in {SESSION_DB_PATH}")
+        return SQLiteSessionStore()
+    if backend != "memory":
+        print(f"⚠️ Unknown SESSION_BACKEND '{backend}', using in-memory sessions")
+    return MemorySessionStore()
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+# How long a request arriving during warm-up waits for its component before getting a 503
+READY_WAIT = float(os.getenv("READY_WAIT", "30"))
+
+
+class ComponentNotReady(Exception):
+    pass
+
+
+class Components:
+    """
+    Heavy components (YOLO weights, ChromaDB + SentenceTransformer, the gate
+    journal...) built in the background after the server starts accepting
+    connections. Factories run concurrently in worker threads; a factory can
+    depend on others by name and receives them as keyword arguments. An
+    `optional` dependency that failed to load is passed as None instead of
+    failing the dependent component too.
+    """
+
+    def __init__(self, wait: float = READY_WAIT):
+        self.wait = wait
+        self._factories: Dict[str, tuple] = {}
+        self._instances: Dict[str, Any] = {}
+        self._events: Dict[str, asyncio.Event] = {}
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self.started_at = time.monotonic()
+        self.ready_seconds: Optional[float] = None
+
+    def register(self, name: str, factory: Callable[..., Any], depends: tuple = (), optional: tuple = ()):
+        self._factories[name] = (factory, depends, optional)
+        self._events[name] = asyncio.Event()
+        self._status[name] = {"state": "pending"}
+
+    async def _build(self, name: str):
+        factory, depends, optional = self._factories[name]
+        try:
+            kwargs = {dep: await self.get(dep, timeout=None) for dep in depends}
+            missing = []
+            for dep in optional:
+                try:
+                    kwargs[dep] = await self.get(dep, timeout=None)
+                except ComponentNotReady:
+                    kwargs[dep] = None
+                    missing.append(dep)
+            self._status[name] = {"state": "loading"}
+            start = time.perf_counter()
+            instance = await asyncio.to_thread(factory, **kwargs)
+            self._instances[name] = instance
+            self._status[name] = {"state": "ready", "load_seconds": round(time.perf_counter() - start, 3)}
+            if missing:
+                self._status[name]["without"] = missing
+            print(f"✅ {name} ready in {self._status[name]['load_seconds']}s"
+                  + (f" (without {', '.join(missing)})" if missing else ""))
+        except Exception as e:
+            self._status[name] = {"state": "failed", "error": str(e)}
+            print(f"❌ {name} failed to load: {e}")
+        finally:
+            self._events[name].set()
+
+    async def start(self):
+        """Builds every registered component; returns once all of them are ready or failed."""
+        self.started_at = time.monotonic()
+        await asyncio.gather(*(self._build(name) for name in self._factories))
+        if self.ready:
+            self.ready_seconds = round(time.monotonic() - self.started_at, 3)
+            print(f"🚀 All components ready in {self.ready_seconds}s")
+
+    async def get(self, name: str, timeout: Optional[float] = -1) -> Any:
+        """The component, waiting for it to load (`timeout` seconds, default READY_WAIT)."""
+        if name in self._instances:
+            return self._instances[name]
+        try:
+            await asyncio.wait_for(self._events[name].wait(), self.wait if timeout == -1 else timeout)
+        except asyncio.TimeoutError:
+            raise ComponentNotReady(f"{name} is still loading")
+        if name not in self._instances:
+            raise ComponentNotReady(f"{name} failed to load: {self._status[name].get('error')}")
+        return self._instances[name]
+
+    def peek(self, name: str) -> Optional[Any]:
+        """The component if already loaded, without waiting."""
+        return self._instances.get(name)
+
+    @property
+    def ready(self) -> bool:
+        return all(status["state"] == "ready" for status in self._status.values())
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "uptime_seconds": round(time.monotonic() - self.started_at, 3),
+            "ready_seconds": self.ready_seconds,
+            "components": self._status,
+        }
@@ -0,0 +1,190 @@
+import argparse
+import datetime
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+import cv2
+import numpy as np
+
+
+def sharpness(crop: np.ndarray) -> float:
+    """Variance of the Laplacian: higher means a crisper plate crop."""
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def iou(a, b) -> float:
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+@dataclass
+class PlateTrack:
+    track_id: int
+    box: tuple
+    best_crop: np.ndarray
+    best_sharpness: float
+    hits: int = 1
+    missed: int = 0
+    since_improved: int = 0
+    fired: bool = False
+    plate: Optional[str] = None
+
+
+@dataclass
+class StreamStats:
+    frames_read: int = 0
+    frames_processed: int = 0
+    vehicles: int = 0
+    ocr_calls: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    def report(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "frames_read": self.frames_read,
+            "frames_processed": self.frames_processed,
+            "processed_fps": round(self.frames_processed / elapsed, 2) if elapsed else 0.0,
+            "vehicles": self.vehicles,
+            "ocr_calls": self.ocr_calls,
+            "ocr_calls_per_vehicle": round(self.ocr_calls / self.vehicles, 2) if self.vehicles else 0.0,
+        }
+
+
+class PlateTracker:
+    """Greedy IoU tracker: keeps, per plate, the sharpest crop seen so far."""
+
+    def __init__(self, iou_threshold: float = 0.3, max_missed: int = 5):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.tracks: List[PlateTrack] = []
+        self._next_id = 1
+
+    def update(self, frame: np.ndarray, boxes) -> List[PlateTrack]:
+        """Matches this frame's boxes to tracks; returns the tracks that were lost."""
+        unmatched = list(self.tracks)
+        for x1, y1, x2, y2, _ in sorted(boxes, key=lambda b: -b[4]):
+            box = (x1, y1, x2, y2)
+            crop = frame[y1:y2, x1:x2]
+            if crop.size == 0:
+                continue
+            score = sharpness(crop)
+            best = max(unmatched, key=lambda t: iou(t.box, box), default=None)
+            if best is not None and iou(best.box, box) >= self.iou_threshold:
+                unmatched.remove(best)
+                best.box, best.hits, best.missed = box, best.hits + 1, 0
+                if score > best.best_sharpness:
+                    best.best_crop, best.best_sharpness, best.since_improved = crop.copy(), score, 0
+                else:
+                    best.since_improved += 1
+            else:
+                self.tracks.append(PlateTrack(self._next_id, box, crop.copy(), score))
+                self._next_id += 1
+
+        lost = []
+        for track in unmatched:
+            track.missed += 1
+            if track.missed > self.max_missed:
+                self.tracks.remove(track)
+                lost.append(track)
+        return lost
+
+    def flush(self) -> List[PlateTrack]:
+        remaining, self.tracks = self.tracks, []
+        return remaining
+
+
+class StreamProcessor:
+    """
+    Continuous ingestion from a video file or RTSP stream.
+
+    Only every `frame_skip`-th frame goes through YOLO (skipped frames are
+    grabbed, not decoded). Plates are tracked across frames and OCR + agent
+    reasoning fire once per vehicle: as soon as the crop has stopped getting
+    sharper for `settle_frames` processed frames, or when the vehicle leaves.
+    """
+
+    def __init__(self, vision, on_vehicle: Optional[Callable[[str, PlateTrack], None]] = None,
+                 frame_skip: int = 3, min_hits: int = 2, settle_frames: int = 4, max_missed: int = 5):
+        self.vision = vision
+        self.on_vehicle = on_vehicle
+        self.frame_skip = max(1, frame_skip)
+        self.min_hits = min_hits
+        self.settle_frames = settle_frames
+        self.tracker = PlateTracker(max_missed=max_missed)
+        self.stats = StreamStats()
+
+    def _fire(self, track: PlateTrack):
+        if track.fired or track.hits < self.min_hits:
+            return  # Already handled, or a spurious one-frame detection
+        track.fired = True
+        self.stats.vehicles += 1
+        self.stats.ocr_calls += 1
+        track.plate = self.vision.read_plate(track.best_crop)
+        print(f"🚚 Vehicle #{track.track_id}: {track.plate} (sharpness {track.best_sharpness:.0f}, {track.hits} frames)")
+        if track.plate and self.on_vehicle:
+            self.on_vehicle(track.plate, track)
+
+    def run(self, source, max_frames: Optional[int] = None) -> dict:
+        capture = cv2.VideoCapture(source)
+        if not capture.isOpened():
+            raise ValueError(f"Cannot open video source: {source}")
+        self.stats = StreamStats()
+        try:
+            while max_frames is None or self.stats.frames_read < max_frames:
+                if self.stats.frames_read % self.frame_skip:
+                    if not capture.grab():
+                        break
+                    self.stats.frames_read += 1
+                    continue
+
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                self.stats.frames_read += 1
+                self.stats.frames_processed += 1
+
+                for track in self.tracker.update(frame, self.vision.detect_plates(frame)):
+                    self._fire(track)
+                for track in self.tracker.tracks:
+                    if track.hits >= self.min_hits and track.since_improved >= self.settle_frames:
+                        self._fire(track)
+        finally:
+            capture.release()
+
+        for track in self.tracker.flush():
+            self._fire(track)
+        return self.stats.report()
+
+
+if __name__ == "__main__":
+    import os
+    from dotenv import load_dotenv
+    from src.vision import VisionPipeline
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Run the gate pipeline on a video file or RTSP stream")
+    parser.add_argument("source", help="Video file path or rtsp:// URL (use 0 for the local webcam)")
+    parser.add_argument("--model", default="smartALPR_best.pt")
+    parser.add_argument("--frame-skip", type=int, default=3)
+    parser.add_argument("--max-frames", type=int)
+    parser.add_argument("--with-agent", action="store_true", help="Also run the agent decision for each vehicle")
+    args = parser.parse_args()
+
+    vision = VisionPipeline(args.model, os.getenv("GEMINI_API_KEY"))
+    agent = None
+    if args.with_agent:
+        from src.agent import WarehouseAgent
+        agent = WarehouseAgent()
+
+    def decide(plate, track):
+        current_time = datetime.datetime.now().strftime("%I:%M %p")
+        print(agent.reason({"plate": plate, "time": current_time}))
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    processor = StreamProcessor(vision, on_vehicle=decide if agent else None, frame_skip=args.frame_skip)
+    print(f"📊 {processor.run(source, max_frames=args.max_frames)}")
@@ -0,0 +1,254 @@
+"""
+Trains the local plate recognizer (OCR_BACKEND=local / local+gemini) and
+exports it to ONNX for LocalOCR.
+
+The dataset is a folder of labelled plate images, as for benchmarks/ocr_bench.py:
+`labels.csv` (`filename,plate` rows) or the file names ("145_تونس_4862.jpg").
+Images are plate crops, or full frames with --detector smartALPR_best.pt.
+Crops go through the same straightening (prepare_crop) and resizing
+(preprocess_crops) as at the gate, so the exported model sees what it was
+trained on. Plates outside PLATE_CLASSES (e.g. "RS") are skipped.
+
+    pip install -r requirements-ocr.txt
+    python -m src.train_ocr --images dataset/train --out plate_crnn.onnx
+    python -m benchmarks.ocr_bench --images dataset/test --backends local local+gemini
+
+The model is a small CRNN (4 conv blocks, 2-layer BiLSTM, ~1M parameters)
+trained with CTC loss; the output is (N, T=W/4, len(PLATE_CLASSES)) logits
+with a dynamic batch axis. The best epoch on the held-out split is exported,
+then read back through LocalOCR as a check.
+"""
+import argparse
+import copy
+import csv
+import glob
+import inspect
+import os
+import random
+import re
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from src.ocr import LOCAL_OCR_HEIGHT, LOCAL_OCR_MODEL, LOCAL_OCR_WIDTH, PLATE_CLASSES, LocalOCR, \
+    ctc_greedy_decode, format_plate, preprocess_crops
+
+IMAGE_PATTERNS = ("*.jpg", "*.jpeg", "*.png", "*.bmp")
+# Tokens of the normalized plate key (src.database.normalize_plate) -> recognizer symbols
+_KEY_PART = re.compile(r"\d|TU|NT|RS")
+_KEY_SYMBOLS = {"TU": "تونس", "NT": "نت"}
+
+
+def load_dataset(folder: str) -> List[Tuple[str, str]]:
+    """(image path, plate label) pairs of a labelled folder."""
+    labels = {}
+    labels_path = os.path.join(folder, "labels.csv")
+    if os.path.exists(labels_path):
+        with open(labels_path, newline="", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                if len(row) >= 2 and row[0] != "filename":
+                    labels[row[0]] = row[1]
+    paths = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(folder, pattern)))
+    dataset = []
+    for path in paths:
+        name = os.path.basename(path)
+        label = labels.get(name) or os.path.splitext(name)[0].replace("_", " ")
+        dataset.append((path, label))
+    return dataset
+
+
+def crops_of(dataset, detector_path: str = None):
+    """(crop or None, label) pairs; with a detector, the best YOLO box of each frame."""
+    detector = None
+    if detector_path:
+        from ultralytics import YOLO
+        from src.batching import boxes_from_result
+        from src.vision import rank_boxes
+
+        detector = YOLO(detector_path)
+    crops = []
+    for path, label in dataset:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        if detector:
+            boxes = boxes_from_result(detector.predict(img, conf=0.5, verbose=False)[0])
+            if not boxes:
+                crops.append((None, label))
+                continue
+            x1, y1, x2, y2, _ = rank_boxes(boxes, 1)[0]
+            img = img[y1:y2, x1:x2]
+        crops.append((img, label))
+    return crops
+
+
+def plate_targets(label: str) -> Optional[List[int]]:
+    """CTC target (indices in PLATE_CLASSES) of a label, None when the plate has other symbols."""
+    from src.database import normalize_plate
+
+    key, _ = normalize_plate(label)
+    if not key or _KEY_PART.sub("", key):
+        return None
+    symbols = [_KEY_SYMBOLS.get(part, part) for part in _KEY_PART.findall(key)]
+    if any(symbol not in PLATE_CLASSES for symbol in symbols):
+        return None
+    return [PLATE_CLASSES.index(symbol) for symbol in symbols]
+
+
+def augment(crop: np.ndarray, rng: random.Random) -> np.ndarray:
+    """Camera jitter: small shift/rotation/scale, lighting, occasional blur."""
+    height, width = crop.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), rng.uniform(-3, 3), rng.uniform(0.92, 1.05))
+    matrix[:, 2] += (rng.uniform(-0.04, 0.04) * width, rng.uniform(-0.06, 0.06) * height)
+    crop = cv2.warpAffine(crop, matrix, (width, height), borderMode=cv2.BORDER_REPLICATE)
+    crop = cv2.convertScaleAbs(crop, alpha=rng.uniform(0.7, 1.3), beta=rng.uniform(-30, 30))
+    if rng.random() < 0.3:
+        crop = cv2.GaussianBlur(crop, (3, 3), 0)
+    return crop
+
+
+def build_model(num_classes: int = len(PLATE_CLASSES), height: int = LOCAL_OCR_HEIGHT):
+    import torch.nn as nn
+
+    def block(channels_in, channels_out, pool):
+        return [nn.Conv2d(channels_in, channels_out, 3, padding=1), nn.BatchNorm2d(channels_out),
+                nn.ReLU(inplace=True), nn.MaxPool2d(pool)]
+
+    class CRNN(nn.Module):
+        def __init__(self):
+            super().__init__()
+            # H / 16, W / 4: a 128 px wide plate gives 32 time steps for at most 9 symbols
+            self.features = nn.Sequential(*block(1, 32, 2), *block(32, 64, 2),
+                                          *block(64, 128, (2, 1)), *block(128, 192, (2, 1)))
+            self.rnn = nn.LSTM(192 * (height // 16), 128, num_layers=2, bidirectional=True, batch_first=True)
+            self.head = nn.Linear(256, num_classes)
+
+        def forward(self, x):
+            features = self.features(x)                        # (N, C, H', T)
+            features = features.permute(0, 3, 1, 2).flatten(2)  # (N, T, C * H')
+            output, _ = self.rnn(features)
+            return self.head(output)                           # (N, T, classes) logits
+
+    return CRNN()
+
+
+def evaluate(model, samples, device, batch_size: int = 64) -> float:
+    """Exact plate accuracy (greedy CTC decoding, as LocalOCR)."""
+    import torch
+
+    if not samples:
+        return 0.0
+    model.eval()
+    correct = 0
+    with torch.no_grad():
+        for i in range(0, len(samples), batch_size):
+            chunk = samples[i:i + batch_size]
+            x = torch.from_numpy(preprocess_crops([crop for crop, _ in chunk])).to(device)
+            probs = model(x).softmax(2).cpu().numpy()
+            for read, (_, targets) in zip(ctc_greedy_decode(probs), chunk):
+                correct += read.plate == format_plate([PLATE_CLASSES[t] for t in targets])
+    return correct / len(samples)
+
+
+def train(samples, epochs: int = 60, batch_size: int = 32, lr: float = 1e-3, val_split: float = 0.1,
+          seed: int = 0, device: str = "cpu"):
+    """samples: (prepared crop, CTC target) pairs. Returns the best model, its accuracy and the held-out split."""
+    import torch
+
+    rng = random.Random(seed)
+    torch.manual_seed(seed)
+    samples = list(samples)
+    rng.shuffle(samples)
+    held_out = max(1, int(len(samples) * val_split)) if len(samples) > 10 else 0
+    val, train_set = samples[:held_out], samples[held_out:]
+
+    model = build_model().to(device)
+    ctc = torch.nn.CTCLoss(blank=0, zero_infinity=True)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=lr, weight_decay=1e-4)
+    steps = (len(train_set) + batch_size - 1) // batch_size
+    scheduler = torch.optim.lr_scheduler.OneCycleLR(optimizer, max_lr=lr, total_steps=epochs * steps)
+
+    best_accuracy, best_state = -1.0, None
+    for epoch in range(1, epochs + 1):
+        model.train()
+        rng.shuffle(train_set)
+        total_loss = 0.0
+        for i in range(0, len(train_set), batch_size):
+            chunk = train_set[i:i + batch_size]
+            x = torch.from_numpy(preprocess_crops([augment(crop, rng) for crop, _ in chunk])).to(device)
+            targets = torch.tensor([t for _, target in chunk for t in target], dtype=torch.long, device=device)
+            target_lengths = torch.tensor([len(target) for _, target in chunk], dtype=torch.long)
+            log_probs = model(x).log_softmax(2).permute(1, 0, 2)  # CTCLoss wants (T, N, C)
+            input_lengths = torch.full((len(chunk),), log_probs.shape[0], dtype=torch.long)
+            loss = ctc(log_probs, targets, input_lengths, target_lengths)
+            optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(model.parameters(), 5.0)
+            optimizer.step()
+            scheduler.step()
+            total_loss += loss.item() * len(chunk)
+        accuracy = evaluate(model, val or train_set, device)
+        print(f"epoch {epoch:>3}  loss {total_loss / len(train_set):.4f}  "
+              f"{'val' if val else 'train'} accuracy {accuracy:.1%}")
+        if accuracy > best_accuracy:
+            best_accuracy, best_state = accuracy, copy.deepcopy(model.state_dict())
+    model.load_state_dict(best_state)
+    return model, best_accuracy, val
+
+
+def export_onnx(model, path: str, height: int = LOCAL_OCR_HEIGHT, width: int = LOCAL_OCR_WIDTH):
+    import torch
+
+    model = model.cpu().eval()
+    # The TorchScript exporter handles the LSTM with a dynamic batch; newer torch defaults to dynamo
+    extra = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    torch.onnx.export(model, torch.zeros(1, 1, height, width), path, input_names=["image"],
+                      output_names=["logits"], dynamic_axes={"image": {0: "batch"}, "logits": {0: "batch"}},
+                      opset_version=17, **extra)
+
+
+def check_export(path: str, samples) -> float:
+    """Accuracy of the exported file read through LocalOCR, i.e. exactly as at the gate."""
+    if not samples:
+        return 0.0
+    reads = LocalOCR(path).read_batch([crop for crop, _ in samples])
+    expected = [format_plate([PLATE_CLASSES[t] for t in target]) for _, target in samples]
+    return sum(read.plate == plate for read, plate in zip(reads, expected)) / len(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", required=True)
+    parser.add_argument("--out", default=LOCAL_OCR_MODEL)
+    parser.add_argument("--detector", help="YOLO weights: the images are full frames, not crops")
+    parser.add_argument("--epochs", type=int, default=60)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--val-split", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--device", default="cpu", help="cpu, cuda, mps")
+    args = parser.parse_args()
+
+    from src.vision import prepare_crop
+
+    samples, skipped = [], 0
+    for crop, label in crops_of(load_dataset(args.images), args.detector):
+        targets = plate_targets(label)
+        if crop is None or not targets:
+            skipped += 1
+            continue
+        samples.append((prepare_crop(crop), targets))
+    if not samples:
+        raise SystemExit(f"❌ No usable labelled plates in {args.images}")
+    print(f"{len(samples)} labelled plates from {args.images} ({skipped} skipped)")
+
+    model, accuracy, val = train(samples, args.epochs, args.batch, args.lr, args.val_split, args.seed, args.device)
+    export_onnx(model, args.out)
+    print(f"✅ Exported {args.out} (best accuracy {accuracy:.1%})")
+    if val:
+        print(f"✅ {args.out} through LocalOCR: {check_export(args.out, val):.1%} on the held-out plates")
+
+
+if __name__ == "__main__":
+    main()